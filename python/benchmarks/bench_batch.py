@@ -0,0 +1,88 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+# Aggregation benchmark of record objects against YastRecordBatch
+#
+# Computes the monthly billing figures (duration per type, billable amount and
+# duration per project) of a month with count records by looping over record objects, and
+# with YastRecordBatch using NumPy when installed and the array module.
+#
+# Usage: python bench_batch.py [count]
+#
+
+import os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import yastbatch
+from yastlib import YastRecordWork, YastRecordPhonecall
+from yastbatch import YastRecordBatch
+
+
+def makeRecords(count):
+  records = []
+  for i in range(count):
+    start = 1300000000 + i * 2
+    if i % 4:
+      r = YastRecordWork(i % 200, start, start + 1800 + i % 600, "", 0, 10.0, 20.0 + i % 3, i % 2)
+    else:
+      r = YastRecordPhonecall(i % 200, start, start + 300, "", 0, "555-0100", 1)
+    r.id = i + 1
+    records.append(r)
+  return records
+
+# Monthly billing over record objects
+def aggregateObjects(records, timeFrom, timeTo):
+  byType = {}
+  byProject = {}
+  amount = 0.0
+  for r in records:
+    if r.endTime < timeFrom or r.startTime > timeTo:
+      continue
+    dt = r.endTime - r.startTime
+    byType[r.typeId] = byType.get(r.typeId, 0) + dt
+    byProject[r.project] = byProject.get(r.project, 0) + dt
+    if r.typeId == 1 and r.isBillable:
+      amount += dt * r.hourlyIncome / 3600.0
+  return byType, byProject, amount
+
+# Monthly billing over a batch
+def aggregateBatch(batch, timeFrom, timeTo):
+  month = batch.filterTime(timeFrom, timeTo)
+  return month.durationByType(), month.durationByProject(), month.billableAmount()
+
+def timed(func, *args):
+  start = time.time()
+  result = func(*args)
+  return result, (time.time() - start) * 1000.0
+
+
+def main():
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+  records = makeRecords(count)
+  timeFrom = 1300000000
+  timeTo = timeFrom + 30 * 86400
+
+  print(str(count) + " records, times in ms")
+  expected, ms = timed(aggregateObjects, records, timeFrom, timeTo)
+  print("%-22s %10.1f" % ("objects", ms))
+
+  backends = [("batch, numpy", yastbatch.numpy)] if yastbatch.numpy != None else []
+  backends.append(("batch, array", None))
+  numpy = yastbatch.numpy
+  for name, backend in backends:
+    yastbatch.numpy = backend
+    batch, buildMs = timed(YastRecordBatch.fromRecords, records)
+    result, ms = timed(aggregateBatch, batch, timeFrom, timeTo)
+    if result[0] != expected[0] or result[1] != expected[1] or abs(result[2] - expected[2]) > 1e-6 * abs(expected[2]):
+      raise Exception(name + " result differs from objects")
+    print("%-22s %10.1f   (building batch %.1f)" % (name, ms, buildMs))
+  yastbatch.numpy = numpy
+
+if __name__ == '__main__':
+  main()
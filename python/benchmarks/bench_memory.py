@@ -0,0 +1,130 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+# Memory benchmark of the record layouts
+#
+# Compares the memory used by records kept in a per-record variables dict
+# on top of the instance __dict__ (the layout before 0.11), with the slotted
+# records of yastlib.
+#
+# Usage: python bench_memory.py [count]
+#
+
+import os, sys, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from yastlib import YastRecordWork, YastRecordPhonecall, YastProject
+
+
+# Records as laid out before 0.11
+class DictRecord(object):
+  id = -1
+  typeId = -1
+  timeCreated = -1
+  timeUpdated = -1
+  project = -1
+  variables = None
+  creator = -1
+  flags = 0
+  userData = None
+
+  def __init__(self, typeId, project, variables):
+    self.typeId = typeId
+    self.project = project
+    self.variables = variables
+
+class DictRecordWork(DictRecord):
+  def __init__(self, project, startTime, endTime, comment, isRunning, hourlyCost=0,
+               hourlyIncome=0, isBillable=0):
+    super(DictRecordWork, self).__init__(1, int(project), {'startTime': int(startTime),
+                                                           'endTime': int(endTime),
+                                                           'comment': comment if comment != None else "",
+                                                           'isRunning': int(isRunning),
+                                                           'hourlyCost': float(hourlyCost),
+                                                           'hourlyIncome': float(hourlyIncome),
+                                                           'isBillable': int(isBillable)})
+
+class DictRecordPhonecall(DictRecord):
+  def __init__(self, project, startTime, endTime, comment, isRunning, phoneNumber, outgoing):
+    super(DictRecordPhonecall, self).__init__(3, int(project), {'startTime': int(startTime),
+                                                                'endTime': int(endTime),
+                                                                'comment': comment if comment != None else "",
+                                                                'isRunning': int(isRunning),
+                                                                'phoneNumber': phoneNumber,
+                                                                'outgoing': int(outgoing)})
+
+class DictProject(object):
+  id = -1
+  name = ""
+  description = ""
+  primaryColor = ""
+  parentId = -1
+  privileges = 0
+  timeCreated = -1
+  creator = -1
+  userData = None
+
+  def __init__(self, name, description, primaryColor, parentId=0):
+    self.name = name
+    self.description = description if description != None else ""
+    self.primaryColor = primaryColor
+    self.parentId = int(parentId)
+
+
+# Build count records the way the decoder does, and return the bytes allocated per record
+def measure(workClass, phonecallClass, count):
+  # Values shared by all records, as interned strings and small ints are in practice
+  comment = "Work"
+  tracemalloc.start()
+  before = tracemalloc.get_traced_memory()[0]
+  records = []
+  for i in range(count):
+    start = 1300000000 + i * 3600
+    if i % 4:
+      r = workClass(i % 50, start, start + 1800, comment, 0, 10.0, 20.0, 1)
+    else:
+      r = phonecallClass(i % 50, start, start + 300, comment, 0, "555-0100", 1)
+    r.id = i
+    r.timeCreated = start
+    r.timeUpdated = start
+    r.creator = 1
+    r.flags = 0
+    records.append(r)
+  used = tracemalloc.get_traced_memory()[0] - before
+  tracemalloc.stop()
+  return used / float(count)
+
+def measureProjects(projectClass, count):
+  tracemalloc.start()
+  before = tracemalloc.get_traced_memory()[0]
+  projects = []
+  for i in range(count):
+    p = projectClass("Project", "", "#ff0000", i % 10)
+    p.id = i
+    p.privileges = 1
+    p.timeCreated = 1300000000
+    p.creator = 1
+    projects.append(p)
+  used = tracemalloc.get_traced_memory()[0] - before
+  tracemalloc.stop()
+  return used / float(count)
+
+
+def main():
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+  print("Bytes per object, " + str(count) + " objects")
+  print("%-10s %10s %10s %8s" % ("", "dict", "slots", "saved"))
+  rows = [("records", measure(DictRecordWork, DictRecordPhonecall, count),
+           measure(YastRecordWork, YastRecordPhonecall, count)),
+          ("projects", measureProjects(DictProject, count), measureProjects(YastProject, count))]
+  for name, old, new in rows:
+    print("%-10s %10.1f %10.1f %7.1f%%" % (name, old, new, 100.0 * (old - new) / old))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,111 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+# Serialization benchmark of add/change/delete requests
+#
+# Compares objects per second serialized into the objects XML of a request
+# by chained concatenation (the serializer before 0.11) and by the templates
+# of yastlib. The output of both is checked to be the same.
+#
+# Usage: python bench_serialize.py [count]
+#
+
+import os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from yastlib import Yast, YastRecordWork, YastRecordPhonecall, YastProject, YastFolder
+
+
+# Serializers before 0.11
+def concatWork(self, includeId, includeData):
+  return '<record>' + \
+      ('<id>' + str(self.id) + '</id>' if includeId else '') + \
+      ('<typeId>1</typeId>' + \
+         '<project>' + str(self.project) + '</project>' + \
+         '<variables><v>' + str(self.startTime) + '</v><v>' + str(self.endTime) + '</v>' + \
+         '<v><![CDATA[' + self.comment + ']]></v><v>' + str(self.isRunning) + '</v>' + \
+         '<v>' + str(self.hourlyCost) + '</v><v>' + str(self.hourlyIncome) + '</v>' + \
+         '<v>' + str(self.isBillable) + '</v></variables>' \
+         if includeData else '') + \
+         '</record>'
+
+def concatPhonecall(self, includeId, includeData):
+  return '<record>' + \
+      ('<id>' + str(self.id) + '</id>' if includeId else '') + \
+      ('<typeId>3</typeId>' + \
+         '<project>' + str(self.project) + '</project>' + \
+         '<variables><v>' + str(self.startTime) + '</v><v>' + str(self.endTime) + '</v>' + \
+         '<v><![CDATA[' + self.comment + ']]></v><v>' + str(self.isRunning) + '</v>' + \
+         '<v><![CDATA[' + str(self.phoneNumber) + ']]></v><v>' + str(self.outgoing) + '</v></variables>' \
+         if includeData else '') + \
+         '</record>'
+
+def concatNode(self, includeId, includeData):
+  tag = 'project' if isinstance(self, YastProject) else 'folder'
+  return '<' + tag + '>' + \
+      ('<id>' + str(self.id) + '</id>' if includeId else '') + \
+      ('<name><![CDATA[' + self.name + ']]></name>' + \
+         '<description><![CDATA[' + self.description + ']]></description>' + \
+         '<primaryColor><![CDATA[' + self.primaryColor + ']]></primaryColor>' + \
+         '<parentId>' + str(self.parentId) + '</parentId>' + \
+         '<flags>0</flags>' if includeData else '') + \
+         '</' + tag + '>'
+
+concatSerializers = {YastRecordWork: concatWork, YastRecordPhonecall: concatPhonecall,
+                     YastProject: concatNode, YastFolder: concatNode}
+
+def concatObjects(objects, includeId, includeData):
+  xmlObj = ''
+  for o in objects:
+    xmlObj += concatSerializers[type(o)](o, includeId, includeData)
+  return '<objects>' + xmlObj + '</objects>'
+
+
+def makeObjects(count):
+  objects = []
+  for i in range(count):
+    start = 1300000000 + i * 3600
+    if i % 10 == 0:
+      o = YastProject("Project " + str(i), "Description of project", "#ff0000", 12)
+    elif i % 10 == 1:
+      o = YastFolder("Folder " + str(i), "", "#00ff00", 0)
+    elif i % 4:
+      o = YastRecordWork(i % 50, start, start + 1800, "Worked on issue " + str(i), 0, 10.0, 20.0, 1)
+    else:
+      o = YastRecordPhonecall(i % 50, start, start + 300, "Call " + str(i), 0, "555-0100", 1)
+    o.id = i + 1
+    objects.append(o)
+  return objects
+
+def rate(func, objects, includeId, includeData, repeat=7):
+  best = None
+  for i in range(repeat):
+    start = time.time()
+    func(objects, includeId, includeData)
+    elapsed = time.time() - start
+    best = elapsed if best == None else min(best, elapsed)
+  return len(objects) / best
+
+
+def main():
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+  objects = makeObjects(count)
+  yast = Yast()
+
+  print(str(count) + " objects, objects per second")
+  print("%-8s %12s %12s %8s" % ("request", "concat", "templates", "speedup"))
+  for name, includeId, includeData in [("add", False, True), ("change", True, True), ("delete", True, False)]:
+    if concatObjects(objects, includeId, includeData) != yast._xmlObjects(objects, includeId, includeData):
+      raise Exception("Serializers differ for " + name)
+    old = rate(concatObjects, objects, includeId, includeData)
+    new = rate(yast._xmlObjects, objects, includeId, includeData)
+    print("%-8s %12.0f %12.0f %7.2fx" % (name, old, new, new / old))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,95 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+# Startup benchmark of yast.py
+#
+# Times a new yast.py process for commands that never contact Yast, and for
+# one that does against the fake Yast server, as scripts calling yast.py in a
+# loop see them. Also lists the slow modules each command imports, measured
+# with python -X importtime.
+#
+# Usage: python bench_startup.py [--repeat 20] [--json out.json]
+#
+
+import os, sys, time, json, argparse, subprocess
+
+benchDir = os.path.dirname(os.path.abspath(__file__))
+libDir = os.path.join(benchDir, '..')
+sys.path.insert(0, benchDir)
+from yastfakeserver import YastFakeServer
+
+# Modules whose import shows in the startup time
+slowModules = ['http.client', 'xml.etree.ElementTree', 'concurrent.futures', 'numpy', 'yastbatch']
+
+
+# Run yast.py with arguments repeat times
+# @return (best, median) in seconds
+def timeCommand(argv, repeat):
+  times = []
+  with open(os.devnull, 'w') as devnull:
+    for i in range(repeat):
+      start = time.time()
+      subprocess.call([sys.executable, os.path.join(libDir, 'yast.py')] + argv, stdout=devnull, stderr=devnull)
+      times.append(time.time() - start)
+  times.sort()
+  return times[0], times[len(times) // 2]
+
+# Returns the modules of slowModules yast.py imports for arguments
+def slowImports(argv):
+  process = subprocess.Popen([sys.executable, '-X', 'importtime', os.path.join(libDir, 'yast.py')] + argv,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+  err = process.communicate()[1]
+  imported = set([line.split('|')[-1].strip() for line in err.splitlines() if line.startswith('import time:')])
+  return [m for m in slowModules if m in imported]
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Startup benchmark of yast.py")
+  parser.add_argument('--repeat', type=int, default=20, help="Runs per command")
+  parser.add_argument('--json', dest='json', help="Save results to this file")
+  args = parser.parse_args()
+
+  server = YastFakeServer(records=1000)
+  server.start()
+  try:
+    login = ['-u', 'bench', '-x', server.hashOf('bench'), '-d', server.host, '--http']
+    commands = [('python', None),
+                ('--help', ['--help']),
+                ('print time', ['print', 'time', 'now']),
+                ('add -h', ['add', 'record', 'work', '-h']),
+                ('get projects', login + ['get', 'projects'])]
+
+    results = {}
+    print("%-14s %10s %10s  %s" % ("command", "best ms", "median ms", "slow imports"))
+    for name, argv in commands:
+      if argv == None:
+        # Startup of the interpreter alone
+        with open(os.devnull, 'w') as devnull:
+          times = []
+          for i in range(args.repeat):
+            start = time.time()
+            subprocess.call([sys.executable, '-c', 'pass'], stdout=devnull)
+            times.append(time.time() - start)
+        times.sort()
+        best, median, imports = times[0], times[len(times) // 2], []
+      else:
+        best, median = timeCommand(argv, args.repeat)
+        imports = slowImports(argv)
+      results[name] = {'best': best, 'median': median, 'imports': imports}
+      print("%-14s %10.1f %10.1f  %s" % (name, best * 1000, median * 1000, ", ".join(imports)))
+  finally:
+    server.stop()
+
+  if args.json:
+    with open(args.json, 'w') as f:
+      json.dump({'repeat': args.repeat, 'python': sys.version.split()[0], 'time': int(time.time()),
+                 'results': results}, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+  main()
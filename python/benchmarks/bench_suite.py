@@ -0,0 +1,194 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+# Benchmark suite of yastlib and the CLI against the fake Yast server
+#
+# Starts yastfakeserver.py on a free port and times each stage of a request
+# on the same synthetic data, so runs are comparable between machines
+# and commits:
+#   toXml          objects serialized per second
+#   encode         request bodies urlencoded, MB per second
+#   parse          response XML parsed by ElementTree, MB per second
+#   decode         records per second from parsed XML to objects
+#   getRecords     records per second end to end, also for iterRecords,
+#                  batch=True and getRecordsSharded
+#   cli-print-hier seconds for 'yast.py print hier --sum-time'
+#   cli-print-sum  seconds for 'yast.py print sum'
+#
+# Results are the best of --repeat runs. Save them with --json and compare a
+# later run against them with --compare, which exits with status 1 when a
+# stage got slower by more than --threshold percent.
+#
+# Usage: python bench_suite.py [--records 200000] [--repeat 3] [--json out.json]
+#                              [--compare baseline.json] [--threshold 10]
+#
+
+import os, sys, time, json, argparse, subprocess
+from xml.etree import ElementTree
+
+benchDir = os.path.dirname(os.path.abspath(__file__))
+libDir = os.path.join(benchDir, '..')
+sys.path.insert(0, libDir)
+from yastlib import Yast, YastRecordWork, YastRecordPhonecall
+if sys.version_info[0] == 3:
+  from urllib.parse import urlencode
+  from http.client import HTTPConnection
+else:
+  from urllib import urlencode
+  from httplib import HTTPConnection
+
+# Start of the records of the fake server, and seconds between them
+baseTime = 1262304000
+spacing = 600
+
+
+# Start the fake server in a subprocess
+# @return (process, host)
+def startServer(records):
+  process = subprocess.Popen([sys.executable, os.path.join(benchDir, 'yastfakeserver.py'),
+                              '--port', '0', '--records', str(records)],
+                             stdout=subprocess.PIPE, universal_newlines=True)
+  line = process.stdout.readline()
+  if not line.startswith("Listening on "):
+    process.kill()
+    raise Exception("Fake server did not start")
+  return process, line.split()[-1]
+
+def best(func, repeat):
+  times = []
+  for i in range(repeat):
+    start = time.time()
+    func()
+    times.append(time.time() - start)
+  return min(times)
+
+def makeObjects(count):
+  objects = []
+  for i in range(count):
+    start = baseTime + i * spacing
+    if i % 5:
+      o = YastRecordWork(1 + i % 200, start, start + 1800, "Record " + str(i), 0, 10.0, 50.0, i % 2)
+    else:
+      o = YastRecordPhonecall(1 + i % 200, start, start + 300, "Call " + str(i), 0, "555-0100", 1)
+    o.id = i + 1
+    objects.append(o)
+  return objects
+
+# Fetch the raw getRecords response of a time range
+def fetchResponse(yast, host, options):
+  request = yast._xmlRequest('data.getRecords', yast.user, yast.hash,
+                             yast._xmlQueryOptions(options, ['timeFrom', 'timeTo']))
+  conn = HTTPConnection(host)
+  conn.request('GET', yast.apiPath + "?" + urlencode({'request': request}))
+  data = conn.getresponse().read()
+  conn.close()
+  return data
+
+
+# Run all stages
+# @return map of stage name to (value, unit, higherIsBetter)
+def runSuite(host, records, repeat):
+  results = {}
+  yast = Yast()
+  yast.host = host
+  yast.useHttps = False
+  yast.propagateExceptions = True
+  yast.login('bench', 'bench')
+  options = {'timeFrom': baseTime, 'timeTo': baseTime + records * spacing}
+
+  objects = makeObjects(min(records, 100000))
+  elapsed = best(lambda: yast._xmlObjects(objects, True, True), repeat)
+  results['toXml'] = (len(objects) / elapsed, 'objects/s', True)
+
+  request = yast._xmlRequest('data.add', yast.user, yast.hash, yast._xmlObjects(objects, False, True))
+  elapsed = best(lambda: urlencode({'request': request}), repeat)
+  results['encode'] = (len(request) / elapsed / 1e6, 'MB/s', True)
+
+  data = fetchResponse(yast, host, options)
+  elapsed = best(lambda: ElementTree.fromstring(data), repeat)
+  results['parse'] = (len(data) / elapsed / 1e6, 'MB/s', True)
+
+  xml = ElementTree.fromstring(data)
+  count = len(xml.find('objects'))
+  elapsed = best(lambda: yast._xmlDataToStruct(xml), repeat)
+  results['decode'] = (count / elapsed, 'records/s', True)
+
+  elapsed = best(lambda: yast.getRecords(options), repeat)
+  results['getRecords'] = (count / elapsed, 'records/s', True)
+  elapsed = best(lambda: sum(1 for r in yast.iterRecords(options)), repeat)
+  results['iterRecords'] = (count / elapsed, 'records/s', True)
+  elapsed = best(lambda: yast.getRecords(options, batch=True), repeat)
+  results['getRecords-batch'] = (count / elapsed, 'records/s', True)
+  elapsed = best(lambda: yast.getRecordsSharded(options), repeat)
+  results['getRecordsSharded'] = (count / elapsed, 'records/s', True)
+
+  timeTo = time.strftime('%d-%m-%Y', time.gmtime(baseTime + records * spacing + 86400))
+  cli = [sys.executable, os.path.join(libDir, 'yast.py'), '-u', yast.user, '-x', yast.hash, '-d', host, '--http']
+  period = ['--from', '1-1-2010', '--to', timeTo]
+  for name, command in [('cli-print-hier', ['print', 'hier', '--sum-time'] + period),
+                        ('cli-print-sum', ['print', 'sum'] + period)]:
+    def run():
+      with open(os.devnull, 'w') as devnull:
+        subprocess.check_call(cli + command, stdout=devnull)
+    results[name] = (best(run, repeat), 's', False)
+
+  return results
+
+# Print results, compared to a baseline if given
+# @return True if no stage is slower than the baseline by more than threshold percent
+def report(results, baseline, threshold):
+  ok = True
+  print("%-18s %14s %-10s %s" % ("stage", "value", "unit", "change" if baseline else ""))
+  for name in sorted(results):
+    value, unit, higherIsBetter = results[name]
+    line = "%-18s %14.2f %-10s" % (name, value, unit)
+    if baseline and name in baseline and baseline[name][0] > 0:
+      change = (value / baseline[name][0] - 1) * 100
+      slower = -change if higherIsBetter else change
+      line += " %+7.1f%%" % change
+      if slower > threshold:
+        line += "  REGRESSION"
+        ok = False
+    print(line)
+  return ok
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark suite of yastlib against the fake Yast server")
+  parser.add_argument('--records', type=int, default=200000, help="Number of records served")
+  parser.add_argument('--repeat', type=int, default=3, help="Runs per stage. The best one counts")
+  parser.add_argument('--json', dest='json', help="Save results to this file")
+  parser.add_argument('--compare', help="Compare to results saved with --json")
+  parser.add_argument('--threshold', type=float, default=10.0,
+                      help="Percent a stage may get slower before it counts as a regression")
+  args = parser.parse_args()
+
+  process, host = startServer(args.records)
+  try:
+    results = runSuite(host, args.records, args.repeat)
+  finally:
+    process.kill()
+    process.wait()
+
+  baseline = None
+  if args.compare:
+    with open(args.compare) as f:
+      baseline = json.load(f)['results']
+  print(str(args.records) + " records, best of " + str(args.repeat))
+  ok = report(results, baseline, args.threshold)
+
+  if args.json:
+    with open(args.json, 'w') as f:
+      json.dump({'records': args.records, 'python': sys.version.split()[0], 'time': int(time.time()),
+                 'results': results}, f, indent=2, sort_keys=True)
+  if not ok:
+    sys.exit(1)
+
+if __name__ == '__main__':
+  main()
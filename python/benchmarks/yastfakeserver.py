@@ -0,0 +1,501 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+# Local stand-in for the Yast API
+#
+# Speaks the XML protocol of the Yast API over HTTP, for benchmarks and
+# offline testing. Serves a synthetic dataset that is computed from the record
+# id, so millions of records take no memory and every run sees the same data.
+# Records, projects and folders added, changed or deleted are kept in memory.
+# Any password except "wrong" logs in.
+#
+# Usage: python yastfakeserver.py [--port 8765] [--records 100000] [--projects 200]
+#                                 [--folders 40] [--max-records N] [--delay S]
+#
+# In process:
+#   server = YastFakeServer(records=1000000)
+#   server.start()
+#   yast.host = server.host
+#   ...
+#   server.stop()
+#
+
+import sys, time, threading, hashlib, argparse
+from xml.etree import ElementTree
+if sys.version_info[0] == 3:
+  from http.server import HTTPServer, BaseHTTPRequestHandler
+  from socketserver import ThreadingMixIn
+  from urllib.parse import parse_qs, urlparse
+else:
+  from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+  from SocketServer import ThreadingMixIn
+  from urlparse import parse_qs, urlparse
+
+
+# Status codes, as in yastlib.YastStatus
+SUCCESS = 0
+NOT_LOGGED_IN = 4
+LOGIN_FAILURE = 5
+DATA_FORMAT_ERROR = 8
+INVALID_REQUEST = 10
+REQUEST_TOO_LARGE = 12
+UNKNOWN_RECORDTYPE = 200
+UNKNOWN_RECORD = 203
+
+
+# Returns text escaped for use inside CDATA
+def cdata(text):
+  return '<![CDATA[' + ('%s' % text).replace(']]>', ']]]]><![CDATA[>') + ']]>'
+
+
+# Synthetic data of the fake server. Generated records are a function of
+# their id. Changes are kept in overlays on top of them
+class YastFakeData(object):
+
+  # Start time of the first record, and seconds between record starts
+  baseTime = 1262304000
+  spacing = 600
+  # Longest record in seconds
+  maxDuration = 7500
+
+  def __init__(self, records=100000, projects=200, folders=40):
+    self.records = int(records)
+    self.projects = max(int(projects), 1)
+    self.folders = int(folders)
+    self.lock = threading.Lock()
+    # Records added or changed, by id, as tuples like generated ones
+    self.changedRecords = {}
+    self.deletedRecords = set()
+    self.nextRecordId = self.records + 1
+    # Projects and folders, by id, as (name, description, primaryColor, parentId)
+    self.nodes = {'project': {}, 'folder': {}}
+    for k in range(self.folders):
+      self.nodes['folder'][10000 + k] = ("Folder " + str(k), "", "#336699",
+                                         0 if k < max(self.folders // 4, 1) else 10000 + k // 3)
+    for j in range(1, self.projects + 1):
+      parent = 10000 + (j - j // 5 - 1) % self.folders if self.folders > 0 and j % 5 != 0 else 0
+      self.nodes['project'][j] = ("Project " + str(j), "Synthetic project " + str(j), "#ff6600", parent)
+    self.nextNodeId = 20000 + self.folders
+    self.settings = {}
+
+  # Returns a generated record as (id, typeId, project, variables, timeCreated, timeUpdated)
+  def generatedRecord(self, i):
+    h = (i * 2654435761) & 0xffffffff
+    start = self.baseTime + (i - 1) * self.spacing
+    end = start + 300 + h % (self.maxDuration - 300)
+    project = 1 + (h >> 8) % self.projects
+    if h % 5 == 0:
+      variables = [start, end, "Call " + str(i), 0, "555-%04d" % (h % 10000), (h >> 4) % 2]
+      return (i, 3, project, variables, start, start)
+    variables = [start, end, "Record " + str(i), 0, float((h >> 3) % 3 * 10), 50.0, (h >> 5) % 2]
+    return (i, 1, project, variables, start, start)
+
+  # Returns a record by id, or None if it does not exist
+  def record(self, i):
+    if i in self.changedRecords:
+      return self.changedRecords[i]
+    if i < 1 or i > self.records or i in self.deletedRecords:
+      return None
+    return self.generatedRecord(i)
+
+  # Returns ids of generated records that may overlap a time range
+  def candidateIds(self, timeFrom, timeTo):
+    first = 1
+    last = self.records
+    if timeFrom != None:
+      first = max(first, (timeFrom - self.maxDuration - self.baseTime) // self.spacing + 1)
+    if timeTo != None:
+      last = min(last, (timeTo - self.baseTime) // self.spacing + 1)
+    return range(int(first), int(last) + 1)
+
+  # Returns projects at or below the given project and folder ids
+  def projectsBelow(self, ids):
+    children = {}
+    for kind in ('project', 'folder'):
+      for id, node in self.nodes[kind].items():
+        children.setdefault(node[3], []).append((kind, id))
+    projects = set()
+    todo = [(kind, id) for id in ids for kind in ('project', 'folder') if id in self.nodes[kind]]
+    while todo:
+      kind, id = todo.pop()
+      if kind == 'project':
+        projects.add(id)
+      else:
+        todo += children.get(id, [])
+    return projects
+
+  # Returns records matching getRecords options, one at a time
+  # @param options map of timeFrom, timeTo, typeId, parentId and id
+  def queryRecords(self, options):
+    timeFrom = options.get('timeFrom')
+    timeTo = options.get('timeTo')
+    typeIds = options.get('typeId')
+    projects = self.projectsBelow(options['parentId']) if 'parentId' in options else None
+
+    if 'id' in options:
+      ids = options['id']
+    else:
+      ids = self.candidateIds(timeFrom, timeTo)
+    changed = self.changedRecords
+    for i in ids:
+      if i in changed and not 'id' in options:
+        continue
+      r = self.record(i)
+      if r != None and self.matches(r, timeFrom, timeTo, typeIds, projects):
+        yield r
+    if not 'id' in options:
+      for i in sorted(changed.keys()):
+        r = changed[i]
+        if self.matches(r, timeFrom, timeTo, typeIds, projects):
+          yield r
+
+  def matches(self, r, timeFrom, timeTo, typeIds, projects):
+    return (timeFrom == None or r[3][1] >= timeFrom) and (timeTo == None or r[3][0] <= timeTo) and \
+        (typeIds == None or r[1] in typeIds) and (projects == None or r[2] in projects)
+
+  # Returns the number of records getRecords would look at for options
+  def candidateCount(self, options):
+    if 'id' in options:
+      return len(options['id'])
+    return len(self.candidateIds(options.get('timeFrom'), options.get('timeTo'))) + len(self.changedRecords)
+
+
+# Returns XML of a record tuple
+def recordXml(r):
+  id, typeId, project, variables, timeCreated, timeUpdated = r
+  if typeId == 1:
+    v = '<v>%d</v><v>%d</v><v>%s</v><v>%d</v><v>%s</v><v>%s</v><v>%d</v>' % \
+        (variables[0], variables[1], cdata(variables[2]), variables[3], variables[4], variables[5], variables[6])
+  else:
+    v = '<v>%d</v><v>%d</v><v>%s</v><v>%d</v><v>%s</v><v>%d</v>' % \
+        (variables[0], variables[1], cdata(variables[2]), variables[3], cdata(variables[4]), variables[5])
+  return '<record><id>%d</id><typeId>%d</typeId><project>%d</project><variables>%s</variables>' \
+      '<timeCreated>%d</timeCreated><timeUpdated>%d</timeUpdated><creator>1</creator><flags>0</flags></record>' % \
+      (id, typeId, project, v, timeCreated, timeUpdated)
+
+# Returns XML of a project or folder
+def nodeXml(kind, id, node):
+  return '<%s><id>%d</id><name>%s</name><description>%s</description><primaryColor>%s</primaryColor>' \
+      '<parentId>%d</parentId><privileges>7</privileges><timeCreated>%d</timeCreated><creator>1</creator></%s>' % \
+      (kind, id, cdata(node[0]), cdata(node[1]), cdata(node[2]), node[3], YastFakeData.baseTime, kind)
+
+
+# Handles requests to the fake server
+class YastFakeHandler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+  disable_nagle_algorithm = True
+
+  def log_message(self, format, *args):
+    pass
+
+  def do_GET(self):
+    url = urlparse(self.path)
+    query = parse_qs(url.query)
+    if url.path == self.server.dlPath:
+      self.sendReport(query)
+    elif 'request' in query:
+      self.handleRequest(query['request'][0])
+    else:
+      self.sendBody(b'Not found', 'text/plain', 404)
+
+  def do_POST(self):
+    body = self.rfile.read(int(self.headers['Content-Length']))
+    query = parse_qs(body.decode('iso-8859-1'))
+    if 'request' in query:
+      self.handleRequest(query['request'][0])
+    else:
+      self.sendBody(b'Not found', 'text/plain', 404)
+
+  def sendBody(self, body, contentType='text/xml', code=200, headers={}):
+    self.send_response(code)
+    self.send_header('Content-Type', contentType)
+    self.send_header('Content-Length', str(len(body)))
+    for key, value in headers.items():
+      self.send_header(key, value)
+    self.end_headers()
+    self.wfile.write(body)
+
+  # Send a response of text parts with chunked transfer encoding
+  def sendChunked(self, parts):
+    self.send_response(200)
+    self.send_header('Content-Type', 'text/xml')
+    self.send_header('Transfer-Encoding', 'chunked')
+    self.end_headers()
+    buffer = []
+    size = 0
+    for part in parts:
+      buffer.append(part)
+      size += len(part)
+      if size >= 65536:
+        self.writeChunk(''.join(buffer))
+        buffer = []
+        size = 0
+    self.writeChunk(''.join(buffer))
+    self.wfile.write(b'0\r\n\r\n')
+
+  def writeChunk(self, text):
+    if text:
+      data = text.encode('utf-8')
+      self.wfile.write(('%x\r\n' % len(data)).encode('ascii') + data + b'\r\n')
+
+  def sendStatus(self, req, status, content=''):
+    self.sendBody(('<?xml version="1.0" encoding="UTF-8"?><response req="%s" status="%d">%s</response>' %
+                   (req, status, content)).encode('utf-8'))
+
+  # Send the file of a report. Supports Range requests
+  def sendReport(self, query):
+    report = query.get('id', [''])[0]
+    size = self.server.reportSize
+    block = ('Report ' + report + ' of the Yast fake server.\n').encode('ascii')
+    data = (block * (size // len(block) + 1))[:size]
+    byteRange = self.headers.get('Range')
+    if byteRange != None and byteRange.startswith('bytes='):
+      first, sep, last = byteRange[6:].partition('-')
+      first = int(first) if first else 0
+      last = min(int(last), size - 1) if last else size - 1
+      if first >= size:
+        self.sendBody(b'', 'application/octet-stream', 416, {'Content-Range': 'bytes */%d' % size})
+      else:
+        self.sendBody(data[first:last + 1], 'application/octet-stream', 206,
+                      {'Content-Range': 'bytes %d-%d/%d' % (first, last, size), 'Accept-Ranges': 'bytes'})
+    else:
+      self.sendBody(data, 'application/octet-stream', 200, {'Accept-Ranges': 'bytes'})
+
+  def handleRequest(self, text):
+    if self.server.delay > 0:
+      time.sleep(self.server.delay)
+    try:
+      xml = ElementTree.fromstring(text)
+      req = xml.attrib['req']
+    except Exception:
+      self.sendStatus('', DATA_FORMAT_ERROR)
+      return
+
+    if req == 'auth.login':
+      user = xml.findtext('user') or ''
+      if xml.findtext('password') == 'wrong':
+        self.sendStatus(req, LOGIN_FAILURE)
+      else:
+        self.sendStatus(req, SUCCESS, '<hash>' + self.server.hashOf(user) + '</hash>')
+      return
+
+    user = xml.findtext('user') or ''
+    if xml.findtext('hash') != self.server.hashOf(user):
+      self.sendStatus(req, NOT_LOGGED_IN)
+      return
+
+    handler = getattr(self, 'req_' + req.replace('.', '_'), None)
+    if handler == None:
+      self.sendStatus(req, INVALID_REQUEST)
+      return
+    try:
+      handler(req, user, xml)
+    except Exception:
+      self.sendStatus(req, DATA_FORMAT_ERROR)
+
+  def req_user_getInfo(self, req, user, xml):
+    self.sendStatus(req, SUCCESS, '<id>1</id><name>%s</name><email>%s</email><timeCreated>%d</timeCreated>' %
+                    (cdata(user), cdata(user + '@example.com'), YastFakeData.baseTime))
+
+  def req_user_getSettings(self, req, user, xml):
+    settings = self.server.data.settings.get(user, {})
+    self.sendStatus(req, SUCCESS, '<keys>%s</keys><values>%s</values>' %
+                    (''.join(['<v>%s</v>' % cdata(k) for k in settings]),
+                     ''.join(['<v>%s</v>' % cdata(v) for v in settings.values()])))
+
+  def req_user_setSetting(self, req, user, xml):
+    with self.server.data.lock:
+      self.server.data.settings.setdefault(user, {})[xml.findtext('key')] = xml.findtext('value')
+    self.sendStatus(req, SUCCESS)
+
+  def req_data_getRecords(self, req, user, xml):
+    options = {}
+    for name in ('timeFrom', 'timeTo'):
+      if xml.find(name) is not None:
+        options[name] = int(float(xml.findtext(name)))
+    for name in ('typeId', 'parentId', 'id'):
+      if xml.find(name) is not None:
+        options[name] = [int(id) for id in xml.findtext(name).split(',') if id.strip() != '']
+    data = self.server.data
+    if data.candidateCount(options) > self.server.maxRecords:
+      self.sendStatus(req, REQUEST_TOO_LARGE)
+      return
+
+    def parts():
+      yield '<?xml version="1.0" encoding="UTF-8"?><response req="%s" status="0"><objects>' % req
+      for r in data.queryRecords(options):
+        yield recordXml(r)
+      yield '</objects></response>'
+    self.sendChunked(parts())
+
+  def req_data_getProjects(self, req, user, xml):
+    self.sendNodes(req, 'project')
+
+  def req_data_getFolders(self, req, user, xml):
+    self.sendNodes(req, 'folder')
+
+  def sendNodes(self, req, kind):
+    nodes = self.server.data.nodes[kind]
+    self.sendStatus(req, SUCCESS, '<objects>' + ''.join([nodeXml(kind, id, nodes[id]) for id in sorted(nodes)]) +
+                    '</objects>')
+
+  def req_meta_getRecordTypes(self, req, user, xml):
+    types = [(1, 'Work', [('startTime', 4), ('endTime', 4), ('comment', 1), ('isRunning', 3),
+                          ('hourlyCost', 2), ('hourlyIncome', 2), ('isBillable', 3)]),
+             (3, 'Phonecall', [('startTime', 4), ('endTime', 4), ('comment', 1), ('isRunning', 3),
+                               ('phoneNumber', 1), ('outgoing', 3)])]
+    content = ''
+    for id, name, variables in types:
+      content += '<recordType><id>%d</id><name>%s</name><variableTypes>%s</variableTypes></recordType>' % \
+          (id, name, ''.join(['<variableType><id>%d</id><name>%s</name><valType>%d</valType></variableType>' %
+                              (id * 100 + k, n, t) for k, (n, t) in enumerate(variables)]))
+    self.sendStatus(req, SUCCESS, '<objects>' + content + '</objects>')
+
+  def req_data_add(self, req, user, xml):
+    self.changeObjects(req, xml, True)
+
+  def req_data_change(self, req, user, xml):
+    self.changeObjects(req, xml, False)
+
+  # Store added or changed objects and return them as stored
+  def changeObjects(self, req, xml, add):
+    data = self.server.data
+    result = []
+    with data.lock:
+      for o in list(xml.find('objects')):
+        now = int(time.time())
+        if o.tag == 'record':
+          if add:
+            id = data.nextRecordId
+            data.nextRecordId += 1
+            timeCreated = now
+          else:
+            id = int(o.findtext('id'))
+            existing = data.record(id)
+            if existing == None:
+              self.sendStatus(req, UNKNOWN_RECORD)
+              return
+            timeCreated = existing[4]
+          typeId = int(o.findtext('typeId'))
+          values = [v.text or '' for v in o.find('variables')]
+          if typeId == 1 and len(values) == 7:
+            variables = [int(values[0]), int(values[1]), values[2], int(values[3]), float(values[4]),
+                         float(values[5]), int(values[6])]
+          elif typeId == 3 and len(values) == 6:
+            variables = [int(values[0]), int(values[1]), values[2], int(values[3]), values[4], int(values[5])]
+          else:
+            self.sendStatus(req, UNKNOWN_RECORDTYPE)
+            return
+          r = (id, typeId, int(o.findtext('project')), variables, timeCreated, now)
+          data.changedRecords[id] = r
+          data.deletedRecords.discard(id)
+          result.append(recordXml(r))
+        elif o.tag in ('project', 'folder'):
+          if add:
+            id = data.nextNodeId
+            data.nextNodeId += 1
+          else:
+            id = int(o.findtext('id'))
+          node = (o.findtext('name') or '', o.findtext('description') or '', o.findtext('primaryColor') or '',
+                  int(o.findtext('parentId') or 0))
+          data.nodes[o.tag][id] = node
+          result.append(nodeXml(o.tag, id, node))
+    self.sendStatus(req, SUCCESS, '<objects>' + ''.join(result) + '</objects>')
+
+  def req_data_delete(self, req, user, xml):
+    data = self.server.data
+    with data.lock:
+      for o in list(xml.find('objects')):
+        id = int(o.findtext('id'))
+        if o.tag == 'record':
+          data.changedRecords.pop(id, None)
+          data.deletedRecords.add(id)
+        else:
+          data.nodes.get(o.tag, {}).pop(id, None)
+    self.sendStatus(req, SUCCESS)
+
+  def req_report_getReport(self, req, user, xml):
+    report = hashlib.md5(ElementTree.tostring(xml)).hexdigest()[:8]
+    self.sendStatus(req, SUCCESS, '<reportId>%d</reportId><reportHash>%s</reportHash>' %
+                    (int(report, 16), report))
+
+
+class YastFakeHTTPServer(ThreadingMixIn, HTTPServer):
+  daemon_threads = True
+  allow_reuse_address = True
+
+
+# Fake Yast server running in a background thread
+class YastFakeServer(object):
+
+  # @param port port to listen on. 0 picks a free port
+  # @param records number of generated records
+  # @param maxRecords getRecords answers REQUEST_TOO_LARGE when more records
+  #                   than this may match
+  # @param delay seconds to wait before answering each API request
+  # @param reportSize size of report downloads in bytes
+  def __init__(self, port=0, records=100000, projects=200, folders=40, maxRecords=None, delay=0,
+               reportSize=100000):
+    self.data = YastFakeData(records, projects, folders)
+    self.httpd = YastFakeHTTPServer(('127.0.0.1', port), YastFakeHandler)
+    self.httpd.data = self.data
+    self.httpd.maxRecords = maxRecords if maxRecords != None else float('inf')
+    self.httpd.delay = delay
+    self.httpd.reportSize = reportSize
+    self.httpd.dlPath = '/file.php'
+    self.httpd.hashOf = lambda user: hashlib.md5(('yastfake:' + user).encode('utf-8')).hexdigest()
+    self.thread = None
+
+  # Host to set as Yast.host
+  @property
+  def host(self):
+    return '127.0.0.1:' + str(self.httpd.server_address[1])
+
+  # Returns the hash login returns for user
+  def hashOf(self, user):
+    return self.httpd.hashOf(user)
+
+  def start(self):
+    self.thread = threading.Thread(target=self.httpd.serve_forever)
+    self.thread.daemon = True
+    self.thread.start()
+    return self
+
+  def stop(self):
+    self.httpd.shutdown()
+    self.httpd.server_close()
+
+  def serveForever(self):
+    self.httpd.serve_forever()
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Local stand-in for the Yast API")
+  parser.add_argument('--port', type=int, default=8765, help="Port to listen on. 0 picks a free port")
+  parser.add_argument('--records', type=int, default=100000, help="Number of generated records")
+  parser.add_argument('--projects', type=int, default=200, help="Number of projects")
+  parser.add_argument('--folders', type=int, default=40, help="Number of folders")
+  parser.add_argument('--max-records', dest='maxRecords', type=int, default=None,
+                      help="Answer getRecords with REQUEST_TOO_LARGE above this many records")
+  parser.add_argument('--delay', type=float, default=0, help="Seconds to wait before answering requests")
+  parser.add_argument('--report-size', dest='reportSize', type=int, default=100000,
+                      help="Size of report downloads in bytes")
+  args = parser.parse_args()
+
+  server = YastFakeServer(args.port, args.records, args.projects, args.folders, args.maxRecords, args.delay,
+                          args.reportSize)
+  print("Listening on " + server.host)
+  sys.stdout.flush()
+  try:
+    server.serveForever()
+  except KeyboardInterrupt:
+    pass
+
+if __name__ == '__main__':
+  main()
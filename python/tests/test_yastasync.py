@@ -0,0 +1,133 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+#
+# Smoke test of AsyncYast against the fake Yast server
+#
+# Usage: python -m pytest tests, or python tests/test_yastasync.py
+#
+
+import os, sys, asyncio, unittest
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(testDir, '..'))
+sys.path.insert(0, os.path.join(testDir, '..', 'benchmarks'))
+from yastasync import AsyncYast
+from yastlib import YastStatus, YastProject, YastMetaCache, YastRateLimiter
+from yastfakeserver import YastFakeServer
+
+
+class AsyncYastTest(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    cls.server = YastFakeServer(records=500)
+    cls.server.start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.stop()
+
+  def _yast(self):
+    yast = AsyncYast()
+    yast.host = self.server.host
+    yast.useHttps = False
+    yast.propagateExceptions = True
+    return yast
+
+  def _run(self, coroutine):
+    return asyncio.run(coroutine)
+
+  def testLoginAndGet(self):
+    async def run():
+      async with self._yast() as yast:
+        hash = await yast.login('smoke', 'smoke')
+        records, projects, folders = await asyncio.gather(yast.getRecords(), yast.getProjects(), yast.getFolders())
+        return yast, hash, records, projects, folders
+    yast, hash, records, projects, folders = self._run(run())
+    self.assertEqual(hash, self.server.hashOf('smoke'))
+    self.assertEqual(yast.getStatus(), YastStatus.SUCCESS)
+    self.assertTrue(len(records) > 0)
+    self.assertTrue(len(projects) > 0)
+    self.assertTrue(len(folders) > 0)
+
+  def testAddChangeDelete(self):
+    async def run():
+      async with self._yast() as yast:
+        await yast.login('smoke', 'smoke')
+        project = YastProject("Smoke", "", "#ffffff", 0)
+        await yast.add(project)
+        project.name = "Smoke changed"
+        await yast.change(project)
+        projects = await yast.getProjects()
+        deleted = await yast.delete(project)
+        return project, projects, deleted
+    project, projects, deleted = self._run(run())
+    self.assertNotEqual(project.id, -1)
+    self.assertEqual(projects[project.id].name, "Smoke changed")
+    self.assertTrue(deleted)
+
+  def testMetaCacheAndObservers(self):
+    events = []
+    async def run():
+      async with self._yast() as yast:
+        yast.metaCache = YastMetaCache()
+        yast.observers = [events.append]
+        await yast.login('smoke', 'smoke')
+        await yast.getProjects()
+        await yast.getProjects()
+        project = YastProject("Cached", "", "#ffffff", 0)
+        await yast.add(project)
+        projects = await yast.getProjects()
+        await yast.delete(project)
+        return project, projects
+    project, projects = self._run(run())
+    self.assertTrue(project.id in projects)
+    self.assertEqual([e.request for e in events],
+                     ['auth.login', 'data.getProjects', 'data.add', 'data.getProjects', 'data.delete'])
+    self.assertTrue(all(e.bytesReceived > 0 for e in events))
+
+  def testConcurrentEvents(self):
+    events = []
+    async def run():
+      async with self._yast() as yast:
+        yast.observers = [events.append]
+        await yast.login('smoke', 'smoke')
+        del events[:]
+        return await asyncio.gather(yast.getRecords(), yast.getProjects(),
+                                    yast.getRecords(user='smoke', hash='wrong'), yast.getFolders(),
+                                    return_exceptions=True)
+    records, projects, failed, folders = self._run(run())
+    self.assertTrue(isinstance(failed, Exception))
+    byRequest = {}
+    for event in events:
+      byRequest.setdefault(event.request, []).append(event)
+    self.assertEqual(sorted(e.status for e in byRequest['data.getRecords']),
+                     [YastStatus.SUCCESS, YastStatus.NOT_LOGGED_IN])
+    self.assertEqual(sorted(e.objects for e in byRequest['data.getRecords']), [0, len(records)])
+    self.assertEqual(byRequest['data.getProjects'][0].objects, len(projects))
+    self.assertEqual(byRequest['data.getProjects'][0].status, YastStatus.SUCCESS)
+    self.assertEqual(byRequest['data.getFolders'][0].objects, len(folders))
+    self.assertTrue(byRequest['data.getProjects'][0].timings['decode'] > 0)
+
+  def testRateLimiter(self):
+    async def run():
+      async with self._yast() as yast:
+        yast.rateLimiter = YastRateLimiter()
+        yast.rateLimiter.configure(yast.host, maxInFlight=1)
+        await yast.login('smoke', 'smoke')
+        records = await asyncio.gather(*[yast.getRecords() for i in range(4)])
+        return yast, records
+    yast, records = self._run(run())
+    self.assertEqual([len(r) for r in records], [len(records[0])] * 4)
+    self.assertEqual(yast.rateLimiter.inFlight(yast.host), 0)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,183 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+#
+# Tests of the meta, report and session caches against the fake Yast server
+#
+# Usage: python -m pytest tests, or python tests/test_yastcache.py
+#
+
+import os, sys, json, shutil, tempfile, threading, unittest
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(testDir, '..'))
+sys.path.insert(0, os.path.join(testDir, '..', 'benchmarks'))
+from yastlib import Yast, YastMetaCache, YastReportCache, YastSessionCache, YastProject, YastRecordWork
+from yastfakeserver import YastFakeServer
+
+
+class YastCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = YastFakeServer(records=100)
+    self.server.start()
+    self.dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    self.server.stop()
+    shutil.rmtree(self.dir)
+
+  # Returns a Yast. Names of the requests it sends are kept in requests
+  def _yast(self):
+    yast = Yast()
+    yast.host = self.server.host
+    yast.useHttps = False
+    yast.propagateExceptions = True
+    self.requests = []
+    request = yast._request
+    def recordingRequest(xml):
+      self.requests.append(yast._requestName(xml))
+      return request(xml)
+    yast._request = recordingRequest
+    return yast
+
+  def testMetaCache(self):
+    yast = self._yast()
+    yast.metaCache = YastMetaCache()
+    yast.login('meta', 'meta')
+    projects = yast.getProjects()
+    projects[1].name = "Not cached"
+    self.assertNotEqual(yast.getProjects()[1].name, "Not cached")
+    yast.getFolders()
+    yast.getFolders()
+    self.assertEqual(self.requests, ['auth.login', 'data.getProjects', 'data.getFolders'])
+
+    # Records do not change projects, projects do
+    yast.add(YastRecordWork(1, 0, 60, "", 0))
+    yast.getProjects()
+    self.assertEqual(self.requests[-1], 'data.add')
+    project = yast.add(YastProject("Meta", "", "#ffffff", 0))
+    self.assertTrue(project.id in yast.getProjects())
+    self.assertEqual(self.requests[-2:], ['data.add', 'data.getProjects'])
+
+  def testMetaCacheExpiresAndEvicts(self):
+    cache = YastMetaCache(ttl=60, maxEntries=2)
+    yast = self._yast()
+    yast.metaCache = cache
+    yast.login('meta', 'meta')
+    yast.getProjects()
+    yast.getFolders()
+    # Make the projects older than ttl
+    key = cache._key(yast.host, 'meta', 'projects')
+    stored, objects = cache._entries[key]
+    cache._entries[key] = (stored - 61, objects)
+    yast.getProjects()
+    self.assertEqual(self.requests.count('data.getProjects'), 2)
+
+    # The least recently used entry, the folders, is dropped for a third
+    yast.getRecordTypes()
+    yast.getProjects()
+    yast.getFolders()
+    self.assertEqual(self.requests[-2:], ['meta.getRecordTypes', 'data.getFolders'])
+
+  def testMetaCacheFile(self):
+    path = os.path.join(self.dir, 'meta.json')
+    yast = self._yast()
+    yast.metaCache = YastMetaCache(path=path)
+    yast.login('meta', 'meta')
+    projects = yast.getProjects()
+
+    yast = self._yast()
+    yast.metaCache = YastMetaCache(path=path)
+    yast.login('meta', 'meta')
+    cached = yast.getProjects()
+    self.assertEqual(self.requests, ['auth.login'])
+    self.assertEqual([(p.id, p.name, p.parentId) for p in cached.values()],
+                     [(p.id, p.name, p.parentId) for p in projects.values()])
+
+  def testReportCache(self):
+    yast = self._yast()
+    yast.reportCache = YastReportCache(os.path.join(self.dir, 'reports'))
+    yast.login('report', 'report')
+    report = yast.getReport('pdf', {'typeId': '1,2', 'timeFrom': 0, 'timeTo': 3600})
+    self.assertEqual(yast.getReport('pdf', {'typeId': [2, 1], 'timeFrom': 0.5, 'timeTo': '3600'}), report)
+    path = os.path.join(self.dir, 'report.pdf')
+    self.assertEqual(yast.getReportTo('pdf', path, {'typeId': '1,2', 'timeFrom': 0, 'timeTo': 3600}), len(report))
+    with open(path, 'rb') as f:
+      self.assertEqual(f.read(), report)
+    self.assertEqual(self.requests, ['auth.login', 'report.getReport'])
+
+    # Other options are another report
+    yast.getReport('pdf', {'typeId': '1', 'timeFrom': 0, 'timeTo': 3600})
+    self.assertEqual(self.requests[-1], 'report.getReport')
+
+    # Changes drop the reports of the user
+    yast.add(YastRecordWork(1, 0, 60, "", 0))
+    yast.getReport('pdf', {'typeId': '1,2', 'timeFrom': 0, 'timeTo': 3600})
+    self.assertEqual(self.requests[-2:], ['data.add', 'report.getReport'])
+
+  def testReportCacheExpires(self):
+    yast = self._yast()
+    yast.reportCache = YastReportCache(os.path.join(self.dir, 'reports'), ttl=-1)
+    yast.login('report', 'report')
+    recent = {'timeFrom': 0, 'timeTo': 4102444800}
+    past = {'timeFrom': 0, 'timeTo': 3600}
+    for options in (recent, recent, past, past):
+      yast.getReport('pdf', options)
+    self.assertEqual(self.requests, ['auth.login'] + ['report.getReport'] * 3)
+
+    # Least recently used reports are evicted
+    yast.reportCache.maxBytes = self.server.httpd.reportSize
+    yast.getReport('pdf', {'timeFrom': 0, 'timeTo': 7200})
+    yast.getReport('pdf', past)
+    self.assertEqual(self.requests[-2:], ['report.getReport'] * 2)
+
+  def testSessionCacheSkipsLogin(self):
+    cache = YastSessionCache(os.path.join(self.dir, 'sessions.json'))
+    yast = self._yast()
+    yast.sessionCache = cache
+    yast.login('cached', 'secret')
+    self.assertEqual(cache.get(self.server.host, 'cached', 'secret'), self.server.hashOf('cached'))
+    self.assertEqual(cache.get(self.server.host, 'cached', 'other'), None)
+    with open(cache.path) as f:
+      self.assertFalse('secret' in f.read())
+
+    # A stale hash is renewed on the first rejected request
+    cache.put(self.server.host, 'cached', 'secret', 'stale')
+    yast = self._yast()
+    yast.sessionCache = cache
+    self.assertEqual(yast.login('cached', 'secret'), 'stale')
+    self.assertTrue(len(yast.getProjects()) > 0)
+    self.assertEqual(cache.get(self.server.host, 'cached', 'secret'), self.server.hashOf('cached'))
+
+  def testSessionCacheSavedByThreads(self):
+    path = os.path.join(self.dir, 'sessions.json')
+    errors = []
+    def save(n):
+      # Each thread with its own instance, as separate processes would
+      cache = YastSessionCache(path)
+      cache.iterations = 1
+      try:
+        for i in range(20):
+          cache.put('host', 'user' + str(n), 'password', 'hash' + str(i))
+      except Exception as e:
+        errors.append(e)
+    threads = [threading.Thread(target=save, args=(n,)) for n in range(4)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    self.assertEqual(errors, [])
+    with open(path) as f:
+      self.assertTrue(isinstance(json.load(f)['entries'], dict))
+    self.assertEqual([name for name in os.listdir(self.dir) if name.endswith('.tmp')], [])
+
+
+if __name__ == '__main__':
+  unittest.main()
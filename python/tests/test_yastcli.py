@@ -0,0 +1,219 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+#
+# Tests of the Yast CLI against the fake Yast server
+#
+# Usage: python -m pytest tests, or python tests/test_yastcli.py
+#
+
+import os, sys, io, csv, json, unittest
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(testDir, '..'))
+sys.path.insert(0, os.path.join(testDir, '..', 'benchmarks'))
+from yast import YastCli
+from yastlib import Yast, YastStatus
+from yastfakeserver import YastFakeServer
+
+
+class YastCliTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = YastFakeServer(records=200)
+    self.server.start()
+
+  def tearDown(self):
+    self.server.stop()
+
+  # Run the CLI in this process
+  # @param yast Yast instance to use
+  # @return (exit status, lines printed)
+  def _cli(self, argv, input='', yast=None):
+    cli = YastCli()
+    if yast != None:
+      cli._createYast = lambda: yast
+    streams = sys.stdin, sys.stdout, sys.stderr
+    sys.stdin, sys.stdout, sys.stderr = io.StringIO(input), io.StringIO(), io.StringIO()
+    try:
+      try:
+        cli.execute(['-u', 'cli', '-x', self.server.hashOf('cli'), '-d', self.server.host, '--http'] + argv)
+        status = 0
+      except SystemExit as e:
+        status = e.code
+      return status, sys.stdout.getvalue().splitlines()
+    finally:
+      sys.stdin, sys.stdout, sys.stderr = streams
+
+  # Returns the id printed by print parent-id, or the exit status on errors
+  def _parentId(self, name, *options):
+    status, lines = self._cli(['print', 'parent-id', name] + list(options))
+    return int(lines[-1]) if status == 0 else status
+
+  def _batch(self, rows, yast=None):
+    status, lines = self._cli(['batch', '--format', 'json'], ''.join(json.dumps(r) + '\n' for r in rows), yast)
+    return status, [json.loads(line) for line in lines]
+
+  def testBatchRows(self):
+    status, results = self._batch([{'op': 'add', 'type': 'project', 'name': 'Batch'},
+                                   {'op': 'add', 'type': 'nothing'},
+                                   {'op': 'change', 'type': 'record', 'id': 3, 'comment': 'changed'}])
+    self.assertEqual(status, YastStatus.CLI_ARGUMENT_ERROR)
+    self.assertEqual([(r['row'], r['ok']) for r in results], [(1, True), (2, False), (3, True)])
+    self.assertEqual(self.server.data.record(3)[3][2], 'changed')
+
+  def testBatchMergesChangesOfOneRecord(self):
+    sent = []
+    yast = Yast()
+    changeBulk = yast.changeBulk
+    def countingChangeBulk(objects, **kwargs):
+      sent.extend(objects)
+      return changeBulk(objects, **kwargs)
+    yast.changeBulk = countingChangeBulk
+    status, results = self._batch([{'op': 'change', 'type': 'record', 'id': 4, 'comment': 'first'},
+                                   {'op': 'change', 'type': 'record', 'id': 4, 'project': 2}], yast)
+    self.assertEqual(status, 0)
+    self.assertEqual([r['ok'] for r in results], [True, True])
+    self.assertEqual([o.id for o in sent], [4])
+    record = self.server.data.record(4)
+    self.assertEqual((record[3][2], record[2]), ('first', 2))
+
+  def testBatchFailedFetchOfRecords(self):
+    self.server.httpd.maxRecords = 1
+    status, results = self._batch([{'op': 'add', 'type': 'project', 'name': 'Before'},
+                                   {'op': 'change', 'type': 'record', 'id': 5, 'comment': 'x'},
+                                   {'op': 'change', 'type': 'record', 'id': 6, 'comment': 'y'}])
+    self.assertNotEqual(status, 0)
+    self.assertEqual([(r['row'], r['ok']) for r in results], [(1, True), (2, False), (3, False)])
+    self.assertEqual(results[1]['status'], YastStatus.REQUEST_TOO_LARGE)
+
+  def testBatchReportsAppliedRowsOfFailedBulk(self):
+    # Sent one record per request. The second record is deleted in Yast
+    # after it was fetched, so its request fails
+    yast = Yast()
+    getRecords, changeBulk = yast.getRecords, yast.changeBulk
+    def racingGetRecords(options):
+      records = getRecords(options)
+      self.server.data.deletedRecords.add(8)
+      return records
+    yast.getRecords = racingGetRecords
+    yast.changeBulk = lambda objects, **kwargs: changeBulk(objects, maxObjects=1, **dict(kwargs, workers=1))
+    status, results = self._batch([{'op': 'change', 'type': 'record', 'id': id, 'comment': 'z'}
+                                   for id in (7, 8, 9)], yast)
+    self.assertNotEqual(status, 0)
+    self.assertEqual([(r['row'], r['ok']) for r in results], [(1, True), (2, False), (3, False)])
+    self.assertEqual(self.server.data.record(7)[3][2], 'z')
+
+  def testResolvesNamesAndPaths(self):
+    # Project 38 is in Folder 30, in Folder 10, in the top level Folder 3
+    self.assertEqual(self._parentId('Project 38'), 38)
+    self.assertEqual(self._parentId('Folder 30/Project 38'), 38)
+    self.assertEqual(self._parentId('/Folder 3/Folder 10/Folder 30/Project 38'), 38)
+    self.assertEqual(self._parentId('/Folder 3/Folder 10', '--folder'), 10010)
+    self.assertEqual(self._parentId('/Project 5'), 5)
+    self.assertEqual(self._parentId('Folder 10/Project 38'), YastStatus.CLI_EXCEPTION)
+    self.assertEqual(self._parentId('/Folder 30'), YastStatus.CLI_EXCEPTION)
+    self.assertEqual(self._parentId('Nothing'), YastStatus.CLI_EXCEPTION)
+
+  def testAmbiguousNames(self):
+    self.server.data.nodes['project'][500] = ("Project 1", "", "#ffffff", 0)
+    self.server.data.nodes['folder'][600] = ("Project 2", "", "#ffffff", 0)
+    self.assertEqual(self._parentId('Project 1'), YastStatus.CLI_EXCEPTION)
+    self.assertEqual(self._parentId('/Project 1'), 500)
+    self.assertEqual(self._parentId('Folder 0/Project 1'), 1)
+
+    # A project is chosen over a folder of the same name when looking for
+    # projects
+    self.assertEqual(self._parentId('Project 2'), YastStatus.CLI_EXCEPTION)
+    self.assertEqual(self._parentId('Project 2', '--project'), 2)
+    self.assertEqual(self._parentId('Project 2', '--folder'), 600)
+
+  def testPrintHierSumsTime(self):
+    data = self.server.data
+    status, lines = self._cli(['--seconds', '--only-id', 'print', 'hier', '--sum-time', '--no-empty'])
+    self.assertEqual(status, 0)
+    typeNames = {1: 'work', 3: 'phonecall'}
+    depth = {}
+    printed = set()
+    for line in lines[1:]:
+      name, kind, time = line.split(None, 2)
+      id = int(name.lstrip('-'))
+      printed.add(id)
+
+      # Children follow their parent
+      node = data.nodes[kind.lower()][id]
+      depth[id] = len(name) - len(name.lstrip('-'))
+      self.assertEqual(depth[id], depth[node[3]] + 1 if node[3] != 0 else 0)
+
+      expected = {}
+      projects = data.projectsBelow([id])
+      for i in range(1, data.records + 1):
+        r = data.record(i)
+        if r[2] in projects:
+          key = typeNames[r[1]]
+          expected[key] = expected.get(key, 0) + r[3][1] - r[3][0]
+      self.assertEqual(dict((t.split(': ')[0], int(t.split(': ')[1])) for t in time.strip().split(', ')),
+                       expected)
+
+    # Every project with records is printed, with all folders above it
+    withRecords = set(data.record(i)[2] for i in range(1, data.records + 1))
+    self.assertTrue(withRecords <= printed)
+    self.assertEqual(printed, set(id for id in printed if data.projectsBelow([id]) & withRecords))
+
+  # Returns a Yast that keeps the length of the output in printed each time
+  # iterRecords yields a record
+  def _trackingYast(self, printed):
+    yast = Yast()
+    iterRecords = yast.iterRecords
+    def trackingIterRecords(options):
+      for record in iterRecords(options):
+        printed.append(len(sys.stdout.getvalue()))
+        yield record
+    yast.iterRecords = trackingIterRecords
+    return yast
+
+  def testStreamsRecords(self):
+    data = self.server.data
+    printed = []
+    status, lines = self._cli(['--seconds', 'get', 'records', '--format', 'ndjson'], yast=self._trackingYast(printed))
+    self.assertEqual(status, 0)
+    rows = [json.loads(line) for line in lines]
+    self.assertEqual([row['id'] for row in rows], list(range(1, data.records + 1)))
+    for row in rows:
+      r = data.record(row['id'])
+      self.assertEqual((row['project'], row['startTime'], row['comment']),
+                       ("Project " + str(r[2]), str(r[3][0]), r[3][2]))
+    # Records are printed while later ones are still decoded
+    self.assertTrue(printed[-1] > 0)
+
+    status, lines = self._cli(['--seconds', '--limit', '10', 'get', 'records', '--format', 'csv'])
+    self.assertEqual(status, 0)
+    rows = list(csv.reader(lines))
+    self.assertEqual(rows[0][:3], ['id', 'type', 'project'])
+    self.assertEqual([int(row[0]) for row in rows[1:]], list(range(1, 11)))
+
+  def testStreamsFixedWidths(self):
+    printed = []
+    status, lines = self._cli(['--seconds', 'get', 'records', '--format', 'fixed', '--sample', '5'],
+                              yast=self._trackingYast(printed))
+    self.assertEqual(status, 0)
+    self.assertEqual(len(lines), 1 + self.server.data.records)
+    # Widths fit the header and the first 5 records, which are printed before
+    # the next ones are decoded
+    self.assertEqual(printed[4], 0)
+    self.assertTrue(printed[5] > 0)
+    self.assertEqual(len(set(len(line) for line in lines[:6])), 1)
+
+    status, lines = self._cli(['--seconds', 'get', 'records', '--format', 'fixed', '--widths', '4,10'])
+    self.assertEqual(status, 0)
+    self.assertEqual(lines[1][:14], '1   work      ')
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,96 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+#
+# Tests of commands forwarded to the CLI daemon, against the fake Yast server
+#
+# Usage: python -m pytest tests, or python tests/test_yastdaemon.py
+#
+
+import os, sys, time, shutil, tempfile, subprocess, unittest
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(testDir, '..'))
+sys.path.insert(0, os.path.join(testDir, '..', 'benchmarks'))
+from yastdaemon import isRunning, stopDaemon
+from yastfakeserver import YastFakeServer, YastFakeHandler
+
+cliPath = os.path.join(testDir, '..', 'yast.py')
+
+
+class YastDaemonTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = YastFakeServer(records=100)
+    # Count logins
+    self.logins = []
+    logins = self.logins
+    class CountingHandler(YastFakeHandler):
+      def handleRequest(self, text):
+        if 'req="auth.login"' in text:
+          logins.append(text)
+        YastFakeHandler.handleRequest(self, text)
+    self.server.httpd.RequestHandlerClass = CountingHandler
+    self.server.start()
+
+    self.dir = tempfile.mkdtemp()
+    self.socket = os.path.join(self.dir, 'daemon.sock')
+    self.daemon = subprocess.Popen([sys.executable, cliPath, 'daemon', '--socket', self.socket,
+                                    '--idle-timeout', '60'])
+    deadline = time.time() + 10
+    while not isRunning(self.socket):
+      self.assertTrue(time.time() < deadline, "Daemon did not start")
+      time.sleep(0.05)
+
+  def tearDown(self):
+    stopDaemon(self.socket)
+    self.daemon.wait()
+    self.server.stop()
+    shutil.rmtree(self.dir)
+
+  # Run a command of the CLI with YAST_DAEMON set
+  # @return (exit status, output)
+  def _cli(self, argv, input='', password='secret'):
+    env = dict(os.environ, YAST_DAEMON=self.socket)
+    process = subprocess.Popen([sys.executable, cliPath, '-u', 'daemon', '-p', password, '-d', self.server.host,
+                                '--http'] + argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, env=env, cwd=self.dir)
+    out, err = process.communicate(input.encode('utf-8'))
+    return process.returncode, out.decode('utf-8')
+
+  def testLoginKeptBetweenCommands(self):
+    status, first = self._cli(['get', 'projects'])
+    self.assertEqual(status, 0)
+    self.assertTrue('Project 1' in first)
+    status, second = self._cli(['get', 'projects'])
+    self.assertEqual((status, second), (0, first))
+    self.assertEqual(len(self.logins), 1)
+
+    # Another password is not taken for the cached login
+    status, out = self._cli(['get', 'projects'], password='wrong')
+    self.assertNotEqual(status, 0)
+    self.assertEqual(len(self.logins), 2)
+
+  def testDaemonAsArgument(self):
+    # A name that is the daemon command does not keep the command from being
+    # forwarded
+    self._cli(['get', 'projects'])
+    status, out = self._cli(['add', 'project', '--name', 'daemon'])
+    self.assertEqual(status, 0)
+    self.assertEqual(len(self.logins), 1)
+    self.assertTrue('daemon' in [node[0] for node in self.server.data.nodes['project'].values()])
+
+  def testBatchReadsStdinOfClient(self):
+    status, out = self._cli(['batch'], "add project One\nadd project Two\n")
+    self.assertEqual(status, 0)
+    self.assertEqual([line.split("\t")[:2] for line in out.splitlines()], [['1', 'OK'], ['2', 'OK']])
+
+
+if __name__ == '__main__':
+  unittest.main()
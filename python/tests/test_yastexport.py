@@ -0,0 +1,75 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+#
+# Tests of the record export against the fake Yast server
+#
+# Usage: python -m pytest tests, or python tests/test_yastexport.py
+#
+
+import os, sys, csv, shutil, tempfile, unittest
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(testDir, '..'))
+sys.path.insert(0, os.path.join(testDir, '..', 'benchmarks'))
+from yastlib import Yast, YastStatus, YastStatusError
+from yastexport import exportRecords
+from yastfakeserver import YastFakeServer
+
+
+class YastExportTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = YastFakeServer(records=300)
+    self.server.start()
+    self.dir = tempfile.mkdtemp()
+    self.path = os.path.join(self.dir, 'records.csv')
+
+  def tearDown(self):
+    self.server.stop()
+    shutil.rmtree(self.dir)
+
+  def _yast(self, propagateExceptions=False):
+    yast = Yast()
+    yast.host = self.server.host
+    yast.useHttps = False
+    yast.propagateExceptions = propagateExceptions
+    yast.login('export', 'export')
+    return yast
+
+  def testExportCsv(self):
+    yast = self._yast()
+    count = exportRecords(yast, self.path, chunkSize=100)
+    self.assertEqual(count, len(yast.getRecords()))
+    with open(self.path) as f:
+      rows = list(csv.DictReader(f))
+    self.assertEqual(len(rows), count)
+    self.assertTrue(all(row['projectName'] for row in rows))
+
+  def testFailedQueryLeavesNoFile(self):
+    self.server.httpd.maxRecords = 10
+    yast = self._yast()
+    self.assertEqual(exportRecords(yast, self.path), False)
+    self.assertEqual(yast.getStatus(), YastStatus.REQUEST_TOO_LARGE)
+    self.assertFalse(os.path.exists(self.path))
+
+    yast = self._yast(True)
+    self.assertRaises(YastStatusError, exportRecords, yast, self.path)
+    self.assertFalse(os.path.exists(self.path))
+
+  def testFailedLogin(self):
+    yast = self._yast()
+    yast.hash = 'wrong'
+    self.assertEqual(exportRecords(yast, self.path), False)
+    self.assertEqual(yast.getStatus(), YastStatus.NOT_LOGGED_IN)
+    self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == '__main__':
+  unittest.main()
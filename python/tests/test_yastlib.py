@@ -0,0 +1,528 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+#
+# Tests of Yast requests against the fake Yast server
+#
+# Usage: python -m pytest tests, or python tests/test_yastlib.py
+#
+
+import io, os, sys, time, socket, shutil, tempfile, threading, unittest
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(testDir, '..'))
+sys.path.insert(0, os.path.join(testDir, '..', 'benchmarks'))
+from yastlib import *
+from yastfakeserver import YastFakeServer, YastFakeHandler
+
+
+class YastTestCase(unittest.TestCase):
+
+  records = 1000
+
+  def setUp(self):
+    self.server = YastFakeServer(records=self.records)
+    self.server.start()
+    self.requests = []
+
+  def tearDown(self):
+    self.server.stop()
+
+  # Returns a logged in Yast. Statuses of its responses are kept in requests
+  def _yast(self, user='test'):
+    yast = Yast()
+    yast.host = self.server.host
+    yast.useHttps = False
+    yast.propagateExceptions = True
+    yast.connectionPool = YastConnectionPool()
+    yast.login(user, 'test')
+    request = yast._request
+    def recordingRequest(xml):
+      tree = request(xml)
+      self.requests.append(int(tree.attrib['status']))
+      return tree
+    yast._request = recordingRequest
+    return yast
+
+
+# Pool counting new connections. Idle connections are not checked, as if the
+# server closed them just after the check
+class UncheckedPool(YastConnectionPool):
+
+  def __init__(self):
+    YastConnectionPool.__init__(self)
+    self.connects = 0
+
+  def connect(self, host, useHttps, timeout):
+    self.connects += 1
+    return YastConnectionPool.connect(self, host, useHttps, timeout)
+
+  def _isStale(self, conn):
+    return False
+
+  # Close the writing side of the idle connections, so sending on them fails
+  def breakIdle(self):
+    for conns in self._idle.values():
+      for conn, lastUsed in conns:
+        conn.sock.shutdown(socket.SHUT_WR)
+
+
+class ConnectionPoolTest(YastTestCase):
+
+  def testReusesConnection(self):
+    yast = self._yast()
+    pool = yast.connectionPool = UncheckedPool()
+    for i in range(5):
+      yast.getProjects()
+    self.assertEqual(pool.connects, 1)
+
+  def testRetriesOnStaleConnection(self):
+    yast = self._yast()
+    pool = yast.connectionPool = UncheckedPool()
+    projects = yast.getProjects()
+    pool.breakIdle()
+    self.assertEqual(sorted(yast.getProjects()), sorted(projects))
+    self.assertEqual(pool.connects, 2)
+
+    # A write that could not be sent is sent again too
+    pool.breakIdle()
+    project = yast.add(YastProject("Pooled", "", "#ffffff", 0))
+    self.assertNotEqual(project.id, -1)
+    self.assertEqual(pool.connects, 3)
+
+
+class StreamedRecordsTest(YastTestCase):
+
+  def testSameAsGetRecords(self):
+    yast = self._yast()
+    pool = yast.connectionPool = UncheckedPool()
+    records = yast.getRecords()
+    streamed = list(yast.iterRecords())
+    self.assertEqual([r.id for r in streamed], sorted(records))
+    self.assertEqual([(r.typeId, r.project, r.variables) for r in streamed],
+                     [(records[r.id].typeId, records[r.id].project, records[r.id].variables) for r in streamed])
+    self.assertEqual(len(yast.getRecords(batch=True)), len(records))
+    # Fully read streams leave their connection for reuse
+    self.assertEqual(pool.connects, 1)
+
+  def testStoppedEarly(self):
+    yast = self._yast()
+    yast.rateLimiter = YastRateLimiter()
+    records = yast.iterRecords()
+    self.assertEqual(next(records).id, 1)
+    records.close()
+    self.assertEqual(yast.rateLimiter.inFlight(yast.host), 0)
+    self.assertEqual(len(yast.getRecords()), self.records)
+
+  def testErrorStopsIteration(self):
+    self.server.httpd.maxRecords = 10
+    yast = self._yast()
+    yast.propagateExceptions = False
+    self.assertEqual(list(yast.iterRecords()), [])
+    self.assertEqual(yast.getStatus(), YastStatus.REQUEST_TOO_LARGE)
+
+
+class XmlRequestTest(YastTestCase):
+
+  text = u"A <b>&amp; ]]> \u00e9\u4e2d ]]]]> end"
+
+  def testTextRoundTrip(self):
+    yast = self._yast()
+    project = YastProject(self.text, self.text + " description", "#ffffff", 0)
+    work = YastRecordWork(1, 1000, 2000, self.text, 0, 10.5, 20.25, 1)
+    call = YastRecordPhonecall(2, 3000, 4000, self.text, 1, "555-1234", 1)
+    yast.addBulk([project, work, call])
+
+    projects = yast.getProjects()
+    self.assertEqual((projects[project.id].name, projects[project.id].description),
+                     (self.text, self.text + " description"))
+    records = yast.getRecords({'id': str(work.id) + "," + str(call.id)})
+    self.assertEqual((records[work.id].startTime, records[work.id].comment, records[work.id].hourlyIncome,
+                      records[work.id].isBillable), (1000, self.text, 20.25, 1))
+    self.assertEqual((records[call.id].project, records[call.id].comment, records[call.id].phoneNumber),
+                     (2, self.text, "555-1234"))
+
+  def testObjectsOnly(self):
+    yast = self._yast()
+    objects = [YastProject("P", "", "#ffffff", 0), YastFolder("F", "", "#ffffff", 0)]
+    objects[0].id = 7
+    objects[1].id = 8
+    xml = yast._xmlObjects(objects, True, False)
+    self.assertEqual(xml, '<objects><project><id>7</id></project><folder><id>8</id></folder></objects>')
+
+
+# Handler rejecting adds of more than maxObjects objects
+class LimitedHandler(YastFakeHandler):
+
+  maxObjects = 3
+
+  def req_data_add(self, req, user, xml):
+    if len(list(xml.find('objects'))) > self.maxObjects:
+      self.sendStatus(req, YastStatus.REQUEST_TOO_LARGE)
+    else:
+      YastFakeHandler.req_data_add(self, req, user, xml)
+
+
+class BulkTest(YastTestCase):
+
+  def testSplitsRejectedBatches(self):
+    self.server.httpd.RequestHandlerClass = LimitedHandler
+    yast = self._yast()
+    projects = [YastProject("Bulk " + str(i), "", "#ffffff", 0) for i in range(10)]
+    self.assertTrue(yast.addBulk(projects, workers=2, maxObjects=8) is projects)
+    names = dict((id, p.name) for id, p in yast.getProjects().items())
+    self.assertEqual([names[p.id] for p in projects], ["Bulk " + str(i) for i in range(10)])
+    self.assertTrue(YastStatus.REQUEST_TOO_LARGE in self.requests)
+
+  def testPacksBatchesBySize(self):
+    yast = self._yast()
+    projects = [YastProject("Sized " + str(i), "x" * 100, "#ffffff", 0) for i in range(10)]
+    yast.addBulk(projects, maxBytes=len(projects[0].toXml(False, True)) * 3)
+    self.assertEqual(len(self.requests), 4)
+    self.assertTrue(all(p.id != -1 for p in projects))
+
+    applied = []
+    yast.deleteBulk(projects, maxObjects=4, applied=applied)
+    self.assertEqual(len(applied), 10)
+    self.assertFalse(any(p.id in yast.getProjects() for p in projects))
+
+  def testObjectTooLarge(self):
+    class RejectingHandler(LimitedHandler):
+      maxObjects = 0
+    self.server.httpd.RequestHandlerClass = RejectingHandler
+    yast = self._yast()
+    yast.propagateExceptions = False
+    self.assertEqual(yast.addBulk([YastProject("Large", "", "#ffffff", 0)]), False)
+    self.assertEqual(yast.getStatus(), YastStatus.REQUEST_TOO_LARGE)
+
+
+# Handler answering SERVER_MAINTENANCE to the next server.maintenance
+# requests after login. Requests after login are counted in server.received
+class MaintenanceHandler(YastFakeHandler):
+
+  def handleRequest(self, text):
+    if 'req="auth.login"' in text:
+      YastFakeHandler.handleRequest(self, text)
+      return
+    self.server.received += 1
+    if self.server.maintenance != 0:
+      self.server.maintenance -= 1
+      self.sendStatus('', YastStatus.SERVER_MAINTENANCE)
+    else:
+      YastFakeHandler.handleRequest(self, text)
+
+
+class RetryTest(YastTestCase):
+
+  def setUp(self):
+    YastTestCase.setUp(self)
+    self.server.httpd.RequestHandlerClass = MaintenanceHandler
+    self.server.httpd.maintenance = 0
+    self.server.httpd.received = 0
+
+  def _yast(self):
+    yast = YastTestCase._yast(self)
+    yast.retryBackoff = 0.01
+    yast.retryMaxBackoff = 0.02
+    yast.circuitBreaker = YastCircuitBreaker(failureThreshold=3, resetTimeout=0.2)
+    return yast
+
+  def testRetriesIdempotentRequests(self):
+    yast = self._yast()
+    events = []
+    yast.observers = [events.append]
+    self.server.httpd.maintenance = 2
+    self.assertTrue(len(yast.getProjects()) > 0)
+    self.assertEqual(self.server.httpd.received, 3)
+    self.assertEqual(events[-1].retries, 2)
+    self.assertFalse(yast.circuitBreaker.isOpen(yast.host))
+
+    # Gives up after maxRetries
+    self.server.httpd.maintenance = -1
+    yast.circuitBreaker.failureThreshold = 0
+    self.assertRaises(YastStatusError, yast.getProjects)
+    self.assertEqual(yast.getStatus(), YastStatus.SERVER_MAINTENANCE)
+    self.assertEqual(self.server.httpd.received, 3 + 1 + yast.maxRetries)
+
+  def testWritesAreNotRetried(self):
+    yast = self._yast()
+    self.server.httpd.maintenance = 1
+    self.assertRaises(YastStatusError, yast.add, YastProject("Once", "", "#ffffff", 0))
+    self.assertEqual(self.server.httpd.received, 1)
+
+  def testCircuitBreaker(self):
+    yast = self._yast()
+    yast.maxRetries = 0
+    breaker = yast.circuitBreaker
+    self.server.httpd.maintenance = -1
+    for i in range(3):
+      self.assertRaises(YastStatusError, yast.getProjects)
+    self.assertTrue(breaker.isOpen(yast.host))
+
+    # Open: fails without sending
+    self.assertRaises(Exception, yast.getProjects)
+    self.assertEqual(yast.getStatus(), YastStatus.LIB_CIRCUIT_OPEN)
+    self.assertEqual(self.server.httpd.received, 3)
+
+    # After resetTimeout one trial request is sent. A failure opens the
+    # circuit again, a success closes it
+    time.sleep(0.25)
+    self.assertRaises(YastStatusError, yast.getProjects)
+    self.assertEqual(self.server.httpd.received, 4)
+    self.assertTrue(breaker.isOpen(yast.host))
+    self.assertFalse(breaker.allow(yast.host))
+    time.sleep(0.25)
+    self.server.httpd.maintenance = 0
+    self.assertTrue(len(yast.getProjects()) > 0)
+    self.assertFalse(breaker.isOpen(yast.host))
+
+  def testRetriesConnectionErrors(self):
+    yast = self._yast()
+    yast.circuitBreaker.failureThreshold = 0
+    # Nothing listens on the port of a stopped server
+    server = YastFakeServer(records=1)
+    yast.host = server.host
+    server.httpd.server_close()
+    events = []
+    yast.observers = [events.append]
+    started = time.time()
+    self.assertRaises(socket.error, yast.getProjects)
+    self.assertEqual(events[-1].retries, yast.maxRetries)
+    # Waits at least half of each backoff, which is at most retryMaxBackoff
+    self.assertTrue(time.time() - started >= 0.005 + 0.01 + 0.01)
+
+
+# Handler keeping the users of data.getProjects requests in server.users
+class UserOrderHandler(YastFakeHandler):
+
+  def req_data_getProjects(self, req, user, xml):
+    self.server.users.append(user)
+    YastFakeHandler.req_data_getProjects(self, req, user, xml)
+
+
+class RateLimiterTest(YastTestCase):
+
+  def setUp(self):
+    YastTestCase.setUp(self)
+    self.server.httpd.RequestHandlerClass = UserOrderHandler
+    self.server.httpd.users = []
+    self.limiter = YastRateLimiter()
+
+  def _limitedYast(self, user):
+    yast = self._yast(user)
+    yast.rateLimiter = self.limiter
+    return yast
+
+  # Run getProjects in a thread per Yast
+  def _startRequests(self, yasts):
+    threads = [threading.Thread(target=yast.getProjects) for yast in yasts]
+    for thread in threads:
+      thread.start()
+    return threads
+
+  def testAccountsTakeTurns(self):
+    busy = [self._limitedYast('busy') for i in range(5)]
+    other = [self._limitedYast('other') for i in range(2)]
+    self.limiter.configure(self.server.host, maxInFlight=1)
+    self.server.httpd.delay = 0.1
+
+    # All busy requests wait before the other account asks for a turn
+    threads = self._startRequests(busy)
+    time.sleep(0.05)
+    threads += self._startRequests(other)
+    for thread in threads:
+      thread.join()
+    self.assertEqual(self.server.httpd.users,
+                     ['busy', 'busy', 'other', 'busy', 'other', 'busy', 'busy'])
+    self.assertEqual(self.limiter.inFlight(self.server.host), 0)
+
+  def testRate(self):
+    yasts = [self._limitedYast('test') for i in range(5)]
+    self.limiter.configure(self.server.host, rate=20, burst=1)
+    started = time.time()
+    for thread in self._startRequests(yasts):
+      thread.join()
+    self.assertEqual(len(self.server.httpd.users), 5)
+    self.assertTrue(time.time() - started >= 4 / 20.0 - 0.01)
+
+    # Without a turn free, tryAcquire does not take one
+    self.limiter.configure('idle', rate=0.001, burst=1)
+    self.assertTrue(self.limiter.tryAcquire('idle'))
+    self.assertFalse(self.limiter.tryAcquire('idle'))
+    self.limiter.release('idle')
+
+
+# Handler keeping the Range headers of report downloads in server.ranges. The
+# next server.cuts downloads end after half of their data
+class CuttingHandler(YastFakeHandler):
+
+  def sendReport(self, query):
+    self.server.ranges.append(self.headers.get('Range'))
+    if self.server.cuts == 0:
+      YastFakeHandler.sendReport(self, query)
+      return
+    self.server.cuts -= 1
+    wfile = self.wfile
+    self.wfile = io.BytesIO()
+    YastFakeHandler.sendReport(self, query)
+    data = self.wfile.getvalue()
+    self.wfile = wfile
+    self.wfile.write(data[:len(data) - self.server.reportSize // 2])
+    self.close_connection = True
+
+
+class DownloadTest(YastTestCase):
+
+  def setUp(self):
+    YastTestCase.setUp(self)
+    self.server.httpd.RequestHandlerClass = CuttingHandler
+    self.server.httpd.ranges = []
+    self.server.httpd.cuts = 0
+    self.dir = tempfile.mkdtemp()
+    self.path = os.path.join(self.dir, 'report.pdf')
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+    YastTestCase.tearDown(self)
+
+  def _read(self):
+    with open(self.path, 'rb') as f:
+      return f.read()
+
+  def testResumesCutDownload(self):
+    yast = self._yast()
+    yast.retryBackoff = 0.01
+    report = yast.getReport('pdf')
+    self.server.httpd.ranges = []
+    self.server.httpd.cuts = 2
+    sizes = []
+    size = yast.getReportTo('pdf', self.path, chunkSize=4096, progress=lambda written, total: sizes.append(total))
+    half = self.server.httpd.reportSize // 2
+    self.assertEqual(size, len(report))
+    self.assertEqual(self._read(), report)
+    self.assertEqual(self.server.httpd.ranges, [None, 'bytes=%d-' % half, 'bytes=%d-' % half])
+    self.assertEqual(set(sizes), set([len(report)]))
+
+  def testResumesPartialFile(self):
+    yast = self._yast()
+    report = yast.getReport('pdf')
+    with open(self.path, 'wb') as f:
+      f.write(report[:1000])
+    self.server.httpd.ranges = []
+    self.assertEqual(yast.getReportTo('pdf', self.path, resume=True), len(report))
+    self.assertEqual(self._read(), report)
+    self.assertEqual(self.server.httpd.ranges, ['bytes=1000-'])
+
+    # Nothing left to fetch
+    self.assertEqual(yast.getReportTo('pdf', self.path, resume=True), len(report))
+    self.assertEqual(self._read(), report)
+
+    # Without resume the report is fetched again
+    self.assertEqual(yast.getReportTo('pdf', self.path), len(report))
+    self.assertEqual(self.server.httpd.ranges[-1], None)
+    self.assertEqual(self._read(), report)
+
+
+class DirtyTrackingTest(YastTestCase):
+
+  def testChangesOnlyModifiedObjects(self):
+    yast = self._yast()
+    records = yast.getRecords({'id': '3,4,5'})
+    projects = yast.getProjects()
+    sent = len(self.requests)
+    self.assertEqual(yast.change(list(records.values()) + list(projects.values())),
+                     list(records.values()) + list(projects.values()))
+    self.assertEqual(len(self.requests), sent)
+
+    records[4].comment = "Dirty"
+    projects[2].name = "Dirty project"
+    # Setting a value back is no change
+    records[5].comment = "Changed"
+    records[5].comment = self.server.data.record(5)[3][2]
+    self.assertEqual(records[4].dirtyFields(), ['comment'])
+    self.assertFalse(records[5].isDirty())
+
+    xmls = []
+    request = yast._request
+    def keepingRequest(xml):
+      xmls.append(xml)
+      return request(xml)
+    yast._request = keepingRequest
+    yast.change(list(records.values()) + list(projects.values()))
+    self.assertEqual(len(xmls), 1)
+    self.assertEqual(xmls[0].count('<id>'), 2)
+    self.assertEqual(self.server.data.record(4)[3][2], "Dirty")
+    self.assertEqual(self.server.data.nodes['project'][2][0], "Dirty project")
+    self.assertFalse(records[4].isDirty() or projects[2].isDirty())
+
+    # Sent once only
+    yast.change(list(records.values()) + list(projects.values()))
+    self.assertEqual(len(xmls), 1)
+
+  def testDetectsConflicts(self):
+    first = self._yast()
+    second = self._yast()
+    mine = first.getRecords({'id': '6,7'})
+    theirs = second.getRecords({'id': '6,7'})
+    theirs[6].comment = "Theirs"
+    second.change(theirs[6], checkConflicts=True)
+
+    mine[6].comment = "Mine"
+    mine[7].comment = "Mine"
+    self.assertRaises(YastConflictError, first.change, [mine[6], mine[7]], checkConflicts=True)
+    self.assertEqual(first.getStatus(), YastStatus.LIB_CONFLICT)
+    self.assertEqual(self.server.data.record(6)[3][2], "Theirs")
+    self.assertNotEqual(self.server.data.record(7)[3][2], "Mine")
+
+    # Without the conflicting record, and after a change with the time it
+    # was updated at
+    first.change(mine[7], checkConflicts=True)
+    self.assertEqual(self.server.data.record(7)[3][2], "Mine")
+    mine[7].comment = "Mine again"
+    first.change(mine[7], checkConflicts=True)
+    self.assertEqual(self.server.data.record(7)[3][2], "Mine again")
+
+
+class ShardedRecordsTest(YastTestCase):
+
+  def testSplitsWindowsTooLarge(self):
+    self.server.httpd.maxRecords = 40
+    yast = self._yast()
+    base = self.server.data.baseTime
+    records = yast.getRecordsSharded({'timeFrom': base, 'timeTo': base + self.records * 600},
+                                     workers=2, windowSize=100000)
+    self.assertEqual(sorted(records), list(range(1, self.records + 1)))
+    # Windows after the first failures are no larger than the halves of those
+    self.assertTrue(self.requests.count(YastStatus.REQUEST_TOO_LARGE) < 20)
+
+  def testFailsBelowMinWindowSize(self):
+    self.server.httpd.maxRecords = 5
+    yast = self._yast()
+    base = self.server.data.baseTime
+    with self.assertRaises(YastStatusError) as raised:
+      yast.getRecordsSharded({'timeFrom': base, 'timeTo': base + 100000}, workers=2)
+    self.assertEqual(raised.exception.status, YastStatus.REQUEST_TOO_LARGE)
+    self.assertEqual(yast.getStatus(), YastStatus.REQUEST_TOO_LARGE)
+
+
+class RequestTest(YastTestCase):
+
+  def testUnparsableResponse(self):
+    yast = self._yast()
+    # Report downloads answer with text instead of XML
+    yast.apiPath = self.server.httpd.dlPath
+    yast.requestMethodGet = True
+    with self.assertRaises(Exception) as raised:
+      yast.getProjects()
+    self.assertTrue(str(raised.exception).startswith("Error parsing response from Yast:\nReport"))
+    self.assertEqual(yast.getStatus(), YastStatus.LIB_XML_PARSE_ERROR)
+
+
+if __name__ == '__main__':
+  unittest.main()
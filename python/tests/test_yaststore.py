@@ -0,0 +1,76 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+#
+# Tests of the local store against the fake Yast server
+#
+# Usage: python -m pytest tests, or python tests/test_yaststore.py
+#
+
+import os, sys, unittest
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(testDir, '..'))
+sys.path.insert(0, os.path.join(testDir, '..', 'benchmarks'))
+from yastlib import Yast, YastRecordWork
+from yaststore import YastStore
+from yastfakeserver import YastFakeServer
+
+
+class YastStoreTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = YastFakeServer(records=300)
+    self.server.start()
+    self.yast = Yast()
+    self.yast.host = self.server.host
+    self.yast.useHttps = False
+    self.yast.propagateExceptions = True
+    self.yast.login('store', 'store')
+    self.store = YastStore(':memory:', self.yast)
+
+  def tearDown(self):
+    self.store.close()
+    self.server.stop()
+
+  def _summary(self, records):
+    return dict((id, (r.typeId, r.project, r.timeUpdated, r.variables)) for id, r in records.items())
+
+  def testIncrementalSync(self):
+    self.assertEqual(self.store.getLastSync(), None)
+    self.assertEqual(self.store.sync(), {'changed': 300, 'deleted': 0})
+    self.assertEqual(self._summary(self.store.getRecords()), self._summary(self.yast.getRecords()))
+    self.assertEqual(sorted(self.store.getProjects()), sorted(self.yast.getProjects()))
+    self.assertEqual(self.store.sync(), {'changed': 0, 'deleted': 0})
+
+    # Change, add and delete records in Yast
+    records = self.yast.getRecords({'id': '5,7'})
+    records[5].variables['comment'] = "Changed"
+    self.yast.change(records[5])
+    start = self.server.data.baseTime + 299 * 600
+    self.yast.add(YastRecordWork(1, start, start + 600, "Added", 0))
+    self.yast.delete(records[7])
+
+    self.assertEqual(self.store.sync(), {'changed': 2, 'deleted': 1})
+    local = self.store.getRecords()
+    self.assertEqual(self._summary(local), self._summary(self.yast.getRecords()))
+    self.assertEqual(local[5].variables['comment'], "Changed")
+    self.assertFalse(7 in local)
+    self.assertTrue(self.store.getLastSync() != None)
+
+  def testFailedSyncKeepsRecords(self):
+    self.store.sync()
+    self.yast.delete(self.yast.getRecords({'id': '9'})[9])
+    self.server.httpd.maxRecords = 10
+    self.assertRaises(Exception, self.store.sync)
+    self.assertEqual(len(self.store.getRecords()), 300)
+
+
+if __name__ == '__main__':
+  unittest.main()
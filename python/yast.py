@@ -22,10 +22,56 @@
 #  * Host parameter can now start with 'http://'
 #  * Added support for new work record variables
 #
+# 0.11
+#  * Added --meta-cache to keep projects, folders and record types between runs
+#  * print sum aggregates records as columns
+#  * report streams the report as it is downloaded. Added --output and --resume
+#  * Added --report-cache to keep downloaded reports between runs
+#  * Project and folder names are resolved through an index instead of a scan
+#  * print hier sums records with YastRollup, in time linear in records and
+#    projects
+#  * Added daemon command, which runs commands forwarded by yast.py in one
+#    process when YAST_DAEMON is set
+#  * Added batch command, which reads add, change and delete operations from
+#    stdin and sends them in bulk requests
+#  * Only the parsers of the invoked command are built, and networking
+#    modules are loaded on first use, which halves the startup time
+#  * Added --session-cache to reuse the hash of a password login between runs
+#  * Added get records --format fixed, csv and ndjson, which print records as
+#    they are received
+#  * Added export records, which writes records into Parquet, Arrow or CSV
+#    files in chunks
+#
 
-import argparse, time, re, datetime, io, sys
+import argparse, time, re, datetime, io, sys, os
+from collections import OrderedDict
+
+# Global options followed by a value
+_valueOptions = ('-u', '--user', '-p', '--password', '-x', '--hash', '-d', '--host', '--limit', '--cache-dir',
+                 '--meta-cache', '--report-cache')
+
+# Returns the command of command line arguments without building the parser:
+# the first argument that is neither a global option nor the value of one
+def _commandOf(argv):
+  i = 0
+  while i < len(argv):
+    if argv[i] == '--':
+      return argv[i + 1] if i + 1 < len(argv) else None
+    if not argv[i].startswith('-'):
+      return argv[i]
+    i += 2 if argv[i] in _valueOptions else 1
+  return None
+
+# Forward the command to a running daemon if YAST_DAEMON is set, without
+# loading the rest. Runs the command here if no daemon answers
+if __name__ == '__main__' and os.environ.get('YAST_DAEMON') and _commandOf(sys.argv[1:]) != 'daemon':
+  from yastdaemon import forwardCommand
+  status = forwardCommand(os.environ['YAST_DAEMON'], sys.argv[1:])
+  if status != None:
+    sys.exit(status)
 
 from yastlib import *
+from yasthier import YastHierIndex, YastRollup
 
 # Yast CLI
 class YastCli(object):
@@ -41,13 +87,70 @@ class YastCli(object):
   projects = None
   folders = None
   recordTypes = None
+  hierIndex = None
+
+  # YastDaemonSession when run by a daemon, which keeps the Yast instance and
+  # logins between commands
+  session = None
+
+  # Names of record types by id
+  _typeNames = {1: YastRecordWork.typeName, 3: YastRecordPhonecall.typeName}
+
+  # Operations of the batch command by their leading words, as (op, kind,
+  # parser of the remaining words)
+  _batchCommands = {('add', 'record', 'work'): ('add', 'work', 'parsAddRecordWork'),
+                    ('add', 'record', 'phonecall'): ('add', 'phonecall', 'parsAddRecordPhonecall'),
+                    ('add', 'project'): ('add', 'project', 'parsAddProject'),
+                    ('add', 'folder'): ('add', 'folder', 'parsAddFolder'),
+                    ('change', 'record', 'any'): ('change', 'any', 'parsChangeRecordAny'),
+                    ('change', 'record', 'work'): ('change', 'work', 'parsChangeRecordWork'),
+                    ('change', 'record', 'phonecall'): ('change', 'phonecall', 'parsChangeRecordPhonecall'),
+                    ('change', 'project'): ('change', 'project', 'parsChangeProject'),
+                    ('change', 'folder'): ('change', 'folder', 'parsChangeFolder'),
+                    ('delete', 'record', 'any'): ('delete', 'any', 'parsDeleteRecordAny'),
+                    ('delete', 'record', 'work'): ('delete', 'work', 'parsDeleteRecordWork'),
+                    ('delete', 'record', 'phonecall'): ('delete', 'phonecall', 'parsDeleteRecordPhonecall'),
+                    ('delete', 'project'): ('delete', 'project', 'parsDeleteProject'),
+                    ('delete', 'folder'): ('delete', 'folder', 'parsDeleteFolder')}
+
+  # Record classes by kind of batch operation, None for any record
+  _batchRecordTypes = {'any': None, 'work': YastRecordWork, 'phonecall': YastRecordPhonecall}
+
+  # Options of the fields of CSV and JSON batch rows, and the options of true
+  # and false values of flags
+  _batchOptions = {'project': '--project', 'startTime': '--start-time', 'endTime': '--end-time',
+                   'comment': '--comment', 'hourlyCost': '--hourly-cost', 'hourlyIncome': '--hourly-income',
+                   'phoneNumber': '--phone-number', 'name': '--name', 'description': '--description',
+                   'color': '--color', 'parent': '--parent'}
+  _batchFlags = {'isRunning': ('--running', '--stopped'), 'isBillable': ('--billable', '--not-billable'),
+                 'outgoing': ('--outgoing', '--incoming')}
+
+  # Commands with their help and the methods creating their parsers
+  _commands = OrderedDict([
+    ('login', ("Login and return hash that can be used with future commands", '_createParserLogin')),
+    ('user', ("Manage user(s)", '_createParserUser')),
+    ('add', ("Add data", '_createParserAdd')),
+    ('change', ("Change data", '_createParserChange')),
+    ('delete', ("Delete data", '_createParserDelete')),
+    ('batch', ("Run many add, change and delete operations read from stdin with one login, sent in bulk requests",
+               '_createParserBatch')),
+    ('get', ("Get data", '_createParserGet')),
+    ('report', ("Generate and download report", '_createParserReport')),
+    ('export', ("Export data into columnar files", '_createParserExport')),
+    ('daemon', ("Run commands in a background process, which keeps logins, caches and connections. "
+                "Set YAST_DAEMON to its socket to use it", '_createParserDaemon')),
+    ('print', ("Display information", '_createParserPrint'))])
 
   # Runs Yast CLI
-  def execute(self):
-    # Parse command line arguments
+  # @param argv command line arguments. Defaults to those of the process
+  def execute(self, argv=None):
+    # Parse command line arguments. The first pass finds the command, whose
+    # parsers are then built for the second
     self._createParser()
     try:
-      self.args = self.parsers['pars'].parse_args()
+      command = getattr(self.parsers['pars'].parse_known_args(argv)[0], 'command', None)
+      self._createParser(command)
+      self.args = self.parsers['pars'].parse_args(argv)
     except SystemExit as e:
       # Modify argparse return code on error
       sys.exit(YastStatus.CLI_ARGUMENT_ERROR if str(e) != '0' else 0)
@@ -57,6 +160,12 @@ class YastCli(object):
     self.yast.propagateExceptions = True
     self.yast.useHttps = self.args.https
     self.yast.host = re.match('^(?:http://)?(.+)$', self.args.host, re.IGNORECASE).group(1)
+    if self.args.meta_cache > 0:
+      self.yast.metaCache = YastMetaCache(self.args.meta_cache, path=os.path.join(self._cacheDir(), "meta.json"))
+    if self.args.report_cache > 0:
+      self.yast.reportCache = YastReportCache(os.path.join(self._cacheDir(), "reports"), self.args.report_cache)
+    if self.args.session_cache:
+      self.yast.sessionCache = YastSessionCache(os.path.join(self._cacheDir(), "sessions.json"))
 
     # Execute command
     try:
@@ -70,9 +179,12 @@ class YastCli(object):
       sys.exit(self.yast.getStatus() if self.yast.getStatus() < 255 else 255)
     
   
-  # Sets up and returns argument parser
-  def _createParser(self):
+  # Sets up argument parser. Only the parsers of one command are built, other
+  # commands are only listed with their help
+  # @param command name of the command to build the parsers of, or None
+  def _createParser(self, command=None):
     # Shorthand
+    self.parsers = {}
     p = self.parsers
     p['pars'] = argparse.ArgumentParser(description="Yast Python CLI", add_help=True)
     p['cmds'] = p['pars'].add_subparsers()
@@ -109,16 +221,35 @@ class YastCli(object):
                            help="When printing projects/folders/records, only print their ids")
     p['pars'].add_argument('--limit', type=int, dest="limit", default=-1,
                            help="When printing projects/folders/records, limit number of printed elements to this value")
-                           
-        
-    # login command
-    p['parsLogin'] = p['cmds'].add_parser('login', help="Login and return hash that can be used with future commands")
+    p['pars'].add_argument('--cache-dir', dest='cache_dir', default=os.path.join(os.path.expanduser("~"), ".cache", "yast"),
+                           help="Directory for cached data. Defaults to ~/.cache/yast")
+    p['pars'].add_argument('--meta-cache', type=int, dest='meta_cache', metavar='TTL', default=0,
+                           help="Cache projects, folders and record types between runs for TTL seconds")
+    p['pars'].add_argument('--report-cache', type=int, dest='report_cache', metavar='TTL', default=0,
+                           help="Cache reports between runs for TTL seconds. Reports of periods that ended before yesterday are kept until evicted")
+    p['pars'].add_argument('--session-cache', dest='session_cache', action='store_true', default=False,
+                           help="Keep the hash of a login with password between runs, instead of logging in every time. "
+                           "Logs in again when Yast no longer accepts it")
+
+    # Commands
+    for name, (help, create) in self._commands.items():
+      if name == command:
+        getattr(self, create)(p['cmds'].add_parser(name, help=help))
+      else:
+        p['cmds'].add_parser(name, help=help, add_help=False).set_defaults(command=name)
+
+
+  # login command
+  def _createParserLogin(self, parser):
+    p = self.parsers
+    p['parsLogin'] = parser
     p['parsLogin'].set_defaults(func=self._reqLogin)
 
 
-    ###
-    # user command
-    p['parsUser'] = p['cmds'].add_parser('user', help="Manage user(s)")
+  # user command
+  def _createParserUser(self, parser):
+    p = self.parsers
+    p['parsUser'] = parser
     p['subUser'] = p['parsUser'].add_subparsers()
 
     # userGetInfo command
@@ -136,10 +267,11 @@ class YastCli(object):
     p['parsUserSetSetting'].set_defaults(func=self._reqUserSetSetting)
 
 
-    ###
-    # add command
-    p['parsAdd'] = p['cmds'].add_parser('add', help="Add data")
-    p['subAdd'] = p['parsAdd'].add_subparsers()
+  # Parent parsers of the arguments of records, projects and folders
+  def _createDataArgs(self):
+    p = self.parsers
+    if 'argsRecordId' in p:
+      return
 
     # Record id arguments. When specified, id is never optional and always positional
     p['argsRecordId'] = argparse.ArgumentParser(add_help=False, argument_default=argparse.SUPPRESS)
@@ -193,7 +325,14 @@ class YastCli(object):
     p['argsProjectData'].add_argument('parent', nargs='?', help="Folder to put it in. Default is no folder")
     p['argsProjectData'].add_argument('--parent', dest='parent',
                                       help="Folder to put it in. Default is no folder.  See 'print parent-id' command for help")
-    
+
+
+  # add command
+  def _createParserAdd(self, parser):
+    self._createDataArgs()
+    p = self.parsers
+    p['parsAdd'] = parser
+    p['subAdd'] = p['parsAdd'].add_subparsers()
     
     # add record command
     p['parsAddRecord'] = p['subAdd'].add_parser('record', help="Add a record")
@@ -218,9 +357,11 @@ class YastCli(object):
     p['parsAddFolder'].set_defaults(func=self._reqAddFolder)
 
 
-    ###
-    # change command
-    p['parsChange'] = p['cmds'].add_parser('change', help="Change data")
+  # change command
+  def _createParserChange(self, parser):
+    self._createDataArgs()
+    p = self.parsers
+    p['parsChange'] = parser
     p['subChange'] = p['parsChange'].add_subparsers()
 
     # change record command
@@ -250,9 +391,11 @@ class YastCli(object):
     p['parsChangeFolder'].set_defaults(func=self._reqChangeFolder)
 
 
-    ###
-    # delete command
-    p['parsDelete'] = p['cmds'].add_parser('delete', help="Delete data")
+  # delete command
+  def _createParserDelete(self, parser):
+    self._createDataArgs()
+    p = self.parsers
+    p['parsDelete'] = parser
     p['subDelete'] = p['parsDelete'].add_subparsers()
 
     # delete record command
@@ -281,21 +424,54 @@ class YastCli(object):
     p['parsDeleteFolder'].set_defaults(func=self._reqDeleteFolder)
 
 
-    ###
-    # get command
-    p['parsGet'] = p['cmds'].add_parser('get', help="Get data")
+  # batch command
+  def _createParserBatch(self, parser):
+    p = self.parsers
+    p['parsBatch'] = parser
+    p['parsBatch'].add_argument('--format', dest='format', choices=['lines', 'csv', 'json'], default='lines',
+                                help="Input is one command per line like 'add record work Project 10:00 11:00', "
+                                "CSV with a header, or one JSON object per line. CSV and JSON rows have the columns "
+                                "op, type and the names of the fields, e.g. op=change, type=work, id, comment")
+    p['parsBatch'].add_argument('--batch-size', type=int, dest='batch_size', metavar='N', default=1000,
+                                help="Send at most this many consecutive operations of the same kind together")
+    p['parsBatch'].add_argument('--workers', type=int, dest='workers', metavar='N', default=4,
+                                help="Requests sent in parallel")
+    p['parsBatch'].set_defaults(func=self._reqBatch)
+
+    # Parsers of the operations
+    cmds = argparse.ArgumentParser(prog=parser.prog).add_subparsers()
+    for name in ('add', 'change', 'delete'):
+      getattr(self, self._commands[name][1])(cmds.add_parser(name))
+
+
+  # Add arguments for record queries to a parser
+  def _addQueryArgs(self, parser):
+    parser.add_argument('-f', '--from', dest='timeFrom', metavar="TF", default=argparse.SUPPRESS,
+                        help="Get records starting from this time")
+    parser.add_argument('-t', '--to', dest='timeTo', metavar="TT", default=argparse.SUPPRESS,
+                        help="Get records up till this time")
+    parser.add_argument('--type', dest='type', default=argparse.SUPPRESS, help="Id or name of type. Comma separated")
+    parser.add_argument('--parent', dest='parent', default=argparse.SUPPRESS,
+                        help="Id or name of parent project or folder. Comma separated. See 'print parent-id' command for help")
+
+
+  # get command
+  def _createParserGet(self, parser):
+    p = self.parsers
+    p['parsGet'] = parser
     p['subGet'] = p['parsGet'].add_subparsers()
-
-    # Arguments for record queries
-    p['argsQueryRecords'] = argparse.ArgumentParser(add_help=False, argument_default=argparse.SUPPRESS)
-    p['argsQueryRecords'].add_argument('-f', '--from', dest='timeFrom', metavar="TF", help="Get records starting from this time")
-    p['argsQueryRecords'].add_argument('-t', '--to', dest='timeTo', metavar="TT", help="Get records up till this time")
-    p['argsQueryRecords'].add_argument('--type', dest='type', help="Id or name of type. Comma separated")
-    p['argsQueryRecords'].add_argument('--parent', dest='parent', help="Id or name of parent project or folder. Comma separated. See 'print parent-id' command for help")
     
     # getRecords command
-    p['parsGetRecords'] = p['subGet'].add_parser('records', parents=[p['argsQueryRecords']], help="Get records")
+    p['parsGetRecords'] = p['subGet'].add_parser('records', help="Get records")
+    self._addQueryArgs(p['parsGetRecords'])
     p['parsGetRecords'].add_argument('--id', dest='id', help="Comma separated list of record ids")
+    p['parsGetRecords'].add_argument('--format', dest='format', choices=['table', 'fixed', 'csv', 'ndjson'], default='table',
+                                     help="table prints sorted columns when all records are received. fixed, csv and "
+                                     "ndjson print each record as soon as it is received, in the order of Yast")
+    p['parsGetRecords'].add_argument('--widths', dest='widths', metavar='W,W,..',
+                                     help="Column widths of --format fixed. Fit to the first --sample records by default")
+    p['parsGetRecords'].add_argument('--sample', type=int, dest='sample', metavar='N', default=100,
+                                     help="Number of records --format fixed fits column widths to")
     p['parsGetRecords'].set_defaults(func=self._reqGetRecords)
 
     # getProjects command
@@ -307,30 +483,72 @@ class YastCli(object):
     p['parsGetFolders'].set_defaults(func=self._reqGetFolders)
 
     
-    ###
-    # report command
-    p['parsReport'] = p['cmds'].add_parser('report', parents=[p['argsQueryRecords']], help="Generate and download report")
+  # report command
+  def _createParserReport(self, parser):
+    p = self.parsers
+    p['parsReport'] = parser
+    self._addQueryArgs(p['parsReport'])
     p['parsReport'].add_argument('format', choices=['pdf', 'html', 'xls', 'csv'], help="Report format")
     p['parsReport'].add_argument('--group-by', dest='groupBy', help="Values to group report by")
     p['parsReport'].add_argument('--constraints', dest='constraints', metavar="C", help="Additional constraints")
+    p['parsReport'].add_argument('-o', '--output', dest='output', metavar="FILE", help="Write report to this file instead of stdout")
+    p['parsReport'].add_argument('--resume', dest='resume', action='store_true', default=False,
+                                 help="Continue a partial download in the --output file")
     p['parsReport'].set_defaults(func=self._reqReport)
+
+
+  # export command
+  def _createParserExport(self, parser):
+    p = self.parsers
+    p['parsExport'] = parser
+    p['subExport'] = p['parsExport'].add_subparsers()
+
+    # export records command
+    p['parsExportRecords'] = p['subExport'].add_parser('records', help="Export records into a Parquet, Arrow or CSV file")
+    self._addQueryArgs(p['parsExportRecords'])
+    p['parsExportRecords'].add_argument('file', help="File to write")
+    p['parsExportRecords'].add_argument('--id', dest='id', help="Comma separated list of record ids")
+    p['parsExportRecords'].add_argument('--format', dest='format', choices=['parquet', 'arrow', 'csv'],
+                                        help="File format. Defaults to the format of the file extension. "
+                                        "parquet and arrow require pyarrow")
+    p['parsExportRecords'].add_argument('--chunk-size', type=int, dest='chunk_size', metavar='N', default=65536,
+                                        help="Number of records written at a time")
+    p['parsExportRecords'].set_defaults(func=self._reqExportRecords)
     
     
-    ###
-    # print command
-    p['parsPrint'] = p['cmds'].add_parser('print', help="Display information")
+  # daemon command
+  def _createParserDaemon(self, parser):
+    p = self.parsers
+    p['parsDaemon'] = parser
+    p['parsDaemon'].add_argument('--socket', dest='socket', metavar='PATH',
+                                 help="Socket to listen on. Defaults to daemon.sock in the cache directory")
+    p['parsDaemon'].add_argument('--idle-timeout', type=int, dest='idle_timeout', metavar='S', default=3600,
+                                 help="Exit after this many seconds without commands")
+    p['parsDaemon'].add_argument('--meta-ttl', type=int, dest='meta_ttl', metavar='S', default=300,
+                                 help="Keep projects, folders and record types for this many seconds")
+    p['parsDaemon'].add_argument('--stop', dest='stop', action='store_true', default=False,
+                                 help="Stop the daemon listening on the socket")
+    p['parsDaemon'].set_defaults(func=self._reqDaemon)
+
+
+  # print command
+  def _createParserPrint(self, parser):
+    p = self.parsers
+    p['parsPrint'] = parser
     p['subPrint'] = p['parsPrint'].add_subparsers()
     
     # print hier command
-    p['parsPrintHier'] = p['subPrint'].add_parser('hier', parents=[p['argsQueryRecords']], 
+    p['parsPrintHier'] = p['subPrint'].add_parser('hier', 
                                                   help="Displays folder/project hierarcy from the given query. Optionally displays record info")
+    self._addQueryArgs(p['parsPrintHier'])
     p['parsPrintHier'].add_argument('--sum-time', dest='sum_time', action='store_true', default=False, help="Summarize record time in folder/projects")
     p['parsPrintHier'].add_argument('--no-empty', dest='no_empty', action='store_true', default=False, help="Only show folders/projects with records")
     p['parsPrintHier'].set_defaults(func=self._reqPrintHier)
 
     # print sum command
-    p['parsPrintSum'] = p['subPrint'].add_parser('sum', parents=[p['argsQueryRecords']], 
+    p['parsPrintSum'] = p['subPrint'].add_parser('sum', 
                                                   help="Displays sum of record time")
+    self._addQueryArgs(p['parsPrintSum'])
     p['parsPrintSum'].add_argument( '--sum-total', dest='sum_total', action='store_true', default=False, 
                                     help="By default, sum is split into different record types. Set this to sum it all up, only displaying one number")
     p['parsPrintSum'].set_defaults(func=self._reqPrintSum)
@@ -383,9 +601,18 @@ class YastCli(object):
 
   # Create Yast instance
   def _createYast(self):
+    if self.session != None:
+      return self.session.commandYast()
     return Yast()
 
 
+  # Returns cache directory, creating it readable by owner only if missing
+  def _cacheDir(self):
+    if not os.path.isdir(self.args.cache_dir):
+      os.makedirs(self.args.cache_dir, 0o700)
+    return self.args.cache_dir
+
+
   # Handle login. Not required for all requests
   def _login(self, commandName):
     if self.args.user == None:
@@ -399,7 +626,10 @@ class YastCli(object):
           raise Exception("Username and either password or hash must be provided for command \"" + commandName + "\"")
         else:
           # Login
-          self.yast.login(self.args.user, self.args.password)
+          if self.session != None:
+            self.session.login(self.yast, self.args.user, self.args.password)
+          else:
+            self.yast.login(self.args.user, self.args.password)
       else:
         # Username and hash provided. Already logged in
         self.yast.user = self.args.user
@@ -434,7 +664,7 @@ class YastCli(object):
           if isMapArray:
             ret.append((sel, (lambda self,n: lambda self,obj: obj[n])(self,sel)))
           else:
-            ret.append((sel, (lambda self,n: lambda self,obj: vars(obj)[n])(self,sel)))
+            ret.append((sel, (lambda self,n: lambda self,obj: getattr(obj, n))(self,sel)))
       else:
         ret.append(sel)
     return ret
@@ -480,7 +710,60 @@ class YastCli(object):
         if isinstance(objMap, dict) else isinstance(objMap, YastRecordWork)
     calls = any([isinstance(o, YastRecordPhonecall) for o in objMap.values()]) \
         if isinstance(objMap, dict) else isinstance(objMap, YastRecordPhonecall)
-    self._printObjMap(objMap, ["id"] if self.args.only_id else ["id", 
+    self._printObjMap(objMap, self._recordColumns(work, calls), "id")
+
+  # Print records one by one as they are received, without sorting
+  # @param records iterable of records, e.g. from iterRecords
+  # @param format 'fixed' for columns of fixed width, 'csv' or 'ndjson'
+  def _streamRecords(self, records, format):
+    propSel = self._preparePropSel(self._recordColumns(True, True), [])
+    names = [name for (name, func) in propSel]
+    records = iter(records)
+    if self.args.limit != -1:
+      import itertools
+      records = itertools.islice(records, self.args.limit)
+
+    if format == 'csv':
+      import csv
+      writer = csv.writer(sys.stdout, lineterminator="\n")
+      if not self.args.silent:
+        writer.writerow(names)
+      for obj in records:
+        writer.writerow([func(self, obj) for (name, func) in propSel])
+
+    elif format == 'ndjson':
+      import json
+      for obj in records:
+        sys.stdout.write(json.dumps(OrderedDict([(name, func(self, obj)) for (name, func) in propSel])) + "\n")
+
+    else:
+      # Widths not given fit the header and the first records
+      rows = [] if self.args.silent else [names]
+      colWidth = [int(w) for w in self.args.widths.split(",")][:len(names)] if self.args.widths else []
+      if len(colWidth) < len(names):
+        sampled = []
+        for obj in records:
+          sampled.append([str(func(self, obj)) for (name, func) in propSel])
+          if len(sampled) >= self.args.sample:
+            break
+        rows += sampled
+        colWidth += [max([len(row[i]) for row in rows] + [0]) + 2 for i in range(len(colWidth), len(names))]
+      if not self.args.pretty:
+        colWidth = [0] * len(names)
+
+      separator = "," if self.args.csv else ""
+      def write(row):
+        sys.stdout.write("".join([(value + separator).ljust(width) for (value, width) in zip(row, colWidth)]) + "\n")
+      for row in rows:
+        write(row)
+      for obj in records:
+        write([str(func(self, obj)) for (name, func) in propSel])
+
+  # Returns columns of printed records
+  # @param work include columns of work records
+  # @param calls include columns of phonecall records
+  def _recordColumns(self, work, calls):
+    return ["id"] if self.args.only_id else ["id", 
                                ("type", lambda self,obj: obj.typeName),
                                ("project", lambda self,obj: self._strProjectName(obj.project)),
                                ("startTime", lambda self,obj: self._strTime(obj.variables['startTime'])),
@@ -491,8 +774,7 @@ class YastCli(object):
                                ("outgoing", lambda self,obj: self._defaultMap(obj.variables, 'outgoing', "")) if calls else "",
                                ("hourlyCost", lambda self,obj: self._defaultMap(obj.variables, 'hourlyCost', "")) if work else "",
                                ("hourlyIncome", lambda self,obj: self._defaultMap(obj.variables, 'hourlyIncome', "")) if work else "",
-                               ("isBillable", lambda self,obj: self._defaultMap(obj.variables, 'isBillable', "")) if work else ""],
-                      "id")
+                               ("isBillable", lambda self,obj: self._defaultMap(obj.variables, 'isBillable', "")) if work else ""]
 
   def _printProjects(self, objMap):
     self._printObjMap(objMap, ["id"] if self.args.only_id else ["id", "name", 
@@ -554,61 +836,18 @@ class YastCli(object):
   #  are matches for both project and folders
   # parent is parent id or -1 if unknown
   def _resolveHierNode(self, text, type, parent):
-    node = None
+    return self._getHierIndex().resolve(text, type, parent, self._strFolderName)
 
-    if text.startswith("/"):
-      # We are at root
-      parent = 0
-      text = text[1:]
-
-    # Find name of node
-    split = text.split("/", 1)
-    name = split[0]
-    
-    # If / after name, we are looking for a folder now
-    curType = YastFolder if len(split) > 1 else type
-
-    # See if name can be uniquely resolved
-    if curType == YastProject or curType == None:
-      if self.projects == None:
-        self.projects = self.yast.getProjects()
-          
-      for p in self.projects.values():
-        if p.name == name and (parent == -1 or p.parentId == parent):
-          if node == None:
-            node = p.id
-          else:
-            raise Exception("Name \"" + name + "\"" + 
-                            (" with parent folder \"" + self._strFolderName(parent) + "\"" if parent != 0 and parent != -1 else "") +
-                            " does not uniquely identify a " +
-                            ("project" if curType == YastFolder else "project/folder"))
-      
-    if curType == YastFolder or curType == None:
-      if self.folders == None:
-        self.folders = self.yast.getFolders()
-          
-      for p in self.folders.values():
-        if p.name == name and (parent == -1 or p.parentId == parent):
-          if node == None:
-            node = p.id
-          else:
-            raise Exception("Name \"" + name + "\"" +
-                            (" with parent folder \"" + self._strFolderName(parent) + "\"" if parent != 0 and parent != -1 else "") +
-                            " does not uniquely identify a " +
-                            ("folder" if curType == YastFolder else "project/folder"))
-
-    if node == None:
-      raise Exception("Name \"" + name + "\"" +
-                      (" with parent folder \"" + self._strFolderName(parent) + "\"" if parent != 0 and parent != -1 else "") +
-                      " does not identify a " +
-                      ("folder" if curType == YastFolder else ("project" if curType == YastProject else "project/folder")))
-      
-    if len(split) > 1:
-      # Continue with child
-      return self._resolveHierNode(split[1], type, node)
-    else:
-      # We have our result
-      return node
+  # Returns index of the projects and folders for resolving names
+  def _getHierIndex(self):
+    if self.projects == None:
+      self.projects = self.yast.getProjects()
+    if self.folders == None:
+      self.folders = self.yast.getFolders()
+    if self.hierIndex == None or self.hierIndex.projects is not self.projects or \
+       self.hierIndex.folders is not self.folders:
+      self.hierIndex = YastHierIndex(self.projects, self.folders)
+    return self.hierIndex
     
 
   # Resolve project from string. Can either be a project id or a name
@@ -794,41 +1033,22 @@ class YastCli(object):
   # add record work command
   def _reqAddRecordWork(self):
     self._login("add record work")
-    self._printRecords(self.yast.add(YastRecordWork(self._resolveProject(self.args.project if 'project' in self.args else 0), 
-                                                    self._resolveTime(self.args.startTime if 'startTime' in self.args else ''), 
-                                                    self._resolveTime(self.args.endTime if 'endTime' in self.args else ''), 
-                                                    self.args.comment if 'comment' in self.args else '',
-                                                    0 if not 'isRunning' in self.args or not self.args.isRunning else 1,
-                                                    self.args.hourlyCost if 'hourlyCost' in self.args else -1,
-                                                    self.args.hourlyIncome if 'hourlyIncome' in self.args else -1,
-                                                    0 if not 'isBillable' in self.args or not self.args.isBillable else 1)))
+    self._printRecords(self.yast.add(self._newRecordWork(self.args)))
 
   # add record phonecall command
   def _reqAddRecordPhonecall(self):
     self._login("add record phonecall")
-    self._printRecords(self.yast.add(YastRecordPhonecall(self._resolveProject(self.args.project if 'project' in self.args else 0), 
-                                                         self._resolveTime(self.args.startTime if 'startTime' in self.args else ''), 
-                                                         self._resolveTime(self.args.endTime if 'endTime' in self.args else ''), 
-                                                         self.args.comment if 'comment' in self.args else '',
-                                                         0 if not 'isRunning' in self.args or not self.args.isRunning else 1,
-                                                         self.args.phoneNumber if 'phoneNumber' in self.args else '',
-                                                         0 if not 'outgoing' in self.args or not self.args.outgoing else 1)))
+    self._printRecords(self.yast.add(self._newRecordPhonecall(self.args)))
 
   # add project command
   def _reqAddProject(self):
     self._login("add project")
-    self._printProjects(self.yast.add(YastProject(self.args.name if 'name' in self.args else "", 
-                                                  self.args.description if 'description' in self.args else "", 
-                                                  self.args.color if 'color' in self.args else "blue",
-                                                  self._resolveFolder(self.args.parent) if 'parent' in self.args else 0)))
+    self._printProjects(self.yast.add(self._newProject(YastProject, self.args)))
 
   # add folder command
   def _reqAddFolder(self):
     self._login("add folder")
-    self._printProjects(self.yast.add(YastFolder(self.args.name if 'name' in self.args else "", 
-                                                 self.args.description if 'description' in self.args else "", 
-                                                 self.args.color if 'color' in self.args else "blue",
-                                                 self._resolveFolder(self.args.parent) if 'parent' in self.args else 0)))
+    self._printProjects(self.yast.add(self._newProject(YastFolder, self.args)))
 
   # change record command
   def _reqChangeRecord(self, type):
@@ -837,49 +1057,17 @@ class YastCli(object):
     if len(rec) != 1:
       raise Exception("Invalid record id: " + str(self.args.id))
     rec = next(iter(rec.values()))
-    if type != None and not isinstance(rec, type):
-      raise Exception("Record is of type '{0}', not of requested type '{1}'".format(rec.typeName, type.typeName))
-    if 'project' in self.args: rec.project = self._resolveProject(self.args.project)
-    if 'startTime' in self.args: rec.variables['startTime'] = self._resolveTime(self.args.startTime)
-    if 'endTime' in self.args: rec.variables['endTime'] = self._resolveTime(self.args.endTime)
-    if 'comment' in self.args: rec.variables['comment'] = self.args.comment
-    if 'isRunning' in self.args: rec.variables['isRunning'] = 1 if self.args.isRunning else 0
-    if 'phoneNumber' in self.args: rec.variables['phoneNumber'] = self.args.phoneNumber
-    if 'outgoing' in self.args: rec.variables['outgoing'] = 1 if self.args.outgoing else 0
-    if 'hourlyCost' in self.args: rec.variables['hourlyCost'] = self.args.hourlyCost
-    if 'hourlyIncome' in self.args: rec.variables['hourlyIncome'] = self.args.hourlyIncome
-    if 'isBillable' in self.args: rec.variables['isBillable'] = 1 if self.args.isBillable else 0
-    self._printRecords(self.yast.change(rec))
+    self._printRecords(self.yast.change(self._changedRecord(rec, type, self.args)))
 
   # change project command
   def _reqChangeProject(self):
     self._login("change project")
-    id = self._resolveProject(self.args.id)
-    if self.projects == None:
-      self.projects = self.yast.getProjects()
-    if not id in self.projects:
-      raise Exception("Invalid project id: " + str(id))
-    proj = self.projects[id]
-    if 'name' in self.args: proj.name = self.args.name
-    if 'description' in self.args: proj.description = self.args.description
-    if 'color' in self.args: proj.primaryColor = self.args.color
-    if 'parent' in self.args: proj.parentId = self._resolveFolder(self.args.parent)
-    self._printProjects(self.yast.change(proj))
+    self._printProjects(self.yast.change(self._changedProject(YastProject, self.args)))
 
   # change folder command
   def _reqChangeFolder(self):
     self._login("change folder")
-    id = self._resolveFolder(self.args.id)
-    if self.folders == None:
-      self.folders = self.yast.getFolders()
-    if not id in self.folders:
-      raise Exception("Invalid folder id: " + str(id))
-    folder = self.folders[id]
-    if 'name' in self.args: folder.name = self.args.name
-    if 'description' in self.args: folder.description = self.args.description
-    if 'color' in self.args: folder.primaryColor = self.args.color
-    if 'parent' in self.args: folder.parentId = self._resolveFolder(self.args.parent)
-    self._printProjects(self.yast.change(folder))    
+    self._printProjects(self.yast.change(self._changedProject(YastFolder, self.args)))
 
 
   # delete record command
@@ -891,38 +1079,340 @@ class YastCli(object):
       if len(rec) != 1:
         raise Exception("Invalid record id")
       rec = next(iter(rec.values()))
-      if not isinstance(rec, type):
-        raise Exception("Record is of type '{0}', not of requested type '{1}'".format(rec.typeName, type.typeName))
-    if rec == None:
-      rec = YastRecord(-1, -1, None)
-      rec.id = self.args.id
-    self.yast.delete(rec)
+    self.yast.delete(self._deletedRecord(rec, type, self.args))
     self._printOk()
 
   # delete project command
   def _reqDeleteProject(self):
     self._login("delete project")
-    id = self._resolveProject(self.args.id)
-    proj = YastProject("","","",0);
-    proj.id = id
-    self.yast.delete(proj)
+    self.yast.delete(self._deletedProject(YastProject, self.args))
     self._printOk()
 
   # delete folder command
   def _reqDeleteFolder(self):
     self._login("delete folder")
-    id = self._resolveFolder(self.args.id)
-    folder= YastFolder("","","",0);
-    folder.id = id   
-    self.yast.delete(folder)
+    self.yast.delete(self._deletedProject(YastFolder, self.args))
     self._printOk()
+
+
+  # Returns a new work record from command arguments
+  def _newRecordWork(self, args):
+    return YastRecordWork(self._resolveProject(args.project if 'project' in args else 0), 
+                          self._resolveTime(args.startTime if 'startTime' in args else ''), 
+                          self._resolveTime(args.endTime if 'endTime' in args else ''), 
+                          args.comment if 'comment' in args else '',
+                          0 if not 'isRunning' in args or not args.isRunning else 1,
+                          args.hourlyCost if 'hourlyCost' in args else -1,
+                          args.hourlyIncome if 'hourlyIncome' in args else -1,
+                          0 if not 'isBillable' in args or not args.isBillable else 1)
+
+  # Returns a new phonecall record from command arguments
+  def _newRecordPhonecall(self, args):
+    return YastRecordPhonecall(self._resolveProject(args.project if 'project' in args else 0), 
+                               self._resolveTime(args.startTime if 'startTime' in args else ''), 
+                               self._resolveTime(args.endTime if 'endTime' in args else ''), 
+                               args.comment if 'comment' in args else '',
+                               0 if not 'isRunning' in args or not args.isRunning else 1,
+                               args.phoneNumber if 'phoneNumber' in args else '',
+                               0 if not 'outgoing' in args or not args.outgoing else 1)
+
+  # Returns a new project or folder from command arguments
+  # @param type YastProject or YastFolder
+  def _newProject(self, type, args):
+    return type(args.name if 'name' in args else "", 
+                args.description if 'description' in args else "", 
+                args.color if 'color' in args else "blue",
+                self._resolveFolder(args.parent) if 'parent' in args else 0)
+
+  # Returns a record with the changes of command arguments
+  # @param type required record class, or None for any
+  def _changedRecord(self, rec, type, args):
+    if type != None and not isinstance(rec, type):
+      raise Exception("Record is of type '{0}', not of requested type '{1}'".format(rec.typeName, type.typeName))
+    if 'project' in args: rec.project = self._resolveProject(args.project)
+    if 'startTime' in args: rec.variables['startTime'] = self._resolveTime(args.startTime)
+    if 'endTime' in args: rec.variables['endTime'] = self._resolveTime(args.endTime)
+    if 'comment' in args: rec.variables['comment'] = args.comment
+    if 'isRunning' in args: rec.variables['isRunning'] = 1 if args.isRunning else 0
+    if 'phoneNumber' in args: rec.variables['phoneNumber'] = args.phoneNumber
+    if 'outgoing' in args: rec.variables['outgoing'] = 1 if args.outgoing else 0
+    if 'hourlyCost' in args: rec.variables['hourlyCost'] = args.hourlyCost
+    if 'hourlyIncome' in args: rec.variables['hourlyIncome'] = args.hourlyIncome
+    if 'isBillable' in args: rec.variables['isBillable'] = 1 if args.isBillable else 0
+    return rec
+
+  # Returns a project or folder with the changes of command arguments
+  # @param type YastProject or YastFolder
+  def _changedProject(self, type, args):
+    if type == YastProject:
+      id = self._resolveProject(args.id)
+      if self.projects == None:
+        self.projects = self.yast.getProjects()
+      nodes = self.projects
+    else:
+      id = self._resolveFolder(args.id)
+      if self.folders == None:
+        self.folders = self.yast.getFolders()
+      nodes = self.folders
+    if not id in nodes:
+      raise Exception("Invalid " + ("project" if type == YastProject else "folder") + " id: " + str(id))
+    node = nodes[id]
+    if 'name' in args: node.name = args.name
+    if 'description' in args: node.description = args.description
+    if 'color' in args: node.primaryColor = args.color
+    if 'parent' in args: node.parentId = self._resolveFolder(args.parent)
+    return node
+
+  # Returns the record to delete for command arguments
+  # @param rec the record if fetched, to check its type
+  # @param type required record class, or None for any
+  def _deletedRecord(self, rec, type, args):
+    if type != None and not isinstance(rec, type):
+      raise Exception("Record is of type '{0}', not of requested type '{1}'".format(rec.typeName, type.typeName))
+    if rec == None:
+      rec = YastRecord(-1, -1, None)
+      rec.id = args.id
+    return rec
+
+  # Returns the project or folder to delete for command arguments
+  # @param type YastProject or YastFolder
+  def _deletedProject(self, type, args):
+    node = type("", "", "", 0)
+    node.id = self._resolveProject(args.id) if type == YastProject else self._resolveFolder(args.id)
+    return node
+
     
+  # batch command
+  def _reqBatch(self):
+    self._login("batch")
+
+    # Report invalid rows instead of exiting
+    def error(message):
+      raise Exception(message)
+    for op, kind, name in self._batchCommands.values():
+      self.parsers[name].error = error
+      self.parsers[name].exit = lambda status=0, message=None: error(message or "Invalid arguments")
+
+    # Consecutive operations of the same kind are sent together
+    self._batchFailed = []
+    self._batchCount = 0
+    pending = []
+    key = None
+    for number, op, kind, args in self._batchRows(sys.stdin, self.args.format):
+      self._batchCount += 1
+      if op != None:
+        rowKey = (op, kind in ('project', 'folder'))
+        if rowKey != key or len(pending) >= max(self.args.batch_size, 1):
+          self._batchFlush(key, pending)
+          pending = []
+          key = rowKey
+      pending.append((number, kind, args))
+    self._batchFlush(key, pending)
+
+    if self._batchFailed:
+      self.yast.status = self._batchFailed[0]
+      raise Exception(str(len(self._batchFailed)) + " of " + str(self._batchCount) + " operations failed")
+
+  # Yields (row number, op, kind, arguments) for the operations of batch
+  # input. op is None and arguments the exception if a row is invalid
+  def _batchRows(self, input, format):
+    if format == 'csv':
+      import csv
+      rows = enumerate(csv.DictReader(input), 1)
+    else:
+      import json, shlex
+      rows = enumerate(input, 1)
+
+    for number, row in rows:
+      try:
+        if format == 'lines':
+          words = shlex.split(row, comments=True)
+          if not words:
+            continue
+          op, kind, name, argv = self._batchCommand(words)
+        else:
+          if format == 'json':
+            if not row.strip():
+              continue
+            row = json.loads(row)
+            if not isinstance(row, dict):
+              raise Exception("Row is not an object")
+          op, kind, name, argv = self._batchFields(row)
+        args = self.parsers[name].parse_args(argv)
+      except Exception as e:
+        yield number, None, None, e
+        continue
+      yield number, op, kind, args
+
+  # Returns (op, kind, parser name, arguments) of a line of batch input
+  def _batchCommand(self, words):
+    for n in (3, 2):
+      command = self._batchCommands.get(tuple(words[:n]))
+      if command != None:
+        return command + (words[n:],)
+    raise Exception("Unknown operation: " + " ".join(words[:3]))
+
+  # Returns (op, kind, parser name, arguments) of a CSV or JSON batch row
+  def _batchFields(self, row):
+    op = row.get('op')
+    kind = 'any' if row.get('type') == 'record' else row.get('type')
+    commands = [c for c in self._batchCommands.values() if c[0] == op and c[1] == kind]
+    if not commands:
+      raise Exception("Unknown operation: " + str(op) + " " + str(row.get('type')))
+
+    argv = []
+    for field, value in row.items():
+      if field in ('op', 'type', 'id') or value == None or value == '':
+        continue
+      if field in self._batchOptions:
+        argv.append(self._batchOptions[field] + "=" + str(value))
+      elif field in self._batchFlags:
+        if not isinstance(value, bool):
+          if not str(value).lower() in ('0', '1', 'false', 'true', 'no', 'yes'):
+            raise Exception("Invalid value of " + field + ": " + str(value))
+          value = str(value).lower() in ('1', 'true', 'yes')
+        argv.append(self._batchFlags[field][0 if value else 1])
+      else:
+        raise Exception("Unknown field: " + str(field))
+    if row.get('id') != None and row.get('id') != '':
+      argv += ['--', str(row['id'])]
+    return commands[0] + (argv,)
+
+  # Send operations of the batch command of one kind, and print their results
+  # @param key (op, True for projects and folders)
+  # @param pending array of (row number, kind, arguments)
+  def _batchFlush(self, key, pending):
+    if not pending:
+      return
+    op = key[0] if key != None else None
+    results = {}
+
+    # Records to change, or to delete if their type is checked
+    def fetched(kind, args):
+      return kind in self._batchRecordTypes and args.id.isdigit() and \
+          (op == 'change' or (op == 'delete' and self._batchRecordTypes[kind] != None))
+    records = {}
+    fetchError = None
+    ids = [args.id for number, kind, args in pending if not isinstance(args, Exception) and fetched(kind, args)]
+    if ids:
+      try:
+        records = self.yast.getRecords({'id': ",".join(ids)})
+        if not isinstance(records, dict):
+          raise Exception("Failed to fetch records")
+      except Exception as e:
+        records = {}
+        fetchError = (None, e, self.yast.getStatus() if self.yast.getStatus() != YastStatus.SUCCESS else
+                      YastStatus.CLI_EXCEPTION)
+
+    # Objects of the operations. Rows of the same object, e.g. two changes of
+    # a record, share it, so it is sent once with the edits of all of them
+    objects = []
+    unique = {}
+    for number, kind, args in pending:
+      if isinstance(args, Exception):
+        results[number] = (None, args, YastStatus.CLI_ARGUMENT_ERROR)
+        continue
+      if fetchError != None and fetched(kind, args):
+        results[number] = fetchError
+        continue
+      try:
+        o = self._batchObject(op, kind, args, records)
+      except Exception as e:
+        results[number] = (None, e, e.status if isinstance(e, YastStatusError) else YastStatus.CLI_EXCEPTION)
+        continue
+      o = unique.setdefault(self._batchObjectKey(op, o), o)
+      objects.append((number, o))
+
+    if objects:
+      send = {'add': self.yast.addBulk, 'change': self.yast.changeBulk, 'delete': self.yast.deleteBulk}[op]
+      sent = list(unique.values())
+      applied = []
+      error = None
+      try:
+        send(sent, workers=self.args.workers, applied=applied)
+      except Exception as e:
+        error = e
+        status = self.yast.getStatus()
+      # Requests of the batch sent before the failing one were applied, so
+      # their rows are reported as done
+      applied = set(id(o) for o in applied)
+      for number, o in objects:
+        if error == None or id(o) in applied or (op == 'change' and not o.isDirty()):
+          results[number] = (o.id, None, 0)
+        else:
+          results[number] = (None, error, status)
+
+      if key[1]:
+        # Names of projects and folders may have changed
+        self.projects = None
+        self.folders = None
+        self.hierIndex = None
+
+    for number in sorted(results):
+      self._printBatchResult(number, *results[number])
+    sys.stdout.flush()
+
+  # Returns a key of the Yast object an operation of the batch command is on.
+  # Every add is of a new object
+  def _batchObjectKey(self, op, o):
+    if op == 'delete':
+      return ('record' if isinstance(o, YastRecord) else o.__class__.__name__, str(o.id))
+    return id(o)
+
+  # Returns the object of an operation of the batch command
+  # @param records records to change or delete by id
+  def _batchObject(self, op, kind, args, records):
+    if kind in self._batchRecordTypes:
+      type = self._batchRecordTypes[kind]
+      if op == 'add':
+        return self._newRecordWork(args) if kind == 'work' else self._newRecordPhonecall(args)
+      if op == 'delete' and type == None:
+        return self._deletedRecord(None, None, args)
+      rec = records.get(int(args.id)) if args.id.isdigit() else None
+      if rec == None:
+        raise Exception("Invalid record id: " + str(args.id))
+      if op == 'delete':
+        return self._deletedRecord(rec, type, args)
+      # Several changes of a record in one batch apply to the same object
+      return self._changedRecord(rec, type, args)
+
+    type = YastProject if kind == 'project' else YastFolder
+    if op == 'add':
+      return self._newProject(type, args)
+    if op == 'delete':
+      return self._deletedProject(type, args)
+    return self._changedProject(type, args)
+
+  # Print result of an operation of the batch command
+  def _printBatchResult(self, number, id, error, status):
+    if self.args.format == 'json':
+      import json
+      if error == None:
+        print(json.dumps(OrderedDict([('row', number), ('ok', True), ('id', id)])))
+      else:
+        print(json.dumps(OrderedDict([('row', number), ('ok', False), ('status', status),
+                                      ('error', error.__class__.__name__ + ": " + str(error))])))
+    elif error == None:
+      if not self.args.silent:
+        print(str(number) + "\tOK\t" + str(id))
+    else:
+      print("{0:d}\tERROR [{1:04d}]\t{2:s}".format(number, status, error.__class__.__name__ + ": " + str(error)))
+    if error != None:
+      self._batchFailed.append(status)
+
+
   # getRecords command
   def _reqGetRecords(self):
     self._login("get records")
     options = self._optsQueryRecords()
     if self.args.id != None: options['id'] = self.args.id
-    self._printRecords(self.yast.getRecords(options))
+    if self.args.format == 'table':
+      self._printRecords(self.yast.getRecords(options))
+    else:
+      # Fetch project names first, so the records are printed without pause
+      if not self.args.ids and not self.args.only_id and self.projects == None:
+        self.projects = self.yast.getProjects()
+      self._streamRecords(self.yast.iterRecords(options), self.args.format)
         
 
   # getProjects command
@@ -941,13 +1431,63 @@ class YastCli(object):
     options = self._optsQueryRecords()
     if self.args.groupBy != None: options['groupBy'] = self.args.groupBy
     if self.args.constraints != None: options['constraints'] = self.args.constraints
-    report = self.yast.getReport(self.args.format, options)
-    if sys.version_info[0] == 3:
-      sys.stdout.buffer.write(report)
+
+    # Stream report to file or stdout as it is downloaded
+    if self.args.output != None:
+      progress = None
+      if not self.args.silent and sys.stderr.isatty():
+        progress = self._printProgress
+      self.yast.getReportTo(self.args.format, self.args.output, options, progress=progress, resume=self.args.resume)
+      if progress != None:
+        sys.stderr.write("\n")
+    else:
+      sink = sys.stdout.buffer if sys.version_info[0] == 3 else sys.stdout
+      self.yast.getReportTo(self.args.format, sink, options)
+      sink.flush()
+
+  # export records command
+  def _reqExportRecords(self):
+    from yastexport import YastRecordExporter
+    self._login("export records")
+    options = self._optsQueryRecords()
+    if self.args.id != None: options['id'] = self.args.id
+    if self.projects == None:
+      self.projects = self.yast.getProjects()
+    if self.folders == None:
+      self.folders = self.yast.getFolders()
+
+    exporter = YastRecordExporter(self.args.file, self.args.format, self.projects, self.folders,
+                                  self.args.chunk_size)
+    try:
+      exporter.write(self.yast.iterRecords(options))
+      exporter.close()
+    except:
+      exporter.discard()
+      raise
+    if not self.args.silent:
+      print(str(exporter.count) + " records written to " + self.args.file)
+
+  # Show progress of a download on stderr
+  def _printProgress(self, written, total):
+    if total != None:
+      sys.stderr.write("\rDownloaded " + str(written // 1024) + " of " + str(total // 1024) + " KB")
     else:
-      sys.stdout.write(report)
+      sys.stderr.write("\rDownloaded " + str(written // 1024) + " KB")
 
     
+  # daemon command
+  def _reqDaemon(self):
+    import yastdaemon
+    path = self.args.socket if self.args.socket != None else os.path.join(self._cacheDir(), "daemon.sock")
+    if self.args.stop:
+      if not yastdaemon.stopDaemon(path):
+        raise Exception("No Yast daemon is running at " + path)
+      self._printOk()
+    else:
+      yastdaemon.YastDaemon(path, self.args.idle_timeout if self.args.idle_timeout > 0 else None,
+                            self.args.meta_ttl, type(self)).serve()
+
+
   # print hier command
   def _reqPrintHier(self):
     self._login("print hier")
@@ -955,85 +1495,29 @@ class YastCli(object):
     # Folders and projects
     self.folders = self.yast.getFolders()
     self.projects = self.yast.getProjects()
-    
-    if sys.version_info[0] == 3:
-      nodes = dict(self.folders.items() | self.projects.items())
-      nodesSorted = sorted(nodes.items()) if self.args.sort else nodes.items()
-    else:
-      nodes = dict(self.folders.items() + self.projects.items())
-      nodesSorted = sorted(nodes.iteritems()) if self.args.sort else nodes.iteritems()
-    
-    # Prepare userdata
-    for k, n in nodesSorted:
-      n.userData = {'children': [], 'records': [], 'parent': None, 'sum': {}}
-
-    # Link parents and children
-    disconnectPresent = False
-    for k, n in nodesSorted:
-      if n.parentId != 0:
-        if n.parentId in nodes:
-          parent = nodes[n.parentId]
-          n.userData['parent'] = parent
-          parent.userData['children'].append(n)    
-        else:
-          # No access to parent. Mark as disconnected
-          n.parentId = -1
-          disconnectPresent = True
+    rollup = YastRollup(self.projects, self.folders, self.args.sort)
 
-    # Process based on records?
+    # Sum record time per project, then up through the folders
     if self.args.sum_time or self.args.no_empty:
-      recs = self.yast.getRecords(self._optsQueryRecords())
-      for r in recs.values():
-        nodes[r.project].userData['records'].append(r)
-
-      if self.args.sum_time or self.args.no_empty:
-        # Summarize time spent
-        for k, n in nodesSorted:
-          for r in n.userData['records']:
-            # Add to project and all parents
-            dt = r.variables['endTime'] - r.variables['startTime']
-            iterN = n
-            while iterN != None:
-              if not r.typeName in iterN.userData['sum']:
-                iterN.userData['sum'][r.typeName] = dt
-              else:
-                iterN.userData['sum'][r.typeName] += dt
-              iterN = iterN.userData['parent']
-      
-      if self.args.no_empty:
-        # Unlink projects and groups with no time spent
-        for k, n in nodesSorted:
-          if all([v <= 0 for v in n.userData['sum'].values()]):
-            if n.userData['parent'] != None:
-              n.userData['parent'].userData['children'].remove(n)          
-
-    # Recursively gather folder/project data
-    def gatherFunc(n, depth, map, gatherFunc):
-      if not self.args.no_empty or any([t > 0 for t in n.userData['sum'].values()]):
-        map.append({'depth/name': ('-'*depth) + (n.name if not self.args.only_id else n.id),
-                    'type':       'Project' if isinstance(n, YastProject) else 'Folder',
-                    'time':       ", ".join([type + ": " + self._strDuration(duration) for (type, duration) in n.userData['sum'].items()]) \
-                      if self.args.sum_time else ''})
-
-        for n in n.userData['children']:
-          gatherFunc(n, depth+1, map, gatherFunc)
+      rollup.addRecords(self.yast.iterRecords(self._optsQueryRecords()))
+      rollup.propagate()
+
+    def row(depth, n):
+      return {'depth/name': ('-'*depth) + (n.name if not self.args.only_id else str(n.id)),
+              'type':       'Project' if isinstance(n, YastProject) else 'Folder',
+              'time':       ", ".join([self._typeNames[typeId] + ": " + self._strDuration(duration)
+                                       for (typeId, duration) in rollup.durations(n.id).items()]) \
+                if self.args.sum_time else ''}
 
     #Generate hierarcy 
-    map = []
-    for k, n in nodesSorted:
-      # Only do the top nodes
-      if n.parentId == 0:
-        gatherFunc(n, 0, map, gatherFunc)
-        
+    map = [row(depth, n) for depth, n in rollup.walk(skipEmpty=self.args.no_empty)]
+
     #Nodes with missing parents
-    if disconnectPresent:
-      duration = sum([sum([t for t in n.userData['sum'].values()]) for k, n in nodesSorted if n.parentId == -1])
+    if rollup.orphans:
+      duration = sum([rollup.duration(n.id) for n in rollup.orphans])
       if not self.args.no_empty or duration > 0:
         map.append({'depth/name': "__missing_parents__", 'type': "", 'time': ""})
-        for k, n in nodesSorted:
-          # Only do the top nodes
-          if n.parentId == -1:
-            gatherFunc(n, 1, map, gatherFunc)
+        map += [row(depth, n) for depth, n in rollup.walk(rollup.orphans, 1, self.args.no_empty)]
 
     self._printObjMap(map, ["depth/name", "type", "time" if self.args.sum_time else ""])
 
@@ -1042,14 +1526,8 @@ class YastCli(object):
     self._login("print sum")
 
     # Records
-    recs = self.yast.getRecords(self._optsQueryRecords())
-    total = {}
-    for r in recs.values():
-      dt = r.variables['endTime'] - r.variables['startTime']
-      if not r.typeName in total:
-        total[r.typeName] = dt
-      else:
-        total[r.typeName] += dt
+    batch = self.yast.getRecords(self._optsQueryRecords(), batch=True)
+    total = OrderedDict([(self._typeNames[typeId], duration) for typeId, duration in batch.durationByType().items()])
       
     if self.args.sum_total:
       print(self._strDuration(sum([duration for duration in total.values()])))
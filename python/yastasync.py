@@ -0,0 +1,539 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+# Yast Python asyncio LIB
+#
+# Same API as yastlib.Yast, but every request method is a coroutine. Requests
+# use non-blocking keep-alive connections, and the number of requests in flight
+# is bounded per instance. metaCache, reportCache, sessionCache, rateLimiter,
+# circuitBreaker, observers and retries work as in Yast. The file I/O of the
+# caches and waiting for a rate limiter turn that is not free are done in a
+# thread, the rest in the event loop. Requires Python 3.7+
+#
+# Example:
+#   yast = AsyncYast()
+#   await yast.login(user, password)
+#   records, projects = await asyncio.gather(yast.getRecords(), yast.getProjects())
+#
+
+import asyncio, contextvars, ssl, time
+from urllib.parse import urlencode
+from xml.etree import ElementTree
+
+from yastlib import *
+from yastlib import _xmlCdata
+
+# Errors of a failed try of a request
+_transportErrors = (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError)
+
+# Event of the call running in the current task. Events of yastlib are kept
+# per thread, but tasks share the thread of the event loop
+_asyncEvent = contextvars.ContextVar('yastAsyncEvent', default=None)
+
+
+# Asynchronous Yast API client
+class AsyncYast(Yast):
+
+  # Max number of requests in flight at the same time
+  maxConcurrency = 20
+  # Max number of idle keep-alive connections kept
+  maxIdleConnections = 20
+  # Seconds an idle connection is kept before it is discarded
+  idleTimeout = 60
+
+  def __init__(self, maxConcurrency=None):
+    if maxConcurrency != None:
+      self.maxConcurrency = maxConcurrency
+    self._semaphore = None
+    self._renewLock = None
+    self._idle = []
+
+
+  # Login as a given user.
+  # @param user username
+  # @param password password for given user
+  # @return hash hash to use for further requests on this user
+  async def login(self, user, password):
+    async def call(user, hash):
+      if await self._withCache(self.sessionCache, self._cachedLogin, user, password):
+        return self.hash
+
+      self.hash = await self._authLogin(user, password)
+      self.user = user
+      if self.sessionCache != None:
+        await self._withCache(self.sessionCache, self.sessionCache.put, self.host, user, password, self.hash)
+      return self.hash
+    return await self._call(call, user, None, False)
+
+
+  # Get user info
+  # @return map of user info
+  async def userGetInfo(self, user=None, hash=None):
+    async def call(user, hash):
+      resp = await self._request(self._xmlRequest('user.getInfo', user, hash))
+      self._verifyStatus(resp)
+      return self._getXmlFields(resp)
+    return await self._call(call, user, hash)
+
+
+  # Get all user settings
+  # @return map of settings or False on failure
+  async def userGetSettings(self, user=None, hash=None):
+    async def call(user, hash):
+      resp = await self._request(self._xmlRequest('user.getSettings', user, hash))
+      self._verifyStatus(resp)
+      return self._getXmlSettings(resp)
+    return await self._call(call, user, hash)
+
+
+  # Set a user setting
+  # @return TRUE on success, FALSE on error
+  async def userSetSetting(self, key, value, user=None, hash=None):
+    async def call(user, hash):
+      resp = await self._request(self._xmlRequest('user.setSetting', user, hash,
+                                                  '<key><![CDATA[' + _xmlCdata(key) + ']]></key>' +
+                                                  '<value><![CDATA[' + _xmlCdata(value) + ']]></value>'))
+      self._verifyStatus(resp)
+      return True
+    return await self._call(call, user, hash)
+
+
+  # Add records, projects and folders to Yast
+  # @return False on error, objects array if successful
+  async def add(self, objects, user=None, hash=None):
+    async def call(user, hash):
+      resp = await self._request(self._xmlRequest('data.add', user, hash,
+                                                  self._xmlObjects(objects, False, True)))
+      await self._withCache(self._changedCache(), self._invalidateMeta, objects, user)
+      self._verifyStatus(resp)
+      self._updateObjects(objects if isinstance(objects, list) else [objects],
+                          self._xmlDataToStruct(resp, False))
+      return objects
+    return await self._call(call, user, hash)
+
+
+  # Change records, projects and folders in Yast. Only modified objects are
+  # sent, see Yast.change
+  # @return False on error, objects array if successful
+  async def change(self, objects, user=None, hash=None, checkConflicts=False):
+    async def call(user, hash):
+      changed = self._dirtyObjects(objects)
+      if not changed:
+        return objects
+      if checkConflicts:
+        records = self._conflictCandidates(changed)
+        current = {}
+        for start in range(0, len(records), 1000):
+          resp = await self._request(self._xmlRequest('data.getRecords', user, hash,
+                                                      self._xmlConflictQuery(records[start:start + 1000])))
+          self._verifyStatus(resp)
+          current.update(self._xmlDataToStruct(resp)['records'])
+        self._raiseConflicts(records, current)
+
+      resp = await self._request(self._xmlRequest('data.change', user, hash,
+                                                  self._xmlObjects(changed, True, True)))
+      await self._withCache(self._changedCache(), self._invalidateMeta, changed, user)
+      self._verifyStatus(resp)
+      self._updateObjects(changed, self._xmlDataToStruct(resp, False))
+      return objects
+    return await self._call(call, user, hash)
+
+
+  # Delete records, projects and folders in Yast
+  # @return False on error, True if successful
+  async def delete(self, objects, user=None, hash=None):
+    async def call(user, hash):
+      resp = await self._request(self._xmlRequest('data.delete', user, hash,
+                                                  self._xmlObjects(objects, True, False)))
+      await self._withCache(self._changedCache(), self._invalidateMeta, objects, user)
+      self._verifyStatus(resp)
+      return True
+    return await self._call(call, user, hash)
+
+
+  # Returns records of a given user
+  # @param options associative array of options
+  # @return array of records
+  async def getRecords(self, options=None, user=None, hash=None):
+    async def call(user, hash):
+      resp = await self._request(self._xmlRequest('data.getRecords', user, hash,
+                                                  self._xmlQueryOptions(options, ['timeFrom', 'timeTo', 'typeId',
+                                                                                  'parentId', 'id'])))
+      self._verifyStatus(resp)
+      return self._xmlDataToStruct(resp)['records']
+    return await self._call(call, user, hash)
+
+
+  # Returns projects of a given user
+  async def getProjects(self, user=None, hash=None):
+    async def call(user, hash):
+      cached = await self._withCache(self.metaCache, self._getCachedMeta, user, 'projects')
+      if cached != None:
+        return cached
+
+      resp = await self._request(self._xmlRequest('data.getProjects', user, hash))
+      self._verifyStatus(resp)
+      struct = self._xmlDataToStruct(resp)
+      await self._withCache(self.metaCache, self._putCachedMeta, user, 'projects', struct['projects'])
+      return struct['projects']
+    return await self._call(call, user, hash)
+
+
+  # Returns folders of a given user
+  async def getFolders(self, user=None, hash=None):
+    async def call(user, hash):
+      cached = await self._withCache(self.metaCache, self._getCachedMeta, user, 'folders')
+      if cached != None:
+        return cached
+
+      resp = await self._request(self._xmlRequest('data.getFolders', user, hash))
+      self._verifyStatus(resp)
+      struct = self._xmlDataToStruct(resp)
+      await self._withCache(self.metaCache, self._putCachedMeta, user, 'folders', struct['folders'])
+      return struct['folders']
+    return await self._call(call, user, hash)
+
+
+  # Returns record types
+  async def getRecordTypes(self, user=None, hash=None):
+    async def call(user, hash):
+      cached = await self._withCache(self.metaCache, self._getCachedMeta, user, 'recordTypes')
+      if cached != None:
+        return cached
+
+      resp = await self._request(self._xmlRequest('meta.getRecordTypes', user, hash))
+      self._verifyStatus(resp)
+      struct = self._xmlDataToStruct(resp)
+      await self._withCache(self.metaCache, self._putCachedMeta, user, 'recordTypes', struct['recordTypes'])
+      return struct['recordTypes']
+    return await self._call(call, user, hash)
+
+
+  # Returns report data
+  # @param reportFormat format of report
+  # @return raw report data or False on failure
+  async def getReport(self, reportFormat, options=None, user=None, hash=None):
+    async def call(user, hash):
+      cache = self.reportCache
+      if cache != None:
+        key = cache.key(self.host, user, reportFormat, options)
+        data = await self._withCache(cache, self._readCachedReport, cache, key)
+        if data != None:
+          return data
+
+      resp = await self._request(self._xmlRequest('report.getReport', user, hash,
+                                                  '<reportFormat>' + reportFormat + '</reportFormat>' +
+                                                  self._xmlQueryOptions(options, ['timeFrom', 'timeTo', 'typeId', 'parentId',
+                                                                                  'groupBy', 'constraints'])))
+      self._verifyStatus(resp)
+      fields = self._getXmlFields(resp)
+      data = await self._httpRequest('GET', self._reportUrl(fields, user, hash))
+      if cache != None:
+        await self._withCache(cache, cache.put, key, data, cache.immutable(options))
+      return data
+    return await self._call(call, user, hash)
+
+
+  # Close all idle connections
+  async def close(self):
+    idle, self._idle = self._idle, []
+    for conn, lastUsed in idle:
+      conn[1].close()
+
+  async def __aenter__(self):
+    return self
+
+  async def __aexit__(self, excType, exc, tb):
+    await self.close()
+
+
+  # Runs a request coroutine with the same status and error handling as the Yast methods
+  # @param func coroutine function taking user and hash
+  # @param requireLogin resolve user and hash from previous login if not given
+  async def _call(self, func, user, hash, requireLogin=True):
+    self.status = YastStatus.SUCCESS
+    observers = self._getObservers()
+    event = YastRequestEvent(self.host) if observers else None
+    token = _asyncEvent.set(event)
+    try:
+      if requireLogin:
+        user, hash = self._verifyLogin(user, hash)
+      return await func(user, hash)
+    except:
+      if self.status == YastStatus.SUCCESS:
+        self.status = YastStatus.LIB_EXCEPTION
+      if event != None and event.status == None:
+        # Taken before other tasks can change the shared status
+        event.status = self.status
+      if self.propagateExceptions:
+        raise
+      return False
+    finally:
+      _asyncEvent.reset(token)
+      if event != None:
+        self._emit(event, observers)
+
+  # Returns the event of the call running in the current task, or None
+  def _currentEvent(self):
+    return _asyncEvent.get()
+
+  # Call a function using cache. If the cache is kept in a file, the function
+  # runs in a thread so the event loop is not held up by the file I/O
+  async def _withCache(self, cache, func, *args):
+    if cache == None or cache.path == None:
+      return func(*args)
+    return await asyncio.get_event_loop().run_in_executor(None, func, *args)
+
+  # Returns the cache changed by _invalidateMeta that is kept in a file, if any
+  def _changedCache(self):
+    return self.reportCache if self.reportCache != None else self.metaCache
+
+  # Returns a report from reportCache, or None if not cached
+  def _readCachedReport(self, cache, key):
+    f = cache.get(key)
+    if f == None:
+      return None
+    with f:
+      return f.read()
+
+
+  # Send a login request
+  # @return hash
+  async def _authLogin(self, user, password):
+    resp = await self._request(self._xmlLogin(user, password))
+    self._verifyStatus(resp)
+    return resp.find('hash').text
+
+  # Log in again after Yast answered NOT_LOGGED_IN to a request sent with a
+  # hash from sessionCache, see Yast._renewSession
+  # @return request with the new hash, or None if it was not sent with the
+  #         cached hash
+  async def _renewSession(self, request):
+    old = self._sessionFragment(request)
+    if old == None:
+      return None
+    login = self._sessionLogin
+
+    if self._renewLock == None:
+      self._renewLock = asyncio.Lock()
+    async with self._renewLock:
+      if login[3] == None:
+        await self._withCache(self.sessionCache, self.sessionCache.invalidate, self.host, login[0], login[1])
+        hash = await self._authLogin(login[0], login[1])
+        await self._withCache(self.sessionCache, self._sessionRenewed, login, hash)
+    event = self._currentEvent()
+    if event != None:
+      # The event is of the request, not of the login
+      event.request = self._requestName(request)
+    return request.replace(old, old.replace(login[2], login[3]))
+
+
+  # Execute an API request using POST/GET. Idempotent requests are retried on
+  # SERVER_MAINTENANCE and connection errors
+  # @param request full XML request in text format
+  # @return Parsed XML object
+  async def _request(self, request):
+    event = self._currentEvent()
+    if event != None:
+      event.request = self._requestName(request)
+      event.mark('serialize')
+
+    retry = self._isIdempotent(request)
+    deadline = time.time() + self.retryDeadline
+    attempt = 0
+    while True:
+      self._checkCircuit()
+      try:
+        if self.requestMethodGet:
+          response = await self._httpRequest('GET', self.apiPath + "?" + urlencode({'request': request}),
+                                             timeout=self._attemptTimeout(retry, deadline), idempotent=retry)
+        else:
+          headers = {'Content-type': "application/x-www-form-urlencoded", 'Accept': "text/xml"}
+          response = await self._httpRequest('POST', self.apiPath, urlencode({'request': request}), headers,
+                                             timeout=self._attemptTimeout(retry, deadline), idempotent=retry)
+      except _transportErrors:
+        if not await self._retryAfterFailure(retry, attempt, deadline):
+          raise
+        attempt += 1
+        continue
+
+      # Parse xml
+      try:
+        tree = ElementTree.fromstring(response)
+      except:
+        self._getCircuitBreaker().success(self.host)
+        self.status = YastStatus.LIB_XML_PARSE_ERROR
+        raise Exception("Error parsing response from Yast:\n" + response.decode('utf-8', 'replace'))
+      if event != None:
+        event.mark('parse')
+
+      if tree.attrib.get('status') == str(YastStatus.NOT_LOGGED_IN):
+        renewed = await self._renewSession(request)
+        if renewed != None:
+          request = renewed
+          continue
+      if tree.attrib.get('status') == str(YastStatus.SERVER_MAINTENANCE):
+        if await self._retryAfterFailure(retry, attempt, deadline):
+          attempt += 1
+          continue
+      else:
+        self._getCircuitBreaker().success(self.host)
+      return tree
+
+  # Record a failed try of a request, and wait before the next one
+  # @param attempt number of the failed try, from 0
+  # @return True if the request should be tried again
+  async def _retryAfterFailure(self, retry, attempt, deadline):
+    backoff = self._retryBackoff(retry, attempt, deadline)
+    if backoff == None:
+      return False
+    await asyncio.sleep(backoff)
+    event = self._currentEvent()
+    if event != None:
+      event.retries += 1
+      event.mark('network')
+    return True
+
+
+  # Execute a HTTP request on a keep-alive connection. At most maxConcurrency
+  # requests are in flight at the same time, within the limits of rateLimiter
+  # @param timeout seconds to wait for the response. Default is requestTimeout
+  # @param idempotent the request is safe to send twice. Only such requests are
+  #                   sent again when a reused connection fails, as Yast may
+  #                   have processed the request otherwise
+  # @return response body
+  async def _httpRequest(self, method, url, body=None, headers={}, timeout=None, idempotent=True):
+    if timeout == None:
+      timeout = self.requestTimeout
+    if self._semaphore == None:
+      self._semaphore = asyncio.Semaphore(self.maxConcurrency)
+
+    data = method + ' ' + url + ' HTTP/1.1\r\n' + \
+        'Host: ' + self.host + '\r\n' + \
+        'Accept-Encoding: identity\r\n' + \
+        ''.join([k + ': ' + v + '\r\n' for k, v in headers.items()])
+    if body != None:
+      body = body.encode('iso-8859-1') if isinstance(body, str) else body
+      data += 'Content-Length: ' + str(len(body)) + '\r\n'
+    data = (data + '\r\n').encode('iso-8859-1') + (body if body != None else b'')
+
+    async with self._semaphore:
+      await self._acquireLimiter()
+      try:
+        conn, reused = await self._getConnection()
+        try:
+          try:
+            response, keepAlive = await asyncio.wait_for(self._roundTrip(conn, data), timeout)
+          except (ConnectionError, asyncio.IncompleteReadError):
+            if not reused or not idempotent:
+              raise
+            # The server closed the idle connection under us. Retry once on a new one
+            conn[1].close()
+            conn = await self._connect()
+            response, keepAlive = await asyncio.wait_for(self._roundTrip(conn, data), timeout)
+        except:
+          conn[1].close()
+          raise
+      finally:
+        self._getRateLimiter().release(self.host)
+
+      if keepAlive and len(self._idle) < self.maxIdleConnections:
+        self._idle.append((conn, time.time()))
+      else:
+        conn[1].close()
+
+      event = self._currentEvent()
+      if event != None:
+        event.bytesSent += len(data)
+        event.bytesReceived += len(response)
+        event.mark('network')
+      return response
+
+  # Wait for a turn of rateLimiter. A turn that is not free right away is
+  # waited for in a thread, as YastRateLimiter.acquire blocks
+  async def _acquireLimiter(self):
+    limiter = self._getRateLimiter()
+    if limiter.tryAcquire(self.host):
+      return
+    future = asyncio.get_event_loop().run_in_executor(None, limiter.acquire, self.host,
+                                                      self.user if self.user != None else id(self))
+    try:
+      await asyncio.shield(future)
+    except asyncio.CancelledError:
+      # The thread keeps waiting. Give its turn back once it has it
+      def releaseTurn(future):
+        if not future.cancelled() and future.exception() == None:
+          limiter.release(self.host)
+      future.add_done_callback(releaseTurn)
+      raise
+
+
+  # Returns an idle connection if a live one is available, otherwise a new one
+  # @return ((reader, writer), reused)
+  async def _getConnection(self):
+    now = time.time()
+    while self._idle:
+      conn, lastUsed = self._idle.pop()
+      if now - lastUsed <= self.idleTimeout and not conn[0].at_eof() and not conn[1].is_closing():
+        return conn, True
+      conn[1].close()
+    return await self._connect(), False
+
+
+  # Open a new connection to host
+  async def _connect(self):
+    host, sep, port = self.host.partition(':')
+    port = int(port) if sep else (443 if self.useHttps else 80)
+    return await asyncio.wait_for(asyncio.open_connection(host, port,
+                                                          ssl=ssl.create_default_context() if self.useHttps else None),
+                                  self.requestTimeout)
+
+
+  # Send a request and read the full response
+  # @return (body, keepAlive)
+  async def _roundTrip(self, conn, data):
+    reader, writer = conn
+    writer.write(data)
+    await writer.drain()
+
+    # Status line and headers
+    statusLine = await reader.readline()
+    if not statusLine:
+      raise ConnectionResetError("Connection closed by server")
+    version = statusLine.split(None, 1)[0]
+    headers = {}
+    while True:
+      line = await reader.readline()
+      if line in (b'\r\n', b'\n', b''):
+        break
+      key, value = line.decode('iso-8859-1').split(':', 1)
+      headers[key.strip().lower()] = value.strip()
+
+    keepAlive = version == b'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+    # Body
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+      chunks = []
+      while True:
+        size = int(((await reader.readline()).split(b';', 1)[0]).strip(), 16)
+        if size == 0:
+          # Skip trailers
+          while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+          break
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+      body = b''.join(chunks)
+    elif 'content-length' in headers:
+      body = await reader.readexactly(int(headers['content-length']))
+    else:
+      body = await reader.read()
+      keepAlive = False
+
+    return body, keepAlive
@@ -0,0 +1,225 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+# Yast Python record batches
+#
+# Keeps records as parallel columns instead of one object per record, for
+# fast aggregation over many records. Uses NumPy when it is installed, and
+# the array module otherwise.
+#
+# Example:
+#   batch = yast.getRecords({'timeFrom': t0, 'timeTo': t1}, batch=True)
+#   hours = batch.totalDuration() / 3600.0
+#   income = batch.billableAmount()
+#
+
+import sys
+from array import array
+from collections import OrderedDict
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+# array typecodes of the integer and float columns
+_intCode = 'q' if sys.version_info >= (3, 3) else 'l'
+_floatCode = 'd'
+
+
+# Records of a getRecords call as columns. Columns are NumPy arrays when NumPy
+# is available, otherwise array.array. Work record fields are 0 for other types
+class YastRecordBatch(object):
+
+  # Names of the integer and float columns
+  intColumns = ('id', 'project', 'typeId', 'startTime', 'endTime', 'isBillable')
+  floatColumns = ('hourlyCost', 'hourlyIncome')
+
+  # Construct a batch from column sequences of equal length
+  def __init__(self, id=(), project=(), typeId=(), startTime=(), endTime=(), isBillable=(),
+               hourlyCost=(), hourlyIncome=()):
+    self.id = self._column(id, _intCode)
+    self.project = self._column(project, _intCode)
+    self.typeId = self._column(typeId, _intCode)
+    self.startTime = self._column(startTime, _intCode)
+    self.endTime = self._column(endTime, _intCode)
+    self.isBillable = self._column(isBillable, _intCode)
+    self.hourlyCost = self._column(hourlyCost, _floatCode)
+    self.hourlyIncome = self._column(hourlyIncome, _floatCode)
+    self._durations = None
+
+    if any([len(getattr(self, c)) != len(self.id) for c in self.intColumns + self.floatColumns]):
+      raise ValueError("Columns of a record batch must have equal length")
+
+  # Construct a batch from records
+  # @param records iterable of records, e.g. the values of getRecords or iterRecords
+  # @return new batch
+  @classmethod
+  def fromRecords(cls, records):
+    columns = dict([(c, array(_intCode)) for c in cls.intColumns] +
+                   [(c, array(_floatCode)) for c in cls.floatColumns])
+    id, project, typeId = columns['id'].append, columns['project'].append, columns['typeId'].append
+    startTime, endTime = columns['startTime'].append, columns['endTime'].append
+    isBillable = columns['isBillable'].append
+    hourlyCost, hourlyIncome = columns['hourlyCost'].append, columns['hourlyIncome'].append
+
+    for r in records:
+      id(r.id)
+      project(r.project)
+      typeId(r.typeId)
+      startTime(r.startTime)
+      endTime(r.endTime)
+      if r.typeId == 1:
+        isBillable(int(r.isBillable))
+        hourlyCost(float(r.hourlyCost))
+        hourlyIncome(float(r.hourlyIncome))
+      else:
+        isBillable(0)
+        hourlyCost(0.0)
+        hourlyIncome(0.0)
+
+    return cls(**columns)
+
+  def __len__(self):
+    return len(self.id)
+
+
+  # Returns duration of each record in seconds
+  def durations(self):
+    if self._durations is None:
+      if numpy != None:
+        self._durations = self.endTime - self.startTime
+      else:
+        self._durations = array(_intCode, [e - s for s, e in zip(self.startTime, self.endTime)])
+    return self._durations
+
+  # Returns total duration of records in seconds
+  # @param typeId only count records of this type
+  def totalDuration(self, typeId=None):
+    batch = self if typeId == None else self.filterType(typeId)
+    if numpy != None:
+      return int(batch.durations().sum())
+    return sum(batch.endTime) - sum(batch.startTime)
+
+  # Returns billable amount of records, which is the duration in hours times
+  # hourlyIncome of billable work records
+  def billableAmount(self):
+    if numpy != None:
+      return float((self.durations() * self.hourlyIncome * self.isBillable).sum() / 3600.0)
+    return sum([d * i for d, i, b in zip(self.durations(), self.hourlyIncome, self.isBillable) if b]) / 3600.0
+
+  # Returns cost of records, which is the duration in hours times hourlyCost
+  def totalCost(self):
+    if numpy != None:
+      return float((self.durations() * self.hourlyCost).sum() / 3600.0)
+    return sum([d * c for d, c in zip(self.durations(), self.hourlyCost)]) / 3600.0
+
+  # Returns total duration in seconds per record type
+  # @return map of typeId to duration, in order of first appearance
+  def durationByType(self):
+    return self._sumBy(self.typeId, self.durations())
+
+  # Returns total duration in seconds per project
+  # @param typeId only count records of this type
+  # @return map of project id to duration, in order of first appearance
+  def durationByProject(self, typeId=None):
+    batch = self if typeId == None else self.filterType(typeId)
+    return batch._sumBy(batch.project, batch.durations())
+
+  # Returns billable amount per project. See billableAmount
+  # @return map of project id to amount, in order of first appearance
+  def billableAmountByProject(self):
+    if numpy != None:
+      amounts = self.durations() * self.hourlyIncome * self.isBillable / 3600.0
+    else:
+      amounts = array(_floatCode, [d * i / 3600.0 if b else 0.0
+                                   for d, i, b in zip(self.durations(), self.hourlyIncome, self.isBillable)])
+    return self._sumBy(self.project, amounts)
+
+
+  # Returns the records overlapping a time range, like getRecords does
+  # @param timeFrom start of range in seconds, or None
+  # @param timeTo end of range in seconds, or None
+  # @return new batch
+  def filterTime(self, timeFrom=None, timeTo=None):
+    if numpy != None:
+      mask = numpy.ones(len(self), dtype=bool)
+      if timeFrom != None:
+        mask &= self.endTime >= timeFrom
+      if timeTo != None:
+        mask &= self.startTime <= timeTo
+      return self._select(mask)
+    return self._selectWhere([(timeFrom == None or e >= timeFrom) and (timeTo == None or s <= timeTo)
+                              for s, e in zip(self.startTime, self.endTime)])
+
+  # Returns the records of a record type
+  # @return new batch
+  def filterType(self, typeId):
+    if numpy != None:
+      return self._select(self.typeId == typeId)
+    return self._selectWhere([t == typeId for t in self.typeId])
+
+  # Returns the records of a set of projects
+  # @param projects iterable of project ids
+  # @return new batch
+  def filterProjects(self, projects):
+    if numpy != None:
+      return self._select(numpy.isin(self.project, numpy.array(list(projects), dtype=numpy.int64)))
+    projects = set(projects)
+    return self._selectWhere([p in projects for p in self.project])
+
+
+  # Column of the backend type
+  def _column(self, values, typecode):
+    if numpy != None:
+      if isinstance(values, numpy.ndarray):
+        return values
+      if isinstance(values, array) and values.typecode == typecode:
+        return numpy.frombuffer(values, dtype=numpy.int64 if typecode == _intCode else numpy.float64)
+      return numpy.array(values, dtype=numpy.int64 if typecode == _intCode else numpy.float64)
+    if isinstance(values, array) and values.typecode == typecode:
+      return values
+    return array(typecode, values)
+
+  # Sum values per key, in order of first appearance of the key
+  def _sumBy(self, keys, values):
+    if numpy != None:
+      if len(keys) == 0:
+        return {}
+      low = int(keys.min())
+      span = int(keys.max()) - low + 1
+      if span <= 4 * len(keys) + 1024:
+        # Ids are dense enough to index directly, which saves sorting
+        index = keys - low
+        unique = numpy.arange(low, low + span)
+      else:
+        unique, index = numpy.unique(keys, return_inverse=True)
+        span = len(unique)
+      sums = numpy.bincount(index, weights=values, minlength=span)
+      first = numpy.full(span, len(keys), dtype=numpy.int64)
+      numpy.minimum.at(first, index, numpy.arange(len(keys)))
+      cast = int if values.dtype.kind == 'i' else float
+      return OrderedDict([(int(unique[i]), cast(sums[i])) for i in numpy.argsort(first, kind='stable')
+                          if first[i] < len(keys)])
+    sums = OrderedDict()
+    for k, v in zip(keys, values):
+      sums[k] = sums.get(k, 0) + v
+    return sums
+
+  # New batch of the rows where mask is true
+  def _select(self, mask):
+    if mask.all():
+      return self
+    return YastRecordBatch(**dict([(c, getattr(self, c)[mask]) for c in self.intColumns + self.floatColumns]))
+
+  def _selectWhere(self, mask):
+    if all(mask):
+      return self
+    return YastRecordBatch(**dict([(c, array(getattr(self, c).typecode,
+                                             [v for v, m in zip(getattr(self, c), mask) if m]))
+                                   for c in self.intColumns + self.floatColumns]))
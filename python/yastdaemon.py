@@ -0,0 +1,303 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+# Yast Python CLI daemon
+#
+# Runs commands of the CLI in a long-running process, which keeps logins,
+# cached projects, folders and record types and open connections between
+# commands. The daemon listens on a Unix socket readable by its owner only.
+# yast.py forwards commands to it when YAST_DAEMON is set to the socket, and
+# runs them itself when no daemon answers.
+#
+# Example:
+#   yast.py daemon --socket /tmp/yast.sock &
+#   export YAST_DAEMON=/tmp/yast.sock
+#   yast.py -u user -p password get records --from today
+#
+# Protocol: the client sends one JSON line {"argv": [...], "cwd": "..."}, or
+# {"stop": true}. The daemon answers with JSON lines {"out": text},
+# {"outb": base64 data} and {"err": text}, and a last line {"exit": status}.
+# When the command first reads stdin, the daemon sends {"stdin": true} and the
+# client answers with a JSON line {"stdin": text}.
+#
+
+import os, io, sys, json, socket, base64
+
+# Bytes of output collected before a frame is sent
+_frameSize = 65536
+
+
+# Send a command to a daemon and copy its output to stdout and stderr
+# @param path path of the socket of the daemon
+# @param argv command line arguments, without the program name
+# @return exit status of the command, or None if no daemon answers
+def forwardCommand(path, argv):
+  sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    sock.connect(path)
+  except socket.error:
+    sock.close()
+    return None
+
+  try:
+    request = {'argv': argv, 'cwd': os.getcwd()}
+    sock.sendall((json.dumps(request) + "\n").encode('utf-8'))
+    out = sys.stdout.buffer if sys.version_info[0] == 3 else sys.stdout
+    for line in sock.makefile('rb'):
+      frame = json.loads(line.decode('utf-8'))
+      if 'out' in frame:
+        out.write(frame['out'].encode('utf-8'))
+      elif 'outb' in frame:
+        out.write(base64.b64decode(frame['outb']))
+      elif 'err' in frame:
+        out.flush()
+        sys.stderr.write(frame['err'])
+      elif 'stdin' in frame:
+        # The command reads stdin, e.g. the operations of the batch command
+        sock.sendall((json.dumps({'stdin': sys.stdin.read()}) + "\n").encode('utf-8'))
+      elif 'exit' in frame:
+        out.flush()
+        return frame['exit']
+  finally:
+    sock.close()
+  sys.stderr.write("ERROR: Yast daemon at " + path + " closed the connection\n")
+  return 1
+
+# Returns True if a daemon answers at a socket
+def isRunning(path):
+  sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    sock.connect(path)
+    return True
+  except socket.error:
+    return False
+  finally:
+    sock.close()
+
+# Ask a daemon to exit
+# @return True if a daemon was running
+def stopDaemon(path):
+  sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    sock.connect(path)
+    sock.sendall(b'{"stop": true}\n')
+    sock.makefile('rb').readline()
+    return True
+  except socket.error:
+    return False
+  finally:
+    sock.close()
+
+
+# Stream sending what is written to it as frames of the protocol
+class _FrameWriter(object):
+  def __init__(self, sock, key):
+    self.sock = sock
+    self.key = key
+    self.parts = []
+    self.size = 0
+    if key == 'out':
+      self.buffer = _FrameWriter(sock, 'outb')
+
+  def write(self, data):
+    if self.key == 'out' and self.buffer.size > 0:
+      self.buffer.flush()
+    self.parts.append(data)
+    self.size += len(data)
+    if self.size >= _frameSize or self.key == 'err':
+      self.flush()
+
+  def flush(self):
+    if self.key == 'out' and self.buffer.size > 0:
+      self.buffer.flush()
+    if self.size == 0:
+      return
+    if self.key == 'outb':
+      data = base64.b64encode(b''.join(self.parts)).decode('ascii')
+    else:
+      data = ''.join(self.parts)
+    self.parts = []
+    self.size = 0
+    self.sock.sendall((json.dumps({self.key: data}) + "\n").encode('utf-8'))
+
+  def isatty(self):
+    return False
+
+
+# Stdin of a command run by a daemon. It is asked from the client when the
+# command first reads it
+class _ClientStdin(object):
+  def __init__(self, sock, reader):
+    self.sock = sock
+    self.reader = reader
+    self._input = None
+
+  def _fetch(self):
+    if self._input == None:
+      self.sock.sendall(b'{"stdin": true}\n')
+      line = self.reader.readline()
+      self._input = io.StringIO(json.loads(line.decode('utf-8')).get('stdin', '') if line else '')
+    return self._input
+
+  def __getattr__(self, name):
+    return getattr(self._fetch(), name)
+
+  def __iter__(self):
+    return iter(self._fetch())
+
+  def isatty(self):
+    return False
+
+  def close(self):
+    if self._input != None:
+      self._input.close()
+
+
+# Logins and the Yast instance shared by the commands run by a daemon
+class YastDaemonSession(object):
+
+  # @param metaTtl seconds projects, folders and record types are cached
+  def __init__(self, metaTtl=300):
+    from yastlib import Yast, YastMetaCache, YastSessionCache
+    self.yast = Yast()
+    self.metaCache = YastMetaCache(metaTtl)
+    self.yast.metaCache = self.metaCache
+    # Hashes of logins, found by host, user and a salted verifier of the
+    # password
+    self.logins = YastSessionCache(None)
+
+  # Returns the shared Yast instance for a new command. Caches and the login
+  # set up for an earlier command by its options are undone
+  def commandYast(self):
+    yast = self.yast
+    yast.metaCache = self.metaCache
+    yast.reportCache = None
+    yast.sessionCache = None
+    yast.clearLogin()
+    return yast
+
+  # Log in, or reuse the hash of an earlier login of user with password
+  def login(self, yast, user, password):
+    hash = self.logins.get(yast.host, user, password)
+    if hash != None:
+      yast.user = user
+      yast.hash = hash
+      return hash
+    hash = yast.login(user, password)
+    self.logins.put(yast.host, user, password, hash)
+    return hash
+
+  # Forget logins, e.g. after the server rejected a hash
+  def forgetLogins(self):
+    self.logins.clear()
+
+
+# Daemon running CLI commands sent to a Unix socket, one at a time
+class YastDaemon(object):
+
+  # @param path path of the socket
+  # @param idleTimeout exit after this many seconds without commands. None
+  #                    to run until stopped
+  # @param metaTtl see YastDaemonSession
+  # @param cliClass class of the CLI running commands. Defaults to YastCli
+  def __init__(self, path, idleTimeout=3600, metaTtl=300, cliClass=None):
+    if cliClass == None:
+      from yast import YastCli as cliClass
+    self.path = path
+    self.idleTimeout = idleTimeout
+    self.cliClass = cliClass
+    self.session = YastDaemonSession(metaTtl)
+    self.running = False
+
+  # Listen on the socket and run commands until stopped or idle
+  def serve(self):
+    if os.path.exists(self.path):
+      if isRunning(self.path):
+        raise Exception("A Yast daemon is already running at " + self.path)
+      # Left by a daemon that did not exit cleanly
+      os.remove(self.path)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o177)
+    try:
+      listener.bind(self.path)
+    finally:
+      os.umask(umask)
+    os.chmod(self.path, 0o600)
+    listener.listen(16)
+
+    self.running = True
+    try:
+      while self.running:
+        listener.settimeout(self.idleTimeout)
+        try:
+          conn, address = listener.accept()
+        except socket.timeout:
+          break
+        conn.settimeout(None)
+        try:
+          self.handle(conn)
+        except socket.error:
+          # Client went away
+          pass
+        finally:
+          conn.close()
+    finally:
+      listener.close()
+      os.remove(self.path)
+
+  # Run one command of a client
+  def handle(self, conn):
+    reader = conn.makefile('rb')
+    line = reader.readline()
+    if not line:
+      return
+    request = json.loads(line.decode('utf-8'))
+    if request.get('stop'):
+      self.running = False
+      conn.sendall(b'{"exit": 0}\n')
+      return
+
+    status = self.run(conn, request['argv'], request.get('cwd'), _ClientStdin(conn, reader))
+    conn.sendall((json.dumps({'exit': status}) + "\n").encode('utf-8'))
+
+  # Run a command with output sent to a client
+  # @param input file object read by the command as stdin, or None for none
+  # @return exit status
+  def run(self, conn, argv, cwd, input=None):
+    from yastlib import YastStatus
+
+    stdout, stderr, stdin, workDir = sys.stdout, sys.stderr, sys.stdin, os.getcwd()
+    sys.stdout = _FrameWriter(conn, 'out')
+    sys.stderr = _FrameWriter(conn, 'err')
+    sys.stdin = input if input != None else open(os.devnull)
+    status = 0
+    try:
+      if cwd != None:
+        os.chdir(cwd)
+      cli = self.cliClass()
+      cli.session = self.session
+      cli.execute(argv)
+    except SystemExit as e:
+      status = e.code if isinstance(e.code, int) else (0 if e.code == None else 1)
+    except Exception as e:
+      sys.stderr.write("ERROR: " + e.__class__.__name__ + ": " + str(e) + "\n")
+      status = 1
+    finally:
+      try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+      finally:
+        sys.stdin.close()
+        sys.stdout, sys.stderr, sys.stdin = stdout, stderr, stdin
+        os.chdir(workDir)
+
+    if self.session.yast.status == YastStatus.NOT_LOGGED_IN:
+      self.session.forgetLogins()
+    return status
@@ -0,0 +1,219 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+#
+# Yast Python record export
+#
+# Writes the records of a query into a columnar file, one chunk of records at
+# a time, so memory stays bounded however many records there are. Parquet and
+# Arrow files are written with pyarrow when it is installed. CSV files need no
+# other modules.
+#
+# Example:
+#   count = exportRecords(yast, 'records.parquet', {'timeFrom': t0, 'timeTo': t1})
+#
+#   with YastRecordExporter('records.csv', projects=projects, folders=folders) as exporter:
+#     exporter.write(yast.iterRecords(options))
+#
+
+import os, csv, sys
+try:
+  import pyarrow, pyarrow.parquet, pyarrow.ipc
+except ImportError:
+  pyarrow = None
+
+from yastlib import *
+from yasthier import YastHierIndex
+
+
+# Writer of records into a Parquet, Arrow IPC or CSV file. Columns are the
+# record attributes, the variables of work and phonecall records, and the
+# name and path of the project. Variables a record does not have are null,
+# or empty in CSV files
+class YastRecordExporter(object):
+
+  # Columns and their Arrow types
+  columns = (('id', 'int64'), ('typeId', 'int64'), ('type', 'string'),
+             ('project', 'int64'), ('projectName', 'string'), ('projectPath', 'string'), ('folderPath', 'string'),
+             ('timeCreated', 'int64'), ('timeUpdated', 'int64'), ('creator', 'int64'), ('flags', 'int64'),
+             ('startTime', 'int64'), ('endTime', 'int64'), ('comment', 'string'), ('isRunning', 'int64'),
+             ('hourlyCost', 'float64'), ('hourlyIncome', 'float64'), ('isBillable', 'int64'),
+             ('phoneNumber', 'string'), ('outgoing', 'int64'))
+
+  # Formats by file extension
+  extensions = {'.parquet': 'parquet', '.pq': 'parquet', '.arrow': 'arrow', '.feather': 'arrow',
+                '.ipc': 'arrow', '.csv': 'csv'}
+
+  # Names of record types by id
+  _typeNames = {1: YastRecordWork.typeName, 3: YastRecordPhonecall.typeName}
+
+  # Variables of the typed records, in column order
+  _variableNames = tuple([name for name, type in columns[11:]])
+
+  # Open a file for writing
+  # @param path path of the file
+  # @param format 'parquet', 'arrow' or 'csv'. Defaults to the format of the
+  #               file extension, or parquet if pyarrow is installed and csv
+  #               otherwise
+  # @param projects map of projects by id, as returned by getProjects. Project
+  #                 columns are empty without it
+  # @param folders map of folders by id, as returned by getFolders
+  # @param chunkSize number of records written at a time
+  def __init__(self, path, format=None, projects=None, folders=None, chunkSize=65536):
+    if format == None:
+      format = self.extensions.get(os.path.splitext(path)[1].lower())
+      if format == None:
+        format = 'parquet' if pyarrow != None else 'csv'
+    if not format in ('parquet', 'arrow', 'csv'):
+      raise ValueError("Unknown export format \"" + format + "\"")
+    if format != 'csv' and pyarrow == None:
+      raise Exception("Export to " + format + " requires pyarrow. Install it or export to csv")
+
+    self.path = path
+    self.format = format
+    self.chunkSize = max(1, int(chunkSize))
+    self.count = 0
+    self.projects = projects if projects != None else {}
+    self._index = YastHierIndex(self.projects, folders if folders != None else {})
+    # Project name, project path and folder path by project id
+    self._projectColumns = {}
+    self._chunk = [[] for c in self.columns]
+
+    if format == 'csv':
+      if sys.version_info[0] == 3:
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+      else:
+        self._file = open(path, 'wb')
+      self._writer = csv.writer(self._file, lineterminator="\n")
+      self._writer.writerow([name for name, type in self.columns])
+    else:
+      self._schema = pyarrow.schema([(name, getattr(pyarrow, type)()) for name, type in self.columns])
+      if format == 'parquet':
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+      else:
+        self._writer = pyarrow.ipc.new_file(path, self._schema)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, type, value, traceback):
+    self.close()
+
+  # Add records to the file. Records are written whenever chunkSize of them
+  # are buffered
+  # @param records iterable of records, e.g. from iterRecords
+  # @return number of records added
+  def write(self, records):
+    chunk = self._chunk
+    typeNames = self._typeNames
+    variableNames = self._variableNames
+    count = 0
+    for r in records:
+      if r.variableNames:
+        variables = [getattr(r, name, None) for name in variableNames]
+      else:
+        values = r.variables or {}
+        variables = [values.get(name) for name in variableNames]
+      projectColumns = self._projectColumns.get(r.project)
+      if projectColumns == None:
+        projectColumns = self._projectColumns[r.project] = self._projectInfo(r.project)
+
+      row = [r.id, r.typeId, typeNames.get(r.typeId), r.project] + projectColumns + \
+            [r.timeCreated, r.timeUpdated, r.creator, r.flags] + variables
+      for column, value in zip(chunk, row):
+        column.append(value)
+      count += 1
+      if len(chunk[0]) >= self.chunkSize:
+        self.flush()
+    self.count += count
+    return count
+
+  # Write buffered records
+  def flush(self):
+    chunk = self._chunk
+    if not chunk[0]:
+      return
+    if self.format == 'csv':
+      self._writer.writerows(zip(*chunk))
+    else:
+      arrays = [pyarrow.array(column, type=field.type) for column, field in zip(chunk, self._schema)]
+      batch = pyarrow.RecordBatch.from_arrays(arrays, schema=self._schema)
+      if self.format == 'parquet':
+        self._writer.write_table(pyarrow.Table.from_batches([batch]))
+      else:
+        self._writer.write_batch(batch)
+    for column in chunk:
+      del column[:]
+
+  # Write buffered records and close the file
+  def close(self):
+    if self._writer == None:
+      return
+    try:
+      self.flush()
+    finally:
+      if self.format == 'csv':
+        self._file.close()
+      else:
+        self._writer.close()
+      self._writer = None
+
+  # Close and remove the file, e.g. when not all records could be fetched,
+  # so a partial export is not taken for a complete one
+  def discard(self):
+    for column in self._chunk:
+      del column[:]
+    try:
+      self.close()
+    finally:
+      if os.path.exists(self.path):
+        os.remove(self.path)
+
+  # Returns [name, path, folder path] of a project. Unknown projects have
+  # empty columns
+  def _projectInfo(self, id):
+    project = self.projects.get(id)
+    if project == None:
+      return [None, None, None]
+    folderPath = self._index.path(project.parentId, YastFolder) if project.parentId != 0 else "/"
+    return [project.name, self._index.path(id, YastProject), folderPath]
+
+
+# Export the records of a query into a file, see YastRecordExporter. Records
+# are decoded while they are downloaded and written in chunks
+# @param yast logged in Yast instance
+# @param path path of the file
+# @param options associative array of options, as for getRecords
+# @param format see YastRecordExporter
+# @param chunkSize see YastRecordExporter
+# @param projects map of projects by id. Fetched from yast if not given
+# @param folders map of folders by id. Fetched from yast if not given
+# @return number of records written, or False on error as set in yast.status.
+#         No file is left behind on error
+def exportRecords(yast, path, options=None, format=None, chunkSize=65536, projects=None, folders=None):
+  if projects == None:
+    projects = yast.getProjects()
+  if folders == None and projects != False:
+    folders = yast.getFolders()
+  if projects == False or folders == False:
+    return False
+
+  exporter = YastRecordExporter(path, format, projects, folders, chunkSize)
+  try:
+    exporter.write(yast.iterRecords(options))
+    # iterRecords stops early on error if exceptions are not propagated
+    if yast.getStatus() != YastStatus.SUCCESS:
+      raise YastStatusError(yast.getStatus())
+    exporter.close()
+  except Exception as e:
+    exporter.discard()
+    if isinstance(e, YastStatusError) and not yast.propagateExceptions:
+      return False
+    raise
+  return exporter.count
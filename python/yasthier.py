@@ -0,0 +1,310 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+# Yast Python project/folder hierarchy
+#
+# YastHierIndex indexes the projects and folders of a user by parent and
+# name, so names and paths like "Customers/Acme/Support" resolve with one
+# lookup per path segment. YastRollup sums records per project and folder,
+# including everything below them, in time linear in records and nodes.
+#
+# Example:
+#   index = YastHierIndex(yast.getProjects(), yast.getFolders())
+#   projectId = index.resolve("Customers/Acme/Support", YastProject)
+#   print(index.path(projectId, YastProject))
+#
+#   rollup = YastRollup(yast.getProjects(), yast.getFolders())
+#   rollup.addRecords(yast.iterRecords({'timeFrom': t0, 'timeTo': t1}))
+#   rollup.propagate()
+#   for depth, node in rollup.walk():
+#     print('-' * depth + node.name, rollup.durations(node.id))
+#
+
+from collections import OrderedDict
+from yastlib import *
+
+
+# Index of projects and folders by parent and name
+class YastHierIndex(object):
+
+  # @param projects map of projects by id, as returned by getProjects
+  # @param folders map of folders by id, as returned by getFolders
+  def __init__(self, projects, folders):
+    self.projects = projects
+    self.folders = folders
+    # Ids by (parentId, name) and by name alone, for each type
+    self._byParent = {YastProject: {}, YastFolder: {}}
+    self._byName = {YastProject: {}, YastFolder: {}}
+    for type, nodes in ((YastProject, projects), (YastFolder, folders)):
+      byParent = self._byParent[type]
+      byName = self._byName[type]
+      for id in sorted(nodes):
+        n = nodes[id]
+        byParent.setdefault((n.parentId, n.name), []).append(id)
+        byName.setdefault(n.name, []).append(id)
+    self._paths = None
+
+  # Returns ids of projects or folders with a name
+  # @param type YastProject or YastFolder
+  # @param parent id of parent folder, 0 for top level, or -1 for any
+  def find(self, name, type, parent=-1):
+    if parent == -1:
+      return self._byName[type].get(name, [])
+    return self._byParent[type].get((parent, name), [])
+
+  # Resolve a name or path of a project or folder uniquely. A path is folder
+  # names separated by /, and starts at the top level if it starts with /
+  # @param text name or path
+  # @param type YastProject, YastFolder or None for both. If type is
+  #             YastProject, a project is chosen over a folder of the same name
+  # @param parent id of parent folder of the first name, or -1 if unknown
+  # @param folderLabel function returning the name of a folder id for errors
+  # @return id of project or folder
+  def resolve(self, text, type=None, parent=-1, folderLabel=None):
+    if folderLabel == None:
+      folderLabel = self._folderName
+
+    if text.startswith("/"):
+      # Full path from the top level
+      hit = self._fullPaths().get((text, type))
+      if hit != None:
+        return hit
+      parent = 0
+      text = text[1:]
+
+    segments = text.split("/")
+    for i, name in enumerate(segments):
+      # Names before a / are folders
+      curType = YastFolder if i < len(segments) - 1 else type
+      parent = self._resolveName(name, curType, parent, folderLabel)
+    return parent
+
+  # Returns the full path of a project or folder, e.g. /Customers/Acme
+  # @param type YastProject or YastFolder
+  def path(self, id, type):
+    names = []
+    node = (self.projects if type == YastProject else self.folders).get(id)
+    seen = set()
+    while node != None and not node.id in seen:
+      seen.add(node.id)
+      names.append(node.name)
+      node = self.folders.get(node.parentId) if node.parentId != 0 else None
+    return "/" + "/".join(reversed(names))
+
+
+  # Resolve one path segment. Errors are the same as for a scan over all
+  # projects and folders
+  def _resolveName(self, name, curType, parent, folderLabel):
+    node = None
+    where = " with parent folder \"" + folderLabel(parent) + "\"" if parent != 0 and parent != -1 else ""
+
+    if curType == YastProject or curType == None:
+      ids = self.find(name, YastProject, parent)
+      if len(ids) > 1:
+        raise Exception("Name \"" + name + "\"" + where + " does not uniquely identify a project/folder")
+      if ids:
+        node = ids[0]
+
+    if curType == YastFolder or curType == None:
+      ids = self.find(name, YastFolder, parent)
+      if len(ids) > 1 or (ids and node != None):
+        raise Exception("Name \"" + name + "\"" + where + " does not uniquely identify a " +
+                        ("folder" if curType == YastFolder else "project/folder"))
+      if ids:
+        node = ids[0]
+
+    if node == None:
+      raise Exception("Name \"" + name + "\"" + where + " does not identify a " +
+                      ("folder" if curType == YastFolder else ("project" if curType == YastProject else "project/folder")))
+    return node
+
+  # Ids of full paths that resolve uniquely, by (path, type) for the types
+  # resolve accepts. Only paths whose folders resolve uniquely one by one are
+  # included, so hits are the same as resolving each segment. Built on first use
+  def _fullPaths(self):
+    if self._paths == None:
+      children = {}
+      for id, f in self.folders.items():
+        children.setdefault(f.parentId, []).append(id)
+      prefixes = {0: ""}
+      todo = [0]
+      while todo:
+        parent = todo.pop()
+        for id in children.get(parent, []):
+          f = self.folders[id]
+          if not id in prefixes and not "/" in f.name and len(self.find(f.name, YastFolder, parent)) == 1:
+            prefixes[id] = prefixes[parent] + "/" + f.name
+            todo.append(id)
+
+      found = {}
+      for type, nodes in ((YastProject, self.projects), (YastFolder, self.folders)):
+        for id, n in nodes.items():
+          if n.parentId in prefixes and not "/" in n.name:
+            found.setdefault(prefixes[n.parentId] + "/" + n.name, []).append((type, id))
+
+      self._paths = {}
+      for path, hits in found.items():
+        projects = [id for t, id in hits if t == YastProject]
+        folders = [id for t, id in hits if t == YastFolder]
+        if len(projects) == 1:
+          self._paths[(path, YastProject)] = projects[0]
+        if len(folders) == 1:
+          self._paths[(path, YastFolder)] = folders[0]
+        if len(hits) == 1:
+          self._paths[(path, None)] = hits[0][1]
+    return self._paths
+
+  def _folderName(self, id):
+    return self.folders[id].name if id in self.folders else "unkown: " + str(id)
+
+
+
+# Totals of records per project and folder, including all projects and
+# folders below them. Records are first summed per project, and the sums are
+# then added up the tree once, children before parents. Measures are the
+# duration per record type, the billable amount and the number of records.
+# Project and folder ids are assumed to be distinct, as they are in Yast
+class YastRollup(object):
+
+  # @param projects map of projects by id, as returned by getProjects
+  # @param folders map of folders by id, as returned by getFolders
+  # @param sort order children and roots by id. Otherwise folders come before
+  #             projects, in the order of the maps
+  def __init__(self, projects, folders, sort=True):
+    nodes = OrderedDict()
+    for id, n in folders.items():
+      nodes[id] = n
+    for id, n in projects.items():
+      nodes[id] = n
+    if sort:
+      nodes = OrderedDict([(id, nodes[id]) for id in sorted(nodes)])
+    self.nodes = nodes
+
+    # Position of each node, which orders types by first appearance like a
+    # pass over the records of each node in turn
+    self._position = dict([(id, i) for i, id in enumerate(nodes)])
+
+    # Link parents and children. Nodes whose parent is not accessible are
+    # orphans, and roots of their own trees
+    self.children = dict([(id, []) for id in nodes])
+    self.roots = []
+    self.orphans = []
+    for id, n in nodes.items():
+      if n.parentId == 0:
+        self.roots.append(n)
+      elif n.parentId in nodes:
+        self.children[n.parentId].append(n)
+      else:
+        self.orphans.append(n)
+
+    # Totals by node id as [durations, billable amount, count]. durations
+    # maps typeId to [seconds, first appearance]
+    self._totals = {}
+    self._propagated = False
+
+  # Sum records into the projects they belong to. Records of unknown
+  # projects are skipped
+  # @param records iterable of records, e.g. values of getRecords or iterRecords
+  def addRecords(self, records):
+    totals = self._totals
+    position = self._position
+    for i, r in enumerate(records):
+      t = totals.get(r.project)
+      if t == None:
+        if not r.project in position:
+          continue
+        t = totals[r.project] = [{}, 0.0, 0]
+      dt = r.endTime - r.startTime
+      typeSum = t[0].get(r.typeId)
+      if typeSum == None:
+        t[0][r.typeId] = [dt, (position[r.project], i)]
+      else:
+        typeSum[0] += dt
+      if r.typeId == 1 and r.isBillable:
+        t[1] += dt * float(r.hourlyIncome) / 3600.0
+      t[2] += 1
+    self._propagated = False
+
+  # Add the totals of each node to its parent, children first. Call after
+  # the last addRecords
+  def propagate(self):
+    if self._propagated:
+      return
+    parentOf = {}
+    order = []
+    for root in self.roots + self.orphans:
+      stack = [root]
+      while stack:
+        n = stack.pop()
+        order.append(n.id)
+        for c in self.children[n.id]:
+          parentOf[c.id] = n.id
+          stack.append(c)
+
+    totals = self._totals
+    for id in reversed(order):
+      t = totals.get(id)
+      if t == None or not id in parentOf:
+        continue
+      p = totals.get(parentOf[id])
+      if p == None:
+        p = totals[parentOf[id]] = [{}, 0.0, 0]
+      for typeId, (seconds, first) in t[0].items():
+        typeSum = p[0].get(typeId)
+        if typeSum == None:
+          p[0][typeId] = [seconds, first]
+        else:
+          typeSum[0] += seconds
+          if first < typeSum[1]:
+            typeSum[1] = first
+      p[1] += t[1]
+      p[2] += t[2]
+    self._propagated = True
+
+  # Returns duration in seconds per record type of a node and all below it
+  # @return map of typeId to seconds, in order of first appearance
+  def durations(self, id):
+    t = self._totals.get(id)
+    if t == None:
+      return OrderedDict()
+    return OrderedDict([(typeId, typeSum[0]) for typeId, typeSum in sorted(t[0].items(), key=lambda i: i[1][1])])
+
+  # Returns total duration in seconds of a node and all below it
+  def duration(self, id):
+    t = self._totals.get(id)
+    return sum([typeSum[0] for typeSum in t[0].values()]) if t != None else 0
+
+  # Returns billable amount of a node and all below it. See
+  # YastRecordBatch.billableAmount
+  def billableAmount(self, id):
+    t = self._totals.get(id)
+    return t[1] if t != None else 0.0
+
+  # Returns number of records of a node and all below it
+  def count(self, id):
+    t = self._totals.get(id)
+    return t[2] if t != None else 0
+
+  # Returns True if no time was spent on a node or below it
+  def isEmpty(self, id):
+    t = self._totals.get(id)
+    return t == None or all([typeSum[0] <= 0 for typeSum in t[0].values()])
+
+  # Yields (depth, node) for nodes of the tree, parents before children
+  # @param roots nodes to start from. Defaults to the top level nodes
+  # @param depth depth of the roots
+  # @param skipEmpty leave out nodes where isEmpty is True, and all below them
+  def walk(self, roots=None, depth=0, skipEmpty=False):
+    stack = [(depth, n) for n in reversed(self.roots if roots == None else roots)]
+    while stack:
+      depth, n = stack.pop()
+      if skipEmpty and self.isEmpty(n.id):
+        continue
+      yield depth, n
+      stack.extend([(depth + 1, c) for c in reversed(self.children[n.id])])
@@ -18,15 +18,88 @@
 # 0.10 - Misc
 #  * Added support for new work record variables
 #
+# 0.11 - Performance
+#  * Requests reuse keep-alive connections from a shared connection pool
+#  * Added AsyncYast, an asyncio client with the same API, in yastasync.py
+#  * Added iterRecords, which decodes records while the response is downloaded
+#  * Added getRecordsSharded, which fetches a time range as parallel windows
+#  * Added YastStore, a local SQLite mirror with incremental sync, in yaststore.py
+#  * Added YastMetaCache, a TTL cache for projects, folders and record types
+#  * Records, projects and folders use __slots__. Record variables are typed
+#    attributes, and record.variables is a view on them
+#  * Added YastRecordBatch, columnar records with fast aggregates, in yastbatch.py.
+#    getRecords returns one with batch=True
+#  * Objects are serialized from precompiled templates, and ]]> in CDATA text
+#    is escaped
+#  * Added addBulk, changeBulk and deleteBulk, which send objects as parallel
+#    batches within a size budget
+#  * Read requests are retried with backoff on SERVER_MAINTENANCE and
+#    connection errors, and YastCircuitBreaker fails fast while a host is down
+#  * Added YastRateLimiter, a process-wide limit of requests per second and in
+#    flight per host, with turns between accounts
+#  * Added observers, called with timing, size and status of every request, and
+#    YastLatencyStats, which collects latency percentiles per request
+#  * Added getReportTo, which streams a report into a file in chunks and
+#    resumes cut off downloads with Range requests
+#  * Added YastReportCache, an on-disk cache of reports by query
+#  * HTTP, XML and thread pool modules, and yastbatch with NumPy, are loaded
+#    on first use
+#  * Added YastSessionCache, which keeps login hashes between runs and logs in
+#    again once when Yast rejects one
+#  * Added YastRecordExporter and exportRecords, which write records into
+#    Parquet, Arrow or CSV files in chunks, in yastexport.py
+#  * Records, projects and folders track changes since they were received.
+#    change and changeBulk skip unmodified objects, and with checkConflicts
+#    fail with LIB_CONFLICT on records updated in Yast meanwhile
+#
 
-import os,sys
-if sys.version_info[0] == 3:
-  from urllib.parse import urlencode
-  from http.client import HTTPConnection, HTTPSConnection
-else:
-  from urllib import urlencode
-  from httplib import HTTPConnection, HTTPSConnection
-from xml.etree import ElementTree
+import os,sys,time,select,socket,threading,json,copy,random,hashlib,tempfile,binascii
+from collections import OrderedDict, deque
+try:
+  from collections.abc import MutableMapping
+except ImportError:
+  from collections import MutableMapping
+
+# Names exported by 'from yastlib import *'. Leaves out the modules and the
+# placeholders of the lazily loaded ones below, which would otherwise replace
+# the same names imported by the importing module
+__all__ = ['Yast', 'YastStatus', 'YastStatusError', 'YastConflictError', 'YastRecordVariables', 'YastTracked',
+           'YastRecord', 'YastRecordWork', 'YastRecordPhonecall', 'YastProject', 'YastFolder', 'YastRecordType',
+           'YastVariableType', 'YastConnectionPool', 'defaultConnectionPool', 'YastCircuitBreaker',
+           'defaultCircuitBreaker', 'YastRateLimiter', 'defaultRateLimiter', 'YastMetaCache', 'YastSessionCache',
+           'YastReportCache', 'YastRequestEvent', 'YastLatencyStats', 'defaultObservers']
+
+# HTTP, XML and thread pool modules are loaded by _loadModules when Yast is
+# first contacted, so programs that never do, like 'yast.py print time',
+# start faster
+urlencode = HTTPConnection = HTTPSConnection = HTTPException = ElementTree = None
+ThreadPoolExecutor = wait = FIRST_COMPLETED = None
+# Errors of a kept-alive connection the server closed, and errors of the
+# connection to Yast, as opposed to errors reported by Yast
+_staleConnectionErrors = _transportErrors = ()
+_modulesLoaded = False
+
+def _loadModules():
+  global urlencode, HTTPConnection, HTTPSConnection, HTTPException, ElementTree
+  global ThreadPoolExecutor, wait, FIRST_COMPLETED, _staleConnectionErrors, _transportErrors, _modulesLoaded
+  if _modulesLoaded:
+    return
+  if sys.version_info[0] == 3:
+    from urllib.parse import urlencode
+    from http.client import HTTPConnection, HTTPSConnection, BadStatusLine, HTTPException
+    _staleConnectionErrors = (BadStatusLine, ConnectionResetError, ConnectionAbortedError, BrokenPipeError)
+  else:
+    from urllib import urlencode
+    from httplib import HTTPConnection, HTTPSConnection, BadStatusLine, HTTPException
+    _staleConnectionErrors = (BadStatusLine, socket.error)
+  _transportErrors = (socket.error, socket.timeout, HTTPException)
+  from xml.etree import ElementTree
+  try:
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+  except ImportError:
+    # Python 2 without the futures backport. Parallel requests are unavailable
+    ThreadPoolExecutor = None
+  _modulesLoaded = True
 
 
 # Status messages returned from Yast API. Return-value from last API call can
@@ -65,168 +138,314 @@ class YastStatus:
   LIB_XML_PARSE_ERROR = 40
   LIB_NOT_LOGGED_IN = 41
   LIB_EXCEPTION = 42
+  LIB_CIRCUIT_OPEN = 43
+  LIB_CONFLICT = 44
 
   CLI_ARGUMENT_ERROR = 60
   CLI_LOGIN_REQUIRED = 61
   CLI_EXCEPTION = 62
   
 
+# Raised when Yast answers a request with a non-success status. The status is
+# kept in the status attribute
+class YastStatusError(Exception):
+  def __init__(self, status):
+    super(YastStatusError, self).__init__("Non-success return-value from Yast: " + str(status))
+    self.status = status
+
+
+# Raised by change when records were updated in Yast since they were
+# received, with status LIB_CONFLICT. The records are kept in the conflicts
+# attribute
+class YastConflictError(YastStatusError):
+  def __init__(self, conflicts):
+    Exception.__init__(self, str(len(conflicts)) + " record(s) changed in Yast since they were received: " +
+                       ",".join([str(r.id) for r in conflicts]))
+    self.status = YastStatus.LIB_CONFLICT
+    self.conflicts = conflicts
+
+
+# Returns text escaped for use inside CDATA. A ]]> in the text would end the
+# section early, so it is split over two sections
+def _xmlCdata(text):
+  if text == None:
+    return ''
+  if not isinstance(text, str):
+    text = '%s' % text
+  return text.replace(']]>', ']]]]><![CDATA[>') if ']]>' in text else text
+
+
+# Returns the toXml templates of an object, by (includeId, includeData). The
+# templates take the id, if included, followed by the data values
+# @param tag XML tag of object
+# @param data XML of object data, with %s for values
+def _compileXmlTemplates(tag, data):
+  return {(True, True): '<' + tag + '><id>%s</id>' + data + '</' + tag + '>',
+          (True, False): '<' + tag + '><id>%s</id></' + tag + '>',
+          (False, True): '<' + tag + '>' + data + '</' + tag + '>',
+          (False, False): '<' + tag + '></' + tag + '>'}
+
+
+# Dictionary view of the variables of a typed record. Reads and writes go to
+# the record attributes, so code using record.variables keeps working
+class YastRecordVariables(MutableMapping):
+  __slots__ = ('_record',)
+
+  def __init__(self, record):
+    self._record = record
+
+  def __getitem__(self, key):
+    if key not in self._record.variableNames:
+      raise KeyError(key)
+    return getattr(self._record, key)
+
+  def __setitem__(self, key, value):
+    if key not in self._record.variableNames:
+      raise KeyError(key)
+    setattr(self._record, key, value)
+
+  def __delitem__(self, key):
+    raise TypeError("Variables of a " + self._record.typeName + " record can not be removed")
+
+  def __iter__(self):
+    return iter(self._record.variableNames)
+
+  def __len__(self):
+    return len(self._record.variableNames)
+
+  def __repr__(self):
+    return repr(dict(self))
+
+
+# Base of records, projects and folders. Remembers the values change sends
+# as they were when the object was last received from or sent to Yast, so
+# change can skip objects that were not modified
+class YastTracked(object):
+  __slots__ = ('_clean',)
+
+  # Names of the attributes sent by change
+  _syncedFields = ()
+
+  # Returns True if the object was modified since it was last received from
+  # or sent to Yast. Objects created locally are always modified
+  def isDirty(self):
+    return self._clean == None or self._clean != self._state()
+
+  # Returns names of the attributes modified since the object was last
+  # received from or sent to Yast
+  def dirtyFields(self):
+    if self._clean == None:
+      return list(self._syncedFields)
+    return [name for name, old, new in zip(self._syncedFields, self._clean, self._state()) if old != new]
+
+  # Take the current values as those in Yast
+  def markClean(self):
+    self._clean = self._state()
+
+  # Mark the object as modified, so change sends it
+  def markDirty(self):
+    self._clean = None
+
+  def _state(self):
+    return tuple([getattr(self, name) for name in self._syncedFields])
+
+
 # Generic yast record
-class YastRecord(object):
-  id = -1
-  typeId = -1
-  timeCreated = -1
-  timeUpdated = -1
-  project = -1
-  variables = None
-  creator = -1
-  flags = 0
-
-  # User data. Will not be synchronized to Yast. You can
-  # fill this with whatever you like
-  userData = None
+class YastRecord(YastTracked):
+  __slots__ = ('id', 'typeId', 'timeCreated', 'timeUpdated', 'project', 'creator', 'flags', 'userData',
+               '_variables')
+
+  # Names of the typed variable attributes of the record, in Yast order.
+  # Empty for generic records, which keep their variables in a plain dict
+  variableNames = ()
+
+  _syncedFields = ('id', 'typeId', 'project', 'variables')
 
   # Construct a generic yast record
   def __init__(self, typeId, project, variables):
+    self.id = -1
     self.typeId = typeId
+    self.timeCreated = -1
+    self.timeUpdated = -1
     self.project = project
+    self.creator = -1
+    self.flags = 0
+
+    # User data. Will not be synchronized to Yast. You can
+    # fill this with whatever you like
+    self.userData = None
+
+    self._variables = None
     self.variables = variables
+    self._clean = None
+
+  # Variables of the record. For typed records this is a view on the
+  # record attributes, and assigning a map sets those attributes
+  @property
+  def variables(self):
+    if self.variableNames:
+      return YastRecordVariables(self)
+    return self._variables
+
+  @variables.setter
+  def variables(self, variables):
+    if not self.variableNames:
+      self._variables = variables
+    elif variables != None:
+      for name, value in variables.items():
+        if name not in self.variableNames:
+          raise KeyError(name)
+        setattr(self, name, value)
+
+  # Generic records compare a copy of their variables
+  def _state(self):
+    if self.variableNames:
+      return tuple([getattr(self, name) for name in self._syncedFields])
+    return (self.id, self.typeId, self.project, dict(self._variables) if self._variables != None else None)
+
+  # Templates of toXml, by (includeId, includeData)
+  _xmlTemplates = _compileXmlTemplates('record', '<typeId>%s</typeId><project>%s</project>')
 
   # Returns XML description of record
   def toXml(self, includeId=True, includeData=True):
-    return '<record>' + \
-        ('<id>' + str(self.id) + '</id>' if includeId else '') + \
-        ('<typeId>' + str(self.typeId) + '</typeId>' + \
-           '<project>' + str(self.project) + '</project>' \
-           if includeData else '') + \
-           '</record>'
+    return self._xmlTemplates[includeId, includeData] % \
+        (((self.id,) if includeId else ()) + ((self.typeId, self.project) if includeData else ()))
 
 
 # Yast Work record
 class YastRecordWork(YastRecord):
+  __slots__ = ('startTime', 'endTime', 'comment', 'isRunning', 'hourlyCost', 'hourlyIncome', 'isBillable')
+  variableNames = __slots__
+  _syncedFields = ('id', 'typeId', 'project') + __slots__
   typeName = "work"
 
   # Construct a work record
   def __init__(self, project, startTime, endTime, comment, isRunning, hourlyCost=0, 
                hourlyIncome=0, isBillable=0):
-    super(YastRecordWork, self).__init__(1, int(project), {'startTime': int(startTime),
-                                                           'endTime': int(endTime),
-                                                           'comment': comment if comment != None else "",
-                                                           'isRunning': int(isRunning),
-                                                           'hourlyCost': float(hourlyCost),
-                                                           'hourlyIncome': float(hourlyIncome),
-                                                           'isBillable': int(isBillable)})
+    super(YastRecordWork, self).__init__(1, int(project), None)
+    self.startTime = int(startTime)
+    self.endTime = int(endTime)
+    self.comment = comment if comment != None else ""
+    self.isRunning = int(isRunning)
+    self.hourlyCost = float(hourlyCost)
+    self.hourlyIncome = float(hourlyIncome)
+    self.isBillable = int(isBillable)
   
 
+  _xmlTemplates = _compileXmlTemplates('record', '<typeId>1</typeId><project>%s</project>' +
+                                                 '<variables><v>%s</v><v>%s</v><v><![CDATA[%s]]></v><v>%s</v>' +
+                                                 '<v>%s</v><v>%s</v><v>%s</v></variables>')
+
   # Returns XML description of record
   def toXml(self, includeId=True, includeData=True):
-    return '<record>' + \
-        ('<id>' + str(self.id) + '</id>' if includeId else '') + \
-        ('<typeId>1</typeId>' + \
-           '<project>' + str(self.project) + '</project>' + \
-           '<variables><v>' + str(self.variables['startTime']) + '</v><v>' + str(self.variables['endTime']) + '</v>' + \
-           '<v><![CDATA[' + self.variables['comment'] + ']]></v><v>' + str(self.variables['isRunning']) + '</v>' + \
-           '<v>' + str(self.variables['hourlyCost']) + '</v><v>' + str(self.variables['hourlyIncome']) + '</v>' + \
-           '<v>' + str(self.variables['isBillable']) + '</v></variables>' \
-           if includeData else '') + \
-           '</record>'
+    return self._xmlTemplates[includeId, includeData] % \
+        (((self.id,) if includeId else ()) + \
+         ((self.project, self.startTime, self.endTime, _xmlCdata(self.comment), self.isRunning,
+           self.hourlyCost, self.hourlyIncome, self.isBillable) if includeData else ()))
   
 
 
 # Yast Phonecall record
 class YastRecordPhonecall(YastRecord):
+  __slots__ = ('startTime', 'endTime', 'comment', 'isRunning', 'phoneNumber', 'outgoing')
+  variableNames = __slots__
+  _syncedFields = ('id', 'typeId', 'project') + __slots__
   typeName = "phonecall"
 
   # Construct a work record
   def __init__(self, project, startTime, endTime, comment, isRunning, phoneNumber, outgoing):
-    super(YastRecordPhonecall, self).__init__(3, int(project), {'startTime': int(startTime),
-                                                           'endTime': int(endTime),
-                                                           'comment': comment if comment != None else "",
-                                                           'isRunning': int(isRunning),
-                                                           'phoneNumber': phoneNumber,
-                                                           'outgoing': int(outgoing)})
+    super(YastRecordPhonecall, self).__init__(3, int(project), None)
+    self.startTime = int(startTime)
+    self.endTime = int(endTime)
+    self.comment = comment if comment != None else ""
+    self.isRunning = int(isRunning)
+    self.phoneNumber = phoneNumber
+    self.outgoing = int(outgoing)
     
 
+  _xmlTemplates = _compileXmlTemplates('record', '<typeId>3</typeId><project>%s</project>' +
+                                                 '<variables><v>%s</v><v>%s</v><v><![CDATA[%s]]></v><v>%s</v>' +
+                                                 '<v><![CDATA[%s]]></v><v>%s</v></variables>')
+
   # Returns XML description of record
   def toXml(self, includeId=True, includeData=True):
-    return '<record>' + \
-        ('<id>' + str(self.id) + '</id>' if includeId else '') + \
-        ('<typeId>3</typeId>' + \
-           '<project>' + str(self.project) + '</project>' + \
-           '<variables><v>' + str(self.variables['startTime']) + '</v><v>' + str(self.variables['endTime']) + '</v>' + \
-           '<v><![CDATA[' + self.variables['comment'] + ']]></v><v>' + str(self.variables['isRunning']) + '</v>' + \
-           '<v><![CDATA[' + str(self.variables['phoneNumber']) + ']]></v><v>' + str(self.variables['outgoing']) + '</v></variables>' \
-           if includeData else '') + \
-           '</record>'
+    return self._xmlTemplates[includeId, includeData] % \
+        (((self.id,) if includeId else ()) + \
+         ((self.project, self.startTime, self.endTime, _xmlCdata(self.comment), self.isRunning,
+           _xmlCdata(self.phoneNumber), self.outgoing) if includeData else ()))
   
 
 
 # Yast project
-class YastProject(object):
-  id = -1
-  name = ""
-  description = ""
-  primaryColor = ""
-  parentId = -1
-  privileges = 0
-  timeCreated = -1
-  creator = -1
+class YastProject(YastTracked):
+  __slots__ = ('id', 'name', 'description', 'primaryColor', 'parentId', 'privileges', 'timeCreated', 'creator',
+               'userData')
 
-  # User data. Will not be synchronized to Yast
-  userData = None
+  _syncedFields = ('id', 'name', 'description', 'primaryColor', 'parentId')
 
   # Construct a yast project
   def __init__(self, name, description, primaryColor, parentId=0):
+    self.id = -1
     self.name = name
     self.description = description if description != None else ""
     self.primaryColor = primaryColor
     self.parentId = int(parentId)
+    self.privileges = 0
+    self.timeCreated = -1
+    self.creator = -1
+
+    # User data. Will not be synchronized to Yast
+    self.userData = None
+    self._clean = None
     
   
+  _xmlTemplates = _compileXmlTemplates('project', '<name><![CDATA[%s]]></name>' +
+                                                  '<description><![CDATA[%s]]></description>' +
+                                                  '<primaryColor><![CDATA[%s]]></primaryColor>' +
+                                                  '<parentId>%s</parentId><flags>0</flags>')
+
   # Returns XML description of project
   def toXml(self, includeId=True, includeData=True):
-    return '<project>' + \
-        ('<id>' + str(self.id) + '</id>' if includeId else '') + \
-        ('<name><![CDATA[' + self.name + ']]></name>' + \
-           '<description><![CDATA[' + self.description + ']]></description>' + \
-           '<primaryColor><![CDATA[' + self.primaryColor + ']]></primaryColor>' + \
-           '<parentId>' + str(self.parentId) + '</parentId>' + \
-           '<flags>0</flags>' if includeData else '') + \
-           '</project>'
+    return self._xmlTemplates[includeId, includeData] % \
+        (((self.id,) if includeId else ()) + \
+         ((_xmlCdata(self.name), _xmlCdata(self.description), _xmlCdata(self.primaryColor),
+           self.parentId) if includeData else ()))
   
 
 
 # Yast folder
-class YastFolder(object):
-  id = -1
-  name = ""
-  description = ""
-  primaryColor = ""
-  parentId = -1
-  privileges = 0
-  timeCreated = -1
-  creator = -1
+class YastFolder(YastTracked):
+  __slots__ = ('id', 'name', 'description', 'primaryColor', 'parentId', 'privileges', 'timeCreated', 'creator',
+               'userData')
 
-  # User data. Will not be synchronized to Yast
-  userData = None
+  _syncedFields = ('id', 'name', 'description', 'primaryColor', 'parentId')
 
   # Construct a yast folder
   def __init__(self, name, description, primaryColor, parentId=0):
+    self.id = -1
     self.name = name
     self.description = description if description != None else ""
     self.primaryColor = primaryColor
     self.parentId = int(parentId)
+    self.privileges = 0
+    self.timeCreated = -1
+    self.creator = -1
+
+    # User data. Will not be synchronized to Yast
+    self.userData = None
+    self._clean = None
   
+  _xmlTemplates = _compileXmlTemplates('folder', '<name><![CDATA[%s]]></name>' +
+                                                 '<description><![CDATA[%s]]></description>' +
+                                                 '<primaryColor><![CDATA[%s]]></primaryColor>' +
+                                                 '<parentId>%s</parentId><flags>0</flags>')
+
   # Returns XML description of folder
   def toXml(self, includeId=True, includeData=True):
-    return '<folder>' + \
-        ('<id>' + str(self.id) + '</id>' if includeId else '') + \
-        ('<name><![CDATA[' + self.name + ']]></name>' + \
-           '<description><![CDATA[' + self.description + ']]></description>' + \
-           '<primaryColor><![CDATA[' + self.primaryColor + ']]></primaryColor>' + \
-           '<parentId>' + str(self.parentId) + '</parentId>' + \
-           '<flags>0</flags>' if includeData else '') + \
-           '</folder>'
+    return self._xmlTemplates[includeId, includeData] % \
+        (((self.id,) if includeId else ()) + \
+         ((_xmlCdata(self.name), _xmlCdata(self.description), _xmlCdata(self.primaryColor),
+           self.parentId) if includeData else ()))
   
 
 
@@ -250,7 +469,826 @@ class YastVariableType(object):
   def __init__(self, name, valType):
     self.name = name
     self.valType = int(valType)
-  
+
+
+# Pool of persistent keep-alive connections. Idle connections are kept per
+# scheme and host, so consecutive requests to the same host skip the TCP and
+# TLS handshakes. Safe to share between threads and Yast instances
+class YastConnectionPool(object):
+
+  # Max number of idle connections kept per scheme and host
+  maxSize = 4
+  # Seconds an idle connection is kept before it is discarded
+  idleTimeout = 60
+
+  def __init__(self, maxSize=4, idleTimeout=60):
+    self.maxSize = int(maxSize)
+    self.idleTimeout = idleTimeout
+    self._idle = {}
+    self._lock = threading.Lock()
+
+  # Get a connection to host. Reuses an idle connection if a live one is available
+  # @param host host to connect to
+  # @param useHttps connect using https
+  # @param timeout socket timeout in seconds
+  # @return (connection, reused) where reused tells if the connection was pooled
+  def get(self, host, useHttps, timeout):
+    key = (useHttps, host)
+    now = time.time()
+    conn = None
+    with self._lock:
+      idle = self._idle.get(key)
+      while idle and conn == None:
+        candidate, lastUsed = idle.pop()
+        if now - lastUsed <= self.idleTimeout and not self._isStale(candidate):
+          conn = candidate
+        else:
+          candidate.close()
+
+    if conn == None:
+      return self.connect(host, useHttps, timeout), False
+
+    conn.timeout = timeout
+    conn.sock.settimeout(timeout)
+    return conn, True
+
+  # Create a new, unpooled connection to host
+  def connect(self, host, useHttps, timeout):
+    _loadModules()
+    if useHttps:
+      conn = HTTPSConnection(host, timeout=timeout)
+    else:
+      conn = HTTPConnection(host, timeout=timeout)
+
+    # Requests are small and sent in several writes. Don't let Nagle hold them back
+    conn.connect()
+    conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return conn
+
+  # Hand a connection back to the pool. The previous response must be fully read
+  # @param response last response read on the connection
+  def release(self, conn, host, useHttps, response):
+    if conn.sock == None or response.will_close or self.maxSize <= 0:
+      conn.close()
+      return
+
+    key = (useHttps, host)
+    with self._lock:
+      idle = self._idle.setdefault(key, [])
+      idle.append((conn, time.time()))
+      # Drop the least recently used connections when full
+      while len(idle) > self.maxSize:
+        idle.pop(0)[0].close()
+
+  # Close all idle connections
+  def clear(self):
+    with self._lock:
+      idle, self._idle = self._idle, {}
+    for conns in idle.values():
+      for conn, lastUsed in conns:
+        conn.close()
+
+  # An idle socket should have nothing to read. If it is readable, the server
+  # has closed it (or sent something unexpected) and it can not be reused
+  def _isStale(self, conn):
+    if conn.sock == None:
+      return True
+    try:
+      readable = select.select([conn.sock], [], [], 0)[0]
+    except (ValueError, select.error, socket.error):
+      return True
+    return len(readable) > 0
+
+
+# Connection pool used by Yast instances that do not set their own
+defaultConnectionPool = YastConnectionPool()
+
+
+# Tracks the health of hosts, and fails requests fast while a host is down.
+# After failureThreshold failed requests in a row, the circuit of the host
+# opens and requests fail at once for resetTimeout seconds. Then a single
+# request is let through, which closes the circuit again if it succeeds.
+# Failures are connection errors and SERVER_MAINTENANCE. Safe to share
+# between threads and Yast instances
+class YastCircuitBreaker(object):
+
+  # Failed requests in a row that open the circuit. 0 never opens it
+  failureThreshold = 5
+  # Seconds the circuit stays open before a request is tried again
+  resetTimeout = 30
+
+  def __init__(self, failureThreshold=5, resetTimeout=30):
+    self.failureThreshold = int(failureThreshold)
+    self.resetTimeout = resetTimeout
+    # Per host [failures in a row, time opened or None]
+    self._hosts = {}
+    self._lock = threading.Lock()
+
+  # Returns True if a request to host may be sent
+  def allow(self, host):
+    with self._lock:
+      state = self._hosts.get(host)
+      if state == None or state[1] == None:
+        return True
+      if time.time() - state[1] < self.resetTimeout:
+        return False
+      # Let this request through as a trial. Others wait for its outcome
+      state[1] = time.time()
+      return True
+
+  # Returns True if the circuit of host is open
+  def isOpen(self, host):
+    with self._lock:
+      state = self._hosts.get(host)
+      return state != None and state[1] != None
+
+  # Record a successful request to host
+  def success(self, host):
+    with self._lock:
+      self._hosts.pop(host, None)
+
+  # Record a failed request to host
+  def failure(self, host):
+    with self._lock:
+      state = self._hosts.setdefault(host, [0, None])
+      state[0] += 1
+      if self.failureThreshold > 0 and state[0] >= self.failureThreshold:
+        state[1] = time.time()
+
+  # Close all circuits
+  def reset(self):
+    with self._lock:
+      self._hosts = {}
+
+
+# Circuit breaker used by Yast instances without their own
+defaultCircuitBreaker = YastCircuitBreaker()
+
+
+# Limits the request rate and the number of requests in flight per host. When
+# requests have to wait, accounts take turns, so one busy account can not
+# starve the others. Hosts without limits are not held back. A request holds
+# its place in flight until its response is read, which for iterRecords is
+# when the generator is done. Safe to share between threads and Yast instances
+#
+# Example:
+#   defaultRateLimiter.configure('www.yast.com', rate=10, maxInFlight=4)
+class YastRateLimiter(object):
+
+  def __init__(self):
+    self._hosts = {}
+    self._condition = threading.Condition(threading.Lock())
+
+  # Set the limits of a host
+  # @param host host as in Yast.host
+  # @param rate max sustained requests per second. None for no limit
+  # @param burst max number of requests sent at once after an idle period.
+  #              Default is rate, at least 1
+  # @param maxInFlight max number of requests in flight. None for no limit
+  def configure(self, host, rate=None, burst=None, maxInFlight=None):
+    with self._condition:
+      state = self._state(host)
+      state['rate'] = float(rate) if rate != None else None
+      state['burst'] = float(burst) if burst != None else max(state['rate'] or 1.0, 1.0)
+      state['tokens'] = min(state['tokens'], state['burst']) if state['tokens'] != None else state['burst']
+      state['updated'] = time.time()
+      state['maxInFlight'] = int(maxInFlight) if maxInFlight != None else None
+      self._condition.notify_all()
+
+  # Wait until a request to host may be sent. Every acquire must be followed
+  # by a release once the request is done
+  # @param host host to send to
+  # @param account key of the account sending, e.g. the username
+  def acquire(self, host, account):
+    with self._condition:
+      state = self._state(host)
+      if state['rate'] == None and state['maxInFlight'] == None:
+        state['inFlight'] += 1
+        return
+
+      ticket = object()
+      waiting = state['waiting']
+      if not account in waiting:
+        waiting[account] = []
+      waiting[account].append(ticket)
+      try:
+        while True:
+          wait = self._wait(state)
+          # The first waiting account gets the next turn
+          first = next(iter(waiting))
+          if wait == 0 and waiting[first][0] is ticket:
+            break
+          self._condition.wait(wait if wait > 0 else None)
+      except:
+        waiting[account].remove(ticket)
+        if not waiting[account]:
+          del waiting[account]
+        self._condition.notify_all()
+        raise
+
+      # Take the turn, and move the account behind the others still waiting
+      tickets = waiting.pop(account)
+      tickets.pop(0)
+      if tickets:
+        waiting[account] = tickets
+      if state['rate'] != None:
+        state['tokens'] -= 1
+      state['inFlight'] += 1
+      self._condition.notify_all()
+
+  # Take a turn to send a request to host if one is available without
+  # waiting, and no other request waits for one
+  # @param host host to send to
+  # @return True if taken. It must then be followed by a release
+  def tryAcquire(self, host):
+    with self._condition:
+      state = self._state(host)
+      if state['waiting'] or self._wait(state) != 0:
+        return False
+      if state['rate'] != None:
+        state['tokens'] -= 1
+      state['inFlight'] += 1
+      return True
+
+  # Mark a request to host as done
+  def release(self, host):
+    with self._condition:
+      self._hosts[host]['inFlight'] -= 1
+      self._condition.notify_all()
+
+  # Returns the number of requests in flight to host
+  def inFlight(self, host):
+    with self._condition:
+      return self._hosts[host]['inFlight'] if host in self._hosts else 0
+
+
+  def _state(self, host):
+    if not host in self._hosts:
+      self._hosts[host] = {'rate': None, 'burst': None, 'tokens': None, 'updated': time.time(),
+                           'maxInFlight': None, 'inFlight': 0, 'waiting': OrderedDict()}
+    return self._hosts[host]
+
+  # Seconds until the limits of a host allow a request. 0 if one is allowed
+  # now, -1 if a request has to finish first
+  def _wait(self, state):
+    if state['maxInFlight'] != None and state['inFlight'] >= state['maxInFlight']:
+      return -1
+    if state['rate'] == None:
+      return 0
+    now = time.time()
+    state['tokens'] = min(state['tokens'] + (now - state['updated']) * state['rate'], state['burst'])
+    state['updated'] = now
+    if state['tokens'] >= 1:
+      return 0
+    return (1 - state['tokens']) / state['rate']
+
+
+# Rate limiter used by Yast instances without their own
+defaultRateLimiter = YastRateLimiter()
+
+
+# Cache of projects, folders and record types. Entries are kept per host and
+# user, expire after ttl seconds, and the least recently used entries are
+# dropped when more than maxEntries are cached. With a path, the cache is also
+# kept in that file so it survives between processes. Safe to share between
+# threads and Yast instances
+class YastMetaCache(object):
+
+  # Seconds an entry is valid
+  ttl = 300
+  # Max number of entries kept. Each user has up to three
+  maxEntries = 64
+  # File the cache is kept in, or None for memory only
+  path = None
+
+  def __init__(self, ttl=300, maxEntries=64, path=None):
+    self.ttl = ttl
+    self.maxEntries = maxEntries
+    self.path = path
+    self._entries = None
+    self._lock = threading.Lock()
+
+  # Returns a copy of cached objects, or None if not cached or expired
+  # @param kind 'projects', 'folders' or 'recordTypes'
+  def get(self, host, user, kind):
+    key = self._key(host, user, kind)
+    with self._lock:
+      entries = self._load()
+      if not key in entries:
+        return None
+      stored, objects = entries.pop(key)
+      if time.time() - stored > self.ttl:
+        self._save()
+        return None
+      entries[key] = (stored, objects)
+    return self._copy(objects)
+
+  # Cache objects
+  # @param objects map of objects, indexed by id
+  def put(self, host, user, kind, objects):
+    key = self._key(host, user, kind)
+    with self._lock:
+      entries = self._load()
+      entries.pop(key, None)
+      entries[key] = (time.time(), self._copy(objects))
+      while len(entries) > self.maxEntries:
+        entries.popitem(last=False)
+      self._save()
+
+  # Drop all entries of a user
+  def invalidate(self, host, user):
+    prefix = self._key(host, user, '')
+    with self._lock:
+      entries = self._load()
+      for key in [k for k in entries if k.startswith(prefix)]:
+        del entries[key]
+      self._save()
+
+  # Drop all entries
+  def clear(self):
+    with self._lock:
+      self._entries = OrderedDict()
+      self._save()
+
+  def _key(self, host, user, kind):
+    return host + "\n" + user + "\n" + kind
+
+  def _copy(self, objects):
+    return dict([(id, copy.copy(o)) for id, o in objects.items()])
+
+  # Load entries from file the first time they are needed
+  def _load(self):
+    if self._entries == None:
+      self._entries = OrderedDict()
+      if self.path != None and os.path.exists(self.path):
+        try:
+          with open(self.path) as f:
+            for key, stored, objects in json.load(f):
+              self._entries[key] = (stored, dict([(o.id, o) for o in map(self._decode, objects)]))
+        except (ValueError, KeyError, TypeError, IndexError):
+          # Unreadable cache. Start over
+          self._entries = OrderedDict()
+    return self._entries
+
+  # Write entries to file, readable by owner only
+  def _save(self):
+    if self.path == None:
+      return
+    data = [[key, stored, [self._encode(o) for o in objects.values()]]
+            for key, (stored, objects) in self._entries.items()]
+    # A unique temporary file, as processes sharing the file may save at once.
+    # mkstemp creates it readable by owner only
+    fd, tmpPath = tempfile.mkstemp('.tmp', os.path.basename(self.path) + ".",
+                                   os.path.dirname(os.path.abspath(self.path)))
+    try:
+      with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+      os.rename(tmpPath, self.path)
+    except:
+      os.remove(tmpPath)
+      raise
+
+  def _encode(self, o):
+    if isinstance(o, YastRecordType):
+      return ['recordType', o.id, o.name, [[v.id, v.name, v.valType] for v in o.variableTypes]]
+    return ['project' if isinstance(o, YastProject) else 'folder', o.id, o.name, o.description,
+            o.primaryColor, o.parentId, o.privileges, o.timeCreated, o.creator]
+
+  def _decode(self, data):
+    if data[0] == 'recordType':
+      variableTypes = []
+      for id, name, valType in data[3]:
+        variableType = YastVariableType(name, valType)
+        variableType.id = id
+        variableTypes.append(variableType)
+      o = YastRecordType(data[2], variableTypes)
+      o.id = data[1]
+    else:
+      o = (YastProject if data[0] == 'project' else YastFolder)(data[2], data[3], data[4], data[5])
+      o.privileges, o.timeCreated, o.creator = data[6], data[7], data[8]
+      o.id = data[1]
+      # Cached as received from Yast
+      o.markClean()
+    return o
+
+
+
+# Hashes of logins kept in a file between runs, so programs logging in with a
+# password skip the auth.login request. A hash is found by host and user, and
+# only returned for the password it was cached with, which is checked against
+# a salted PBKDF2 verifier. Hashes are kept until Yast rejects them. The file
+# is readable by its owner only
+class YastSessionCache(object):
+
+  # File the hashes are kept in. None keeps them in memory only
+  path = None
+  # PBKDF2 iterations of the password verifiers
+  iterations = 100000
+
+  def __init__(self, path):
+    self.path = path
+    self._lock = threading.Lock()
+    # Salt and entries if kept in memory
+    self._data = None
+
+  # Returns the hash of a login, or None if not cached
+  def get(self, host, user, password):
+    with self._lock:
+      data = self._load()
+      entry = data['entries'].get(self._key(host, user))
+      if entry == None or entry[0] != self._verifier(data['salt'], host, user, password):
+        return None
+      return entry[1]
+
+  # Cache the hash of a login
+  def put(self, host, user, password, hash):
+    with self._lock:
+      data = self._load()
+      data['entries'][self._key(host, user)] = [self._verifier(data['salt'], host, user, password), hash]
+      self._save(data)
+
+  # Forget the hash of a login
+  def invalidate(self, host, user, password):
+    with self._lock:
+      data = self._load()
+      if data['entries'].pop(self._key(host, user), None) != None:
+        self._save(data)
+
+  # Forget all hashes
+  def clear(self):
+    with self._lock:
+      self._save(self._empty())
+
+  def _key(self, host, user):
+    return host + "\n" + user
+
+  # Returns the verifier of a password. The salt is random per file, and
+  # host and user make it differ per entry
+  def _verifier(self, salt, host, user, password):
+    salt = (salt + "\n" + host + "\n" + user).encode('utf-8')
+    return binascii.hexlify(hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, self.iterations)).decode('ascii')
+
+  def _empty(self):
+    return {'salt': binascii.hexlify(os.urandom(16)).decode('ascii'), 'entries': {}}
+
+  # Read the salt and entries from file. Read on every access, as other
+  # processes update it
+  def _load(self):
+    if self.path == None:
+      if self._data == None:
+        self._data = self._empty()
+      return self._data
+    if not os.path.exists(self.path):
+      return self._empty()
+    try:
+      with open(self.path) as f:
+        data = json.load(f)
+      if isinstance(data, dict) and 'salt' in data and isinstance(data.get('entries'), dict):
+        return data
+    except ValueError:
+      pass
+    # Unreadable cache, or one of an older version. Start over
+    return self._empty()
+
+  # Write salt and entries to file, readable by owner only
+  def _save(self, data):
+    if self.path == None:
+      self._data = data
+      return
+    # A unique temporary file, as threads and processes sharing the file may
+    # save at once. mkstemp creates it readable by owner only
+    fd, tmpPath = tempfile.mkstemp('.tmp', os.path.basename(self.path) + ".",
+                                   os.path.dirname(os.path.abspath(self.path)))
+    try:
+      with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+      os.rename(tmpPath, self.path)
+    except:
+      os.remove(tmpPath)
+      raise
+
+
+
+# Cache of downloaded reports, kept as files in a directory. A report is
+# found by host, user, format and the normalized query options. Reports of
+# time ranges that ended before pastMargin do not expire. Other reports expire
+# after ttl seconds. Least recently used reports are evicted when the reports
+# take more than maxBytes
+class YastReportCache(object):
+
+  # Seconds a report is valid
+  ttl = 3600
+  # Max total size of cached reports in bytes
+  maxBytes = 256 * 1024 * 1024
+  # Seconds timeTo must lie in the past for a report to be kept until evicted
+  pastMargin = 86400
+
+  # Names of the query options of getReport, and the options that are comma
+  # separated id lists
+  optionNames = ('timeFrom', 'timeTo', 'typeId', 'parentId', 'groupBy', 'constraints')
+  idListNames = ('typeId', 'parentId')
+
+  # @param path directory to keep reports in. Created if missing
+  def __init__(self, path, ttl=3600, maxBytes=256 * 1024 * 1024):
+    self.path = path
+    self.ttl = ttl
+    self.maxBytes = maxBytes
+    self._lock = threading.Lock()
+    if not os.path.isdir(path):
+      os.makedirs(path, 0o700)
+
+  # Returns the key of a report
+  # @param options query options as given to getReport
+  def key(self, host, user, reportFormat, options):
+    query = [reportFormat]
+    for name in self.optionNames:
+      if options == None or not name in options:
+        query.append(None)
+      elif name in ('timeFrom', 'timeTo'):
+        query.append(int(float(options[name])))
+      elif name in self.idListNames:
+        ids = options[name] if isinstance(options[name], (list, tuple)) else str(options[name]).split(',')
+        query.append(sorted(set([int(id) for id in ids if str(id).strip() != ''])))
+      else:
+        query.append(str(options[name]).strip())
+    return self._userKey(host, user) + '-' + self._hash(json.dumps(query))
+
+  # Returns True if a report of options will not change
+  def immutable(self, options):
+    return options != None and 'timeTo' in options and \
+        int(float(options['timeTo'])) < time.time() - self.pastMargin
+
+  # Returns a cached report as binary file opened for reading, or None if not
+  # cached or expired
+  def get(self, key):
+    for name, expires in ((key + '.past', False), (key + '.report', True)):
+      path = os.path.join(self.path, name)
+      try:
+        stat = os.stat(path)
+        if expires and time.time() - stat.st_mtime > self.ttl:
+          self._remove(path)
+          continue
+        f = open(path, 'rb')
+      except (OSError, IOError):
+        continue
+      # Remember use for eviction
+      os.utime(path, (time.time(), stat.st_mtime))
+      return f
+    return None
+
+  # Start caching a report. Write the report to the returned binary file and
+  # hand it to commit, or to abort if the download failed
+  def begin(self, key):
+    # Created readable by owner only
+    fd, path = tempfile.mkstemp('.tmp', key + '.', self.path)
+    os.close(fd)
+    return open(path, 'wb')
+
+  # Store a report written to a file from begin
+  # @param immutable keep the report until evicted. See immutable
+  def commit(self, key, f, immutable):
+    f.close()
+    os.rename(f.name, os.path.join(self.path, key + ('.past' if immutable else '.report')))
+    self._evict()
+
+  def abort(self, f):
+    f.close()
+    self._remove(f.name)
+
+  # Store a report
+  def put(self, key, data, immutable):
+    f = self.begin(key)
+    try:
+      f.write(data)
+    except:
+      self.abort(f)
+      raise
+    self.commit(key, f, immutable)
+
+  # Drop all reports of a user
+  def invalidate(self, host, user):
+    prefix = self._userKey(host, user) + '-'
+    for name in self._names():
+      if name.startswith(prefix) and not name.endswith('.tmp'):
+        self._remove(os.path.join(self.path, name))
+
+  # Drop all reports
+  def clear(self):
+    for name in self._names():
+      if not name.endswith('.tmp'):
+        self._remove(os.path.join(self.path, name))
+
+  def _userKey(self, host, user):
+    return self._hash(host + "\n" + user)[:16]
+
+  def _hash(self, text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+  def _names(self):
+    try:
+      return os.listdir(self.path)
+    except OSError:
+      return []
+
+  def _remove(self, path):
+    try:
+      os.remove(path)
+    except OSError:
+      pass
+
+  # Remove least recently used reports until they fit in maxBytes
+  def _evict(self):
+    with self._lock:
+      files = []
+      total = 0
+      for name in self._names():
+        try:
+          stat = os.stat(os.path.join(self.path, name))
+        except OSError:
+          continue
+        if name.endswith('.tmp'):
+          # Left by a download that did not finish
+          if time.time() - stat.st_mtime > 86400:
+            self._remove(os.path.join(self.path, name))
+          continue
+        files.append((stat.st_atime, stat.st_size, name))
+        total += stat.st_size
+      files.sort()
+      for used, size, name in files:
+        if total <= self.maxBytes:
+          break
+        self._remove(os.path.join(self.path, name))
+        total -= size
+
+
+
+# Timing, size and outcome of one API request. Handed to the observers of
+# Yast after the request
+class YastRequestEvent(object):
+
+  # Phases of a request that timings are kept for
+  phases = ('serialize', 'network', 'parse', 'decode')
+
+  def __init__(self, host):
+    # Name of request, e.g. data.getRecords
+    self.request = None
+    self.host = host
+    # Size of request and response in bytes, including report downloads
+    self.bytesSent = 0
+    self.bytesReceived = 0
+    # Seconds spent in each phase, and in total
+    self.timings = dict([(phase, 0.0) for phase in self.phases])
+    self.duration = 0.0
+    # Status of the response, or the client side status if there was none
+    self.status = None
+    # Number of objects decoded
+    self.objects = 0
+    # Number of tries that failed and were retried
+    self.retries = 0
+    self.startTime = time.time()
+    self._last = self.startTime
+
+  # Add the time since the previous mark to a phase
+  def mark(self, phase):
+    now = time.time()
+    self.timings[phase] += now - self._last
+    self._last = now
+
+  # Restart the clock without adding to a phase, e.g. after waiting on the caller
+  def resume(self):
+    self._last = time.time()
+
+
+# Observer collecting latency percentiles of requests by name
+#
+# Example:
+#   stats = YastLatencyStats()
+#   defaultObservers.append(stats)
+#   ...
+#   print(stats.report())
+class YastLatencyStats(object):
+
+  # Upper bounds in seconds of the histogram buckets
+  buckets = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+  # @param maxSamples number of latest durations kept per request for percentiles
+  def __init__(self, maxSamples=10000):
+    self.maxSamples = maxSamples
+    self._requests = {}
+    self._lock = threading.Lock()
+
+  def __call__(self, event):
+    with self._lock:
+      if not event.request in self._requests:
+        self._requests[event.request] = {'count': 0, 'errors': 0, 'bytesSent': 0, 'bytesReceived': 0,
+                                         'samples': deque(maxlen=self.maxSamples),
+                                         'histogram': [0] * (len(self.buckets) + 1),
+                                         'timings': dict([(phase, 0.0) for phase in YastRequestEvent.phases])}
+      stats = self._requests[event.request]
+      stats['count'] += 1
+      if event.status != YastStatus.SUCCESS:
+        stats['errors'] += 1
+      stats['bytesSent'] += event.bytesSent
+      stats['bytesReceived'] += event.bytesReceived
+      stats['samples'].append(event.duration)
+      bucket = 0
+      while bucket < len(self.buckets) and event.duration > self.buckets[bucket]:
+        bucket += 1
+      stats['histogram'][bucket] += 1
+      for phase, seconds in event.timings.items():
+        stats['timings'][phase] += seconds
+
+  # Returns names of the requests seen
+  def requests(self):
+    with self._lock:
+      return sorted(self._requests.keys())
+
+  # Returns latency percentiles of a request in seconds
+  # @param percentiles percentiles to return, from 0 to 100
+  # @return map of percentile to seconds, empty if the request was not seen
+  def percentiles(self, request, percentiles=(50, 95, 99)):
+    with self._lock:
+      if not request in self._requests:
+        return {}
+      samples = sorted(self._requests[request]['samples'])
+    return dict([(p, samples[min(int(len(samples) * p / 100.0), len(samples) - 1)]) for p in percentiles])
+
+  # Returns the histogram of a request, as a list of (upper bound, count).
+  # The bound of the last bucket is None
+  def histogram(self, request):
+    with self._lock:
+      counts = list(self._requests[request]['histogram']) if request in self._requests else []
+    return list(zip(list(self.buckets) + [None], counts))
+
+  # Returns a copy of the totals of a request: count, errors, bytesSent,
+  # bytesReceived and the seconds spent per phase in timings
+  def totals(self, request):
+    with self._lock:
+      stats = self._requests[request]
+      return {'count': stats['count'], 'errors': stats['errors'], 'bytesSent': stats['bytesSent'],
+              'bytesReceived': stats['bytesReceived'], 'timings': dict(stats['timings'])}
+
+  # Returns a text table of count, errors and p50/p95/p99 latency in
+  # milliseconds per request
+  def report(self):
+    lines = ["%-22s %8s %8s %10s %10s %10s" % ("request", "count", "errors", "p50 ms", "p95 ms", "p99 ms")]
+    for request in self.requests():
+      totals = self.totals(request)
+      p = self.percentiles(request)
+      lines.append("%-22s %8d %8d %10.1f %10.1f %10.1f" % (request, totals['count'], totals['errors'],
+                                                           p[50] * 1000, p[95] * 1000, p[99] * 1000))
+    return "\n".join(lines)
+
+  # Forget all requests
+  def clear(self):
+    with self._lock:
+      self._requests = {}
+
+
+# Observers called by Yast instances without their own. Observers are called
+# with a YastRequestEvent after every request, in the thread of the request
+defaultObservers = []
+
+# Event of the request running in the current thread
+_observedRequest = threading.local()
+
+# Returns the event of the request running in the current thread, or None
+def _currentEvent():
+  return getattr(_observedRequest, 'event', None)
+
+# Held while a login from a session cache is renewed
+_sessionLock = threading.Lock()
+
+# Decorator of Yast methods sending requests. Observes the requests as one event
+def _observed(method):
+  def observedMethod(self, *args, **kwargs):
+    return self._observe(method, self, *args, **kwargs)
+  observedMethod.__name__ = method.__name__
+  return observedMethod
+
+# Response wrapper counting the bytes read into an event
+class _CountingReader(object):
+  def __init__(self, response, event):
+    self.response = response
+    self.event = event
+
+  def read(self, size=-1):
+    data = self.response.read(size) if size != None and size >= 0 else self.response.read()
+    self.event.bytesReceived += len(data)
+    return data
+
+# Writer copying everything written to several files. Not seekable, so a
+# download into it is not restarted from the beginning
+class _TeeWriter(object):
+  def __init__(self, *files):
+    self.files = files
+
+  def write(self, data):
+    for f in self.files:
+      f.write(data)
+
+  def seekable(self):
+    return False
 
 
 class Yast(object):
@@ -267,6 +1305,35 @@ class Yast(object):
   useHttps = False
   # Request timeout in seconds
   requestTimeout = 300
+  # Pool to take keep-alive connections from. None to use defaultConnectionPool
+  connectionPool = None
+  # YastMetaCache for getProjects, getFolders and getRecordTypes. None to disable
+  metaCache = None
+  # YastReportCache for getReport and getReportTo. None to disable
+  reportCache = None
+  # YastSessionCache for login. None to disable
+  sessionCache = None
+  # Circuit breaker of hosts. None to use defaultCircuitBreaker
+  circuitBreaker = None
+  # Rate limiter of hosts. None to use defaultRateLimiter
+  rateLimiter = None
+  # Callables called with a YastRequestEvent after each request. None to use
+  # defaultObservers
+  observers = None
+
+  # Read requests that are retried on SERVER_MAINTENANCE and connection errors
+  idempotentRequests = frozenset(['auth.login', 'user.getInfo', 'user.getSettings', 'data.getRecords',
+                                  'data.getProjects', 'data.getFolders', 'meta.getRecordTypes',
+                                  'report.getReport'])
+  # Max number of retries of a request. 0 disables retries
+  maxRetries = 3
+  # Seconds before the first retry. Doubled for each following retry, up to
+  # retryMaxBackoff, and randomized to spread out retries of many clients
+  retryBackoff = 0.5
+  retryMaxBackoff = 8
+  # Seconds a retried request may take in total. Also limits the timeout of
+  # each try
+  retryDeadline = 120
 
   # Previous error code 
   status = YastStatus.SUCCESS
@@ -278,22 +1345,24 @@ class Yast(object):
   user = None
   # Hash from last login
   hash = None
+  # [user, password, cached hash, renewed hash] of a login from sessionCache
+  _sessionLogin = None
   
   # Login as a given user.
   # @param user username 
   # @param password password for given user
   # @return hash hash to use for further requests on this user
+  @_observed
   def login(self, user, password):
     self.status = YastStatus.SUCCESS
     try:
-      resp = self._request('<request req="auth.login">' +
-                           '<user>' + user + '</user>'+
-                           '<password>' + password + '</password>' +
-                           '</request>')
-      
-      self._verifyStatus(resp)
-      self.hash = resp.find('hash').text
+      if self._cachedLogin(user, password):
+        return self.hash
+
+      self.hash = self._authLogin(user, password)
       self.user = user
+      if self.sessionCache != None:
+        self.sessionCache.put(self.host, user, password, self.hash)
       return self.hash
     except:
       if self.status == YastStatus.SUCCESS:
@@ -305,10 +1374,68 @@ class Yast(object):
     
     
 
+  # Send a login request
+  # @return hash
+  def _authLogin(self, user, password):
+    resp = self._request(self._xmlLogin(user, password))
+    self._verifyStatus(resp)
+    return resp.find('hash').text
+
+  # Log in with the hash of user and password from sessionCache, if cached
+  # @return True if logged in
+  def _cachedLogin(self, user, password):
+    self._sessionLogin = None
+    hash = self.sessionCache.get(self.host, user, password) if self.sessionCache != None else None
+    if hash == None:
+      return False
+    # Renewed by _renewSession if Yast no longer accepts it
+    self._sessionLogin = [user, password, hash, None]
+    self.hash = hash
+    self.user = user
+    return True
+
+  # Log in again after Yast answered NOT_LOGGED_IN to a request sent with a
+  # hash from sessionCache. Done once per login
+  # @return request with the new hash, or None if it was not sent with the
+  #         cached hash
+  def _renewSession(self, request):
+    old = self._sessionFragment(request)
+    if old == None:
+      return None
+    login = self._sessionLogin
+
+    with _sessionLock:
+      if login[3] == None:
+        self.sessionCache.invalidate(self.host, login[0], login[1])
+        self._sessionRenewed(login, self._authLogin(login[0], login[1]))
+    event = self._currentEvent()
+    if event != None:
+      # The event is of the request, not of the login
+      event.request = self._requestName(request)
+    return request.replace(old, old.replace(login[2], login[3]))
+
+  # Keep the hash of a new login replacing the cached one of login
+  def _sessionRenewed(self, login, hash):
+    login[3] = hash
+    self.sessionCache.put(self.host, login[0], login[1], hash)
+    if self.user == login[0] and self.hash == login[2]:
+      self.hash = hash
+
+  # Returns the user and hash XML of the login from sessionCache if request
+  # was sent with it, otherwise None
+  def _sessionFragment(self, request):
+    login = self._sessionLogin
+    if login == None or self.sessionCache == None:
+      return None
+    old = self._xmlRequest('', login[0], login[2])
+    old = old[old.find('<user>'):old.find('</request>')]
+    return old if old in request else None
+
   # Forget about previous login
   def clearLogin(self):
     self.hash = None
     self.user = None
+    self._sessionLogin = None
     return True
   
 
@@ -317,15 +1444,13 @@ class Yast(object):
   # @param user username
   # @param hash user hash
   # @return map of user info
+  @_observed
   def userGetInfo(self, user=None, hash=None):
     self.status = YastStatus.SUCCESS
     try:
       user, hash = self._verifyLogin(user, hash)
 
-      resp = self._request('<request req="user.getInfo">' +
-                           '<user><![CDATA[' + user + ']]></user>' +
-                           '<hash><![CDATA[' + hash + ']]></hash>' +
-                           '</request>')
+      resp = self._request(self._xmlRequest('user.getInfo', user, hash))
 
       self._verifyStatus(resp)
       return self._getXmlFields(resp)
@@ -342,25 +1467,16 @@ class Yast(object):
   # @param user username
   # @param hash user hash
   # @return map of settings or False on failure
+  @_observed
   def userGetSettings(self, user=None, hash=None):
     self.status = YastStatus.SUCCESS
     try:
       user, hash = self._verifyLogin(user, hash)
       
-      resp = self._request('<request req="user.getSettings">' +
-                           '<user><![CDATA[' + user + ']]></user>' +
-                           '<hash><![CDATA[' + hash + ']]></hash>' +
-                           '</request>')
+      resp = self._request(self._xmlRequest('user.getSettings', user, hash))
       
       self._verifyStatus(resp)
-
-      # Create and return map of settings
-      map = {}
-      for key, value in zip(list(resp.find('keys')), list(resp.find('values'))):
-        if key.tag == 'v' and value.tag == 'v':
-          map[key.text] = value.text
-
-      return map
+      return self._getXmlSettings(resp)
     
     except:
       if self.status == YastStatus.SUCCESS:
@@ -376,17 +1492,15 @@ class Yast(object):
   # @param key setting key
   # @param value new value
   # @return TRUE on success, FALSE on error
+  @_observed
   def userSetSetting(self, key, value, user=None, hash=None):
     self.status = YastStatus.SUCCESS
     try:
       user, hash = self._verifyLogin(user, hash)
       
-      resp = self._request('<request req="user.setSetting">' +
-                           '<user><![CDATA[' + user + ']]></user>' +
-                           '<hash><![CDATA[' + hash + ']]></hash>' +
-                           '<key><![CDATA[' + key + ']]></key>' +
-                           '<value><![CDATA[' + value + ']]></value>' +
-                           '</request>')
+      resp = self._request(self._xmlRequest('user.setSetting', user, hash,
+                                            '<key><![CDATA[' + _xmlCdata(key) + ']]></key>' +
+                                            '<value><![CDATA[' + _xmlCdata(value) + ']]></value>'))
       
       self._verifyStatus(resp)
       return True
@@ -405,25 +1519,16 @@ class Yast(object):
   # @param objects Single object or array of objects to add. Objects are updated
   #                with id, etc. The same objects are given as return value
   # @return False on error, objects array if successful
+  @_observed
   def add(self, objects, user=None, hash=None):
     self.status = YastStatus.SUCCESS
     try:
       user, hash = self._verifyLogin(user, hash)
 
-      # Accumulate XML description of objects
-      xmlObj = ''
-      if isinstance(objects, list):
-        for o in objects:
-          xmlObj += o.toXml(False, True)
-      else:
-        xmlObj = objects.toXml(False, True)
-      
       # Transmit request
-      resp = self._request('<request req="data.add">' +
-                           '<user><![CDATA[' + user + ']]></user>' +
-                           '<hash><![CDATA[' + hash + ']]></hash>' +
-                           '<objects>' + xmlObj + '</objects>' +
-                           '</request>')
+      resp = self._request(self._xmlRequest('data.add', user, hash,
+                                            self._xmlObjects(objects, False, True)))
+      self._invalidateMeta(objects, user)
       
       self._verifyStatus(resp)    
       struct = self._xmlDataToStruct(resp, False)
@@ -443,39 +1548,39 @@ class Yast(object):
   
 
     
-  # Change records, projects and folders in Yast
+  # Change records, projects and folders in Yast. Only objects modified since
+  # they were received from or sent to Yast are sent, see YastTracked
   # @param user username
   # @param hash user hash
   # @param objects Single object or array of objects to change. 
   #                The same objects are given as return value
+  # @param checkConflicts first fetch the modified records, and change nothing
+  #                       if one was updated in Yast since it was received.
+  #                       Raises YastConflictError with status LIB_CONFLICT
   # @return False on error, objects array if successful
     
-  def change(self, objects, user=None, hash=None):
+  @_observed
+  def change(self, objects, user=None, hash=None, checkConflicts=False):
     self.status = YastStatus.SUCCESS
     try:
       user, hash = self._verifyLogin(user, hash)
+      changed = self._dirtyObjects(objects)
+      if not changed:
+        return objects
+      if checkConflicts:
+        self._checkConflicts(changed, user, hash)
       
-      # Accumulate XML description of objects
-      xmlObj = ''
-      if isinstance(objects, list):
-        for o in objects:
-          xmlObj += o.toXml(True, True)
-      else:
-        xmlObj = objects.toXml(True, True)
-
       # Transmit request
-      resp = self._request('<request req="data.change">' +
-                           '<user><![CDATA[' + user + ']]></user>' +
-                           '<hash><![CDATA[' + hash + ']]></hash>' +
-                           '<objects>' + xmlObj + '</objects>' +
-                           '</request>')
+      resp = self._request(self._xmlRequest('data.change', user, hash,
+                                            self._xmlObjects(changed, True, True)))
+      self._invalidateMeta(changed, user)
 
       self._verifyStatus(resp)    
       struct = self._xmlDataToStruct(resp, False)
 
       # Apply new information to objects. Objects are added in sequence,
       # so the first object added will be the first in its respective list
-      self._updateObjects(objects if isinstance(objects, list) else [objects], struct)
+      self._updateObjects(changed, struct)
       return objects
     
     except:
@@ -494,25 +1599,16 @@ class Yast(object):
   # @param hash user hash
   # @param objects Single object or array of objects to delete
   # @return False on error, True if successful
+  @_observed
   def delete(self, objects, user=None, hash=None):
     self.status = YastStatus.SUCCESS
     try:
       user, hash = self._verifyLogin(user, hash)
 
-      # Accumulate XML description of objects
-      xmlObj = ''
-      if isinstance(objects, list):
-        for o in objects:
-          xmlObj += o.toXml(True, False)
-      else:
-        xmlObj = objects.toXml(True, False)
-
       # Transmit request
-      resp = self._request('<request req="data.delete">' +
-                           '<user><![CDATA[' + user + ']]></user>' +
-                           '<hash><![CDATA[' + hash + ']]></hash>' +
-                           '<objects>' + xmlObj + '</objects>' +
-                           '</request>')
+      resp = self._request(self._xmlRequest('data.delete', user, hash,
+                                            self._xmlObjects(objects, True, False)))
+      self._invalidateMeta(objects, user)
       
       self._verifyStatus(resp)    
       return True
@@ -528,38 +1624,211 @@ class Yast(object):
   
 
 
+  # Add many records, projects and folders to Yast. Objects are sent in
+  # consecutive batches of at most maxObjects objects and maxBytes characters
+  # of XML, several batches at a time. A batch rejected with REQUEST_TOO_LARGE
+  # is split in two and only its halves are retried. Objects are updated with
+  # id, etc. as their batch succeeds, so after an error some may be added
+  # @param user username
+  # @param hash user hash
+  # @param objects array of objects to add
+  # @param workers number of requests run in parallel
+  # @param maxBytes max number of characters of object XML in a batch
+  # @param maxObjects max number of objects in a batch
+  # @param applied list the objects of every batch that succeeds are appended
+  #                to, to tell which were applied after an error
+  # @return False on error, objects array if successful
+  def addBulk(self, objects, user=None, hash=None, workers=4, maxBytes=262144, maxObjects=1000, applied=None):
+    return self._bulkRequest('data.add', objects, False, True, user, hash, workers, maxBytes, maxObjects,
+                             applied=applied)
+
+
+  # Change many records, projects and folders in Yast, in batches like addBulk.
+  # Only modified objects are sent, as by change
+  # @param objects array of objects to change
+  # @param checkConflicts see change
+  # @param applied see addBulk
+  # @return False on error, objects array if successful
+  def changeBulk(self, objects, user=None, hash=None, workers=4, maxBytes=262144, maxObjects=1000,
+                 checkConflicts=False, applied=None):
+    return self._bulkRequest('data.change', objects, True, True, user, hash, workers, maxBytes, maxObjects,
+                             checkConflicts, applied)
+
+
+  # Delete many records, projects and folders in Yast, in batches like addBulk
+  # @param objects array of objects to delete
+  # @param applied see addBulk
+  # @return False on error, True if successful
+  def deleteBulk(self, objects, user=None, hash=None, workers=4, maxBytes=262144, maxObjects=1000, applied=None):
+    return self._bulkRequest('data.delete', objects, True, False, user, hash, workers, maxBytes, maxObjects,
+                             applied=applied)
+
+
   # Returns records of a given user
   # @param user username
   # @param hash user hash
   # @param options associative array of options
+  # @param batch return records as a YastRecordBatch of columns instead
   # @return array of records
-  def getRecords(self, options=None, user=None, hash=None):
+  @_observed
+  def getRecords(self, options=None, user=None, hash=None, batch=False):
     self.status = YastStatus.SUCCESS
     try:
       user, hash = self._verifyLogin(user, hash)
 
-      resp = self._request('<request req="data.getRecords">' +
-			     '<user><![CDATA[' + user + ']]></user>' +
-			     '<hash><![CDATA[' + hash + ']]></hash>' +
-			     ('' if options == None else
-			      ('<timeFrom>' + str(options['timeFrom']) + '</timeFrom>' if 'timeFrom' in options else '') +
-			      ('<timeTo>' + str(options['timeTo']) + '</timeTo>' if 'timeTo' in options else '') +
-			      ('<typeId>' + str(options['typeId']) + '</typeId>' if 'typeId' in options else '') +
-			      ('<parentId>' + str(options['parentId']) + '</parentId>' if 'parentId' in options else '') +
-			      ('<id>' + str(options['id']) + '</id>' if 'id' in options else '')) +
-			     '</request>')
+      request = self._xmlRequest('data.getRecords', user, hash,
+                                 self._xmlQueryOptions(options, ['timeFrom', 'timeTo', 'typeId', 'parentId', 'id']))
+      if batch:
+        # Records are decoded into the columns as they arrive. yastbatch
+        # imports NumPy, which is slow, so it is loaded on first use
+        from yastbatch import YastRecordBatch
+        return YastRecordBatch.fromRecords(o for o in self._iterRequest(request) if isinstance(o, YastRecord))
+
+      resp = self._request(request)
 
       self._verifyStatus(resp)    
       struct = self._xmlDataToStruct(resp)
       return struct['records']
-      
+
     except:
       if self.status == YastStatus.SUCCESS:
         self.status = YastStatus.LIB_EXCEPTION
       if self.propagateExceptions:
         raise
       return False
-    
+
+
+  # Returns records of a given user one by one, as they are decoded from the
+  # response. Memory use stays flat no matter how many records are returned
+  # @param user username
+  # @param hash user hash
+  # @param options associative array of options, as for getRecords
+  # @return generator of records. Stops early on error
+  def iterRecords(self, options=None, user=None, hash=None):
+    self.status = YastStatus.SUCCESS
+    try:
+      user, hash = self._verifyLogin(user, hash)
+
+      for record in self._iterRequest(self._xmlRequest('data.getRecords', user, hash,
+                                                       self._xmlQueryOptions(options, ['timeFrom', 'timeTo', 'typeId',
+                                                                                       'parentId', 'id']))):
+        if isinstance(record, YastRecord):
+          yield record
+
+    except:
+      if self.status == YastStatus.SUCCESS:
+        self.status = YastStatus.LIB_EXCEPTION
+      if self.propagateExceptions:
+        raise
+
+
+  # Returns records of a given user like getRecords, but splits the time range
+  # into windows that are fetched in parallel. A window that fails, e.g. with
+  # REQUEST_TOO_LARGE, is split in two and retried, down to minWindowSize.
+  # Following windows are then no larger than its halves. A window that
+  # returns more than maxRecords records makes the following windows smaller,
+  # and windows with few records make them larger, but not as large as one
+  # that failed. Without both timeFrom and timeTo, or
+  # with an id option, this is the same as getRecords
+  # @param user username
+  # @param hash user hash
+  # @param options associative array of options, as for getRecords
+  # @param workers number of requests run in parallel
+  # @param windowSize initial window length in seconds. Default splits the range
+  #                   into four windows per worker
+  # @param maxRecords size budget of a window in number of records
+  # @param minWindowSize windows are never split below this length in seconds
+  # @return array of records, indexed by id
+  def getRecordsSharded(self, options=None, user=None, hash=None, workers=4, windowSize=None,
+                        maxRecords=5000, minWindowSize=3600):
+    if options == None or not 'timeFrom' in options or not 'timeTo' in options or 'id' in options or \
+       int(options['timeTo']) <= int(options['timeFrom']):
+      return self.getRecords(options, user, hash)
+
+    self.status = YastStatus.SUCCESS
+    try:
+      user, hash = self._verifyLogin(user, hash)
+      _loadModules()
+      if ThreadPoolExecutor == None:
+        raise Exception("getRecordsSharded requires concurrent.futures")
+
+      timeFrom = int(options['timeFrom'])
+      timeTo = int(options['timeTo'])
+      if windowSize == None:
+        windowSize = (timeTo - timeFrom) // (workers * 4)
+      # Size of the smallest window that failed is kept in tooLarge, so
+      # windows do not grow back to it
+      state = {'cursor': timeFrom, 'size': max(int(windowSize), minWindowSize, 1), 'tooLarge': None}
+
+      # Fetch one window
+      def fetch(start, end):
+        windowOptions = dict(options)
+        windowOptions['timeFrom'] = start
+        windowOptions['timeTo'] = end
+        resp = self._request(self._xmlRequest('data.getRecords', user, hash,
+                                              self._xmlQueryOptions(windowOptions, ['timeFrom', 'timeTo', 'typeId',
+                                                                                    'parentId'])))
+        self._verifyStatus(resp)
+        return self._xmlDataToStruct(resp)['records']
+
+      records = {}
+      pending = {}
+      executor = ThreadPoolExecutor(max_workers=workers)
+      try:
+        while True:
+          # Keep all workers busy with new windows. Neighbouring windows share
+          # their boundary, so no record falls between them
+          while state['cursor'] < timeTo and len(pending) < workers:
+            start = state['cursor']
+            end = min(start + state['size'], timeTo)
+            pending[executor.submit(self._observe, fetch, start, end)] = (start, end)
+            state['cursor'] = end
+          if not pending:
+            break
+
+          done = wait(list(pending), return_when=FIRST_COMPLETED)[0]
+          for future in done:
+            start, end = pending.pop(future)
+            try:
+              windowRecords = future.result()
+            except Exception as e:
+              # Split failing windows. Errors that are not about the size of the
+              # request will not go away by splitting
+              if end - start <= minWindowSize or \
+                 (isinstance(e, YastStatusError) and e.status != YastStatus.REQUEST_TOO_LARGE):
+                raise
+              middle = start + (end - start) // 2
+              pending[executor.submit(self._observe, fetch, start, middle)] = (start, middle)
+              pending[executor.submit(self._observe, fetch, middle, end)] = (middle, end)
+              # Following windows of the same size would fail alike
+              state['size'] = max(min(state['size'], middle - start), minWindowSize)
+              state['tooLarge'] = min(state['tooLarge'] or end - start, end - start)
+              continue
+
+            # Adapt size of following windows to the size budget
+            if len(windowRecords) > maxRecords:
+              state['size'] = max(state['size'] // 2, minWindowSize)
+            elif len(windowRecords) < maxRecords // 4 and \
+                 (state['tooLarge'] == None or state['size'] * 2 < state['tooLarge']):
+              state['size'] *= 2
+            records.update(windowRecords)
+      finally:
+        for future in pending:
+          future.cancel()
+        executor.shutdown(wait=True)
+
+      self.status = YastStatus.SUCCESS
+      return records
+
+    except Exception as e:
+      if isinstance(e, YastStatusError):
+        self.status = e.status
+      if self.status == YastStatus.SUCCESS:
+        self.status = YastStatus.LIB_EXCEPTION
+      if self.propagateExceptions:
+        raise
+      return False
+
   
 
 
@@ -568,18 +1837,21 @@ class Yast(object):
   # @param user username
   # @param hash user hash
   # @return array of projects
+  @_observed
   def getProjects(self, user=None, hash=None):
     self.status = YastStatus.SUCCESS
     try:
       user, hash = self._verifyLogin(user, hash)
 
-      resp = self._request('<request req="data.getProjects">' +
-			     '<user><![CDATA[' + user + ']]></user>' +
-			     '<hash><![CDATA[' + hash + ']]></hash>' +
-			     '</request>')
+      cached = self._getCachedMeta(user, 'projects')
+      if cached != None:
+        return cached
+
+      resp = self._request(self._xmlRequest('data.getProjects', user, hash))
 
       self._verifyStatus(resp)    
       struct = self._xmlDataToStruct(resp)
+      self._putCachedMeta(user, 'projects', struct['projects'])
       return struct['projects']
       
     except:
@@ -596,18 +1868,21 @@ class Yast(object):
   # @param user username
   # @param hash user hash
   # @return array of folders
+  @_observed
   def getFolders(self, user=None, hash=None):
     self.status = YastStatus.SUCCESS
     try:
       user, hash = self._verifyLogin(user, hash)
 
-      resp = self._request('<request req="data.getFolders">' +
-			     '<user><![CDATA[' + user + ']]></user>' +
-			     '<hash><![CDATA[' + hash + ']]></hash>' +
-			     '</request>')
+      cached = self._getCachedMeta(user, 'folders')
+      if cached != None:
+        return cached
+
+      resp = self._request(self._xmlRequest('data.getFolders', user, hash))
 
       self._verifyStatus(resp)    
       struct = self._xmlDataToStruct(resp)
+      self._putCachedMeta(user, 'folders', struct['folders'])
       return struct['folders']
       
     except:
@@ -622,18 +1897,21 @@ class Yast(object):
   # @param user username
   # @param hash user hash
   # @return array of record types
+  @_observed
   def getRecordTypes(self, user=None, hash=None):
     self.status = YastStatus.SUCCESS
     try:
       user, hash = self._verifyLogin(user, hash)
 
-      resp = self._request('<request req="meta.getRecordTypes">' +
-			     '<user><![CDATA[' + user + ']]></user>' +
-			     '<hash><![CDATA[' + hash + ']]></hash>' +
-			     '</request>')
+      cached = self._getCachedMeta(user, 'recordTypes')
+      if cached != None:
+        return cached
+
+      resp = self._request(self._xmlRequest('meta.getRecordTypes', user, hash))
 
       self._verifyStatus(resp)    
       struct = self._xmlDataToStruct(resp)
+      self._putCachedMeta(user, 'recordTypes', struct['recordTypes'])
       return struct['recordTypes']
       
     except:
@@ -652,42 +1930,25 @@ class Yast(object):
   # @param reportFormat format of report
   # @param options
   # @return raw report data or False on failure
+  @_observed
   def getReport(self, reportFormat, options=None, user=None, hash=None):
     self.status = YastStatus.SUCCESS
     try:
       user, hash = self._verifyLogin(user, hash)
 
-      # Request report
-      resp = self._request('<request req="report.getReport">' +
-			     '<user><![CDATA[' + user + ']]></user>' +
-			     '<hash><![CDATA[' + hash + ']]></hash>' +
-			     '<reportFormat>' + reportFormat + '</reportFormat>' +
-			     ('' if options == None else
-			      ('<timeFrom>' + str(options['timeFrom']) + '</timeFrom>' if 'timeFrom' in options else '') +
-			      ('<timeTo>' + str(options['timeTo']) + '</timeTo>' if 'timeTo' in options else '') +
-			      ('<typeId>' + str(options['typeId']) + '</typeId>' if 'typeId' in options else '') +
-			      ('<parentId>' + str(options['parentId']) + '</parentId>' if 'parentId' in options else '') +
-			      ('<groupBy><![CDATA[' + options['groupBy'] + ']]></groupBy>' if 'groupBy' in options else '') +
-			      ('<constraints><![CDATA[' + options['constraints'] + ']]></constraints>' if 'constraints' in options else '')) +
-			     '</request>')
-
-      self._verifyStatus(resp)
-      fields = self._getXmlFields(resp)
+      cache = self.reportCache
+      if cache != None:
+        key = cache.key(self.host, user, reportFormat, options)
+        f = cache.get(key)
+        if f != None:
+          with f:
+            return f.read()
 
       # Download
-      if self.useHttps:
-        conn = HTTPSConnection(self.host)
-      else:
-        conn = HTTPConnection(self.host)
-
-      conn.request('GET', self.dlPath + "?" + urlencode({'type':     'report',
-                                                         'id':       fields['reportId'],
-                                                         'hash':     fields['reportHash'],
-                                                         'user':     user,
-                                                         'userhash': hash}))
-      file = conn.getresponse().read()
-      conn.close()
-      return file
+      data = self._httpRequest('GET', self._requestReport(reportFormat, options, user, hash))
+      if cache != None:
+        cache.put(key, data, cache.immutable(options))
+      return data
       
     except:
       if self.status == YastStatus.SUCCESS:
@@ -695,6 +1956,44 @@ class Yast(object):
       if self.propagateExceptions:
         raise
       return False
+
+
+  # Downloads a report into a file, a chunk at a time, without holding the
+  # report in memory. A download cut off by a connection error continues with
+  # a Range request if the server accepts them
+  # @param reportFormat format of report
+  # @param sink path of a file, or file object opened for binary writing
+  # @param options see getReport
+  # @param chunkSize bytes read and written at a time
+  # @param progress called with bytes written so far and size of the report
+  #                 after each chunk. Size is None if the server does not tell
+  # @param resume if sink is a path to a partly downloaded report, only fetch
+  #               the rest of it with a Range request
+  # @return size of the report in bytes or False on failure
+  @_observed
+  def getReportTo(self, reportFormat, sink, options=None, user=None, hash=None, chunkSize=65536, progress=None,
+                  resume=False):
+    self.status = YastStatus.SUCCESS
+    try:
+      user, hash = self._verifyLogin(user, hash)
+
+      if hasattr(sink, 'write'):
+        return self._reportTo(reportFormat, options, user, hash, sink, 0, chunkSize, progress)
+
+      offset = os.path.getsize(sink) if resume and os.path.exists(sink) else 0
+      f = open(sink, 'r+b' if offset > 0 else 'wb')
+      try:
+        f.seek(offset)
+        return self._reportTo(reportFormat, options, user, hash, f, offset, chunkSize, progress)
+      finally:
+        f.close()
+
+    except:
+      if self.status == YastStatus.SUCCESS:
+        self.status = YastStatus.LIB_EXCEPTION
+      if self.propagateExceptions:
+        raise
+      return False
     
      
 
@@ -723,8 +2022,11 @@ class Yast(object):
   def _verifyStatus(self, xml):
     """Verify that return value of a request is SUCCESS"""
     self.status = int(xml.attrib['status'])
+    event = self._currentEvent()
+    if event != None:
+      event.status = self.status
     if self.status != YastStatus.SUCCESS:
-      raise Exception("Non-success return-value from Yast: " + str(self.status))
+      raise YastStatusError(self.status)
 
 
   # Converts XML data response to arrays of elements, projects and folders
@@ -740,87 +2042,19 @@ class Yast(object):
 
       nodes = list(xml.find('objects'))
       for item in nodes:
-        if item.tag == 'record':
-          typeId = int(item.find('typeId').text)
-          variables = self._getNodeArray('variables', item)
-	  	  
-	  # Create record
-          if typeId == 1: # Work record
-            record = YastRecordWork(item.find('project').text,
-                                    variables[0], variables[1], variables[2], variables[3],
-                                    variables[4], variables[5], variables[6])
-          elif typeId == 3: # Phonecall record
-            record = YastRecordPhonecall(item.find('project').text,
-					 variables[0], variables[1], variables[2], variables[3], 
-					 variables[4], variables[5])
-          else: # Unknown record
-            raise Exception('Unknown record type')	    
-	  
-	  # Add remaining data
-          record.id = int(item.find('id').text)
-          record.timeCreated = int(item.find('timeCreated').text)
-          record.timeUpdated = int(item.find('timeUpdated').text)
-          record.creator = int(item.find('creator').text)
-          record.flags = int(item.find('flags').text)
-
-          if group:
-            resp['records'][record.id] = record
-          else:
-            resp.append(record)
-	  
-        elif item.tag == 'project':
-          project = YastProject(item.find('name').text,
-                                item.find('description').text,
-                                item.find('primaryColor').text,
-                                item.find('parentId').text)
-
-	  # Add remaining data
-          project.id = int(item.find('id').text)
-          project.privileges = int(item.find('privileges').text)
-          project.timeCreated = int(item.find('timeCreated').text)
-          project.creator = int(item.find('creator').text)
-
-          if group:
-            resp['projects'][project.id] = project
-          else:
-            resp.append(project)
-	  
-        elif item.tag == 'folder':
-          folder = YastFolder(item.find('name').text,
-                              item.find('description').text,
-                              item.find('primaryColor').text,
-                              item.find('parentId').text)
-
-	  # Add remaining data
-          folder.id = int(item.find('id').text)
-          folder.privileges = int(item.find('privileges').text)
-          folder.timeCreated = int(item.find('timeCreated').text)
-          folder.creator = int(item.find('creator').text)
-          
-          if group:
-            resp['folders'][folder.id] = folder
-          else:
-            resp.append(folder)
-	  
-        elif item.tag == 'recordType':
-          varTypeNodes = self._getNodeArrayNodes('variableTypes', item, 'variableType')
-          variableTypes = []
-          for vtNode in varTypeNodes:
-            variableType = YastVariableType(vtNode.find('name').text,
-                                            vtNode.find('valType').text)
-            variableType.id = int(vtNode.find('id').text)
-            variableTypes.append(variableType)
-	  
-	  
-          recordType = YastRecordType(item.find('name').text,
-					   variableTypes)
-          recordType.id = int(item.find('id').text)
-
-          if group:
-            resp['recordTypes'][recordType.id] = recordType
-          else:
-            resp.append(recordType)
-	  
+        obj = self._xmlToObject(item)
+        if obj == None:
+          continue
+
+        if group:
+          resp[self._groupNames[item.tag]][obj.id] = obj
+        else:
+          resp.append(obj)
+
+      event = self._currentEvent()
+      if event != None:
+        event.objects += len(nodes)
+        event.mark('decode')
       return resp
     
     except:
@@ -829,33 +2063,763 @@ class Yast(object):
       raise
 
 
-  # Execute an API request using POST/GET
+  # Names of groups in the response of _xmlDataToStruct, by XML tag
+  _groupNames = {'record': 'records', 'project': 'projects', 'folder': 'folders', 'recordType': 'recordTypes'}
+
+
+  # Converts a single XML object node to a record, project, folder or record type
+  # @param item record, project, folder or recordType node
+  # @return the new object, or None if the node is not an object
+  def _xmlToObject(self, item):
+    if item.tag == 'record':
+      typeId = int(item.find('typeId').text)
+      variables = self._getNodeArray('variables', item)
+
+      # Create record
+      if typeId == 1: # Work record
+        record = YastRecordWork(item.find('project').text,
+                                variables[0], variables[1], variables[2], variables[3],
+                                variables[4], variables[5], variables[6])
+      elif typeId == 3: # Phonecall record
+        record = YastRecordPhonecall(item.find('project').text,
+                                     variables[0], variables[1], variables[2], variables[3], 
+                                     variables[4], variables[5])
+      else: # Unknown record
+        raise Exception('Unknown record type')
+
+      # Add remaining data
+      record.id = int(item.find('id').text)
+      record.timeCreated = int(item.find('timeCreated').text)
+      record.timeUpdated = int(item.find('timeUpdated').text)
+      record.creator = int(item.find('creator').text)
+      record.flags = int(item.find('flags').text)
+      record.markClean()
+      return record
+
+    elif item.tag == 'project':
+      project = YastProject(item.find('name').text,
+                            item.find('description').text,
+                            item.find('primaryColor').text,
+                            item.find('parentId').text)
+
+      # Add remaining data
+      project.id = int(item.find('id').text)
+      project.privileges = int(item.find('privileges').text)
+      project.timeCreated = int(item.find('timeCreated').text)
+      project.creator = int(item.find('creator').text)
+      project.markClean()
+      return project
+
+    elif item.tag == 'folder':
+      folder = YastFolder(item.find('name').text,
+                          item.find('description').text,
+                          item.find('primaryColor').text,
+                          item.find('parentId').text)
+
+      # Add remaining data
+      folder.id = int(item.find('id').text)
+      folder.privileges = int(item.find('privileges').text)
+      folder.timeCreated = int(item.find('timeCreated').text)
+      folder.creator = int(item.find('creator').text)
+      folder.markClean()
+      return folder
+
+    elif item.tag == 'recordType':
+      varTypeNodes = self._getNodeArrayNodes('variableTypes', item, 'variableType')
+      variableTypes = []
+      for vtNode in varTypeNodes:
+        variableType = YastVariableType(vtNode.find('name').text,
+                                        vtNode.find('valType').text)
+        variableType.id = int(vtNode.find('id').text)
+        variableTypes.append(variableType)
+
+      recordType = YastRecordType(item.find('name').text,
+                                  variableTypes)
+      recordType.id = int(item.find('id').text)
+      return recordType
+
+    return None
+
+
+  # Returns XML of a request authenticated by user and hash
+  # @param req name of request, e.g. data.getRecords
+  # @param data XML of the request specific fields
+  def _xmlRequest(self, req, user, hash, data=''):
+    return '<request req="' + req + '">' + \
+        '<user><![CDATA[' + _xmlCdata(user) + ']]></user>' + \
+        '<hash><![CDATA[' + _xmlCdata(hash) + ']]></hash>' + \
+        data + \
+        '</request>'
+
+
+  # Returns XML of a login request
+  def _xmlLogin(self, user, password):
+    return '<request req="auth.login">' + \
+        '<user>' + user + '</user>' + \
+        '<password>' + password + '</password>' + \
+        '</request>'
+
+
+  # Returns XML description of a single object or an array of objects
+  def _xmlObjects(self, objects, includeId, includeData):
+    if not isinstance(objects, list):
+      objects = [objects]
+    return '<objects>' + ''.join([o.toXml(includeId, includeData) for o in objects]) + '</objects>'
+
+
+  # Returns XML of the query options listed in names that are set in options
+  # @param options associative array of options or None
+  # @param names option names to include, in order
+  def _xmlQueryOptions(self, options, names):
+    xml = ''
+    if options != None:
+      for name in names:
+        if not name in options:
+          continue
+        if name == 'groupBy' or name == 'constraints':
+          xml += '<' + name + '><![CDATA[' + _xmlCdata(options[name]) + ']]></' + name + '>'
+        else:
+          xml += '<' + name + '>' + str(options[name]) + '</' + name + '>'
+    return xml
+
+
+  # Request a report
+  # @return download path of the report
+  def _requestReport(self, reportFormat, options, user, hash):
+    resp = self._request(self._xmlRequest('report.getReport', user, hash,
+                                          '<reportFormat>' + reportFormat + '</reportFormat>' +
+                                          self._xmlQueryOptions(options, ['timeFrom', 'timeTo', 'typeId', 'parentId',
+                                                                          'groupBy', 'constraints'])))
+
+    self._verifyStatus(resp)
+    return self._reportUrl(self._getXmlFields(resp), user, hash)
+
+
+  # Copy a report into a file from reportCache, or download it, caching it on
+  # the way. See getReportTo
+  # @param offset bytes of the report already in f
+  # @return size of the report in bytes
+  def _reportTo(self, reportFormat, options, user, hash, f, offset, chunkSize, progress):
+    cache = self.reportCache
+    if cache != None:
+      key = cache.key(self.host, user, reportFormat, options)
+      cached = cache.get(key)
+      if cached != None:
+        with cached:
+          total = os.fstat(cached.fileno()).st_size
+          cached.seek(offset)
+          written = offset
+          while True:
+            chunk = cached.read(chunkSize)
+            if not chunk:
+              break
+            f.write(chunk)
+            written += len(chunk)
+            if progress != None:
+              progress(written, total)
+          return written
+
+    url = self._requestReport(reportFormat, options, user, hash)
+    if cache == None or offset > 0:
+      return self._downloadTo(url, f, offset, chunkSize, progress)
+
+    cacheFile = cache.begin(key)
+    try:
+      size = self._downloadTo(url, _TeeWriter(f, cacheFile), 0, chunkSize, progress)
+    except:
+      cache.abort(cacheFile)
+      raise
+    cache.commit(key, cacheFile, cache.immutable(options))
+    return size
+
+
+  # Returns download path of a report
+  # @param fields fields of the report.getReport response
+  def _reportUrl(self, fields, user, hash):
+    _loadModules()
+    return self.dlPath + "?" + urlencode({'type':     'report',
+                                          'id':       fields['reportId'],
+                                          'hash':     fields['reportHash'],
+                                          'user':     user,
+                                          'userhash': hash})
+
+
+  # Send objects as batches of a data.add, data.change or data.delete request.
+  # See addBulk
+  # @param req name of request
+  # @param includeData the request sends and returns object data
+  # @param checkConflicts see change
+  # @return objects array, or True if not includeData
+  def _bulkRequest(self, req, objects, includeId, includeData, user, hash, workers, maxBytes, maxObjects,
+                   checkConflicts=False, applied=None):
+    self.status = YastStatus.SUCCESS
+    try:
+      user, hash = self._verifyLogin(user, hash)
+      _loadModules()
+      if ThreadPoolExecutor == None:
+        raise Exception("Bulk requests require concurrent.futures")
+
+      if not isinstance(objects, list):
+        objects = [objects]
+      result = objects
+      if req == 'data.change':
+        objects = self._dirtyObjects(objects)
+        if checkConflicts:
+          self._checkConflicts(objects, user, hash, maxObjects)
+      xmls = [o.toXml(includeId, includeData) for o in objects]
+
+      # Send the objects from start to end as one request
+      def send(start, end):
+        resp = self._request(self._xmlRequest(req, user, hash, '<objects>' + ''.join(xmls[start:end]) + '</objects>'))
+        self._verifyStatus(resp)
+        return self._xmlDataToStruct(resp, False) if includeData else None
+
+      pending = {}
+      executor = ThreadPoolExecutor(max_workers=workers)
+      try:
+        for start, end in self._packBatches(xmls, maxBytes, maxObjects):
+          pending[executor.submit(self._observe, send, start, end)] = (start, end)
+
+        while pending:
+          done = wait(list(pending), return_when=FIRST_COMPLETED)[0]
+          for future in done:
+            start, end = pending.pop(future)
+            try:
+              new = future.result()
+            except YastStatusError as e:
+              # The whole batch was rejected. Retry it as two smaller ones
+              if e.status != YastStatus.REQUEST_TOO_LARGE or end - start <= 1:
+                raise
+              middle = start + (end - start) // 2
+              pending[executor.submit(self._observe, send, start, middle)] = (start, middle)
+              pending[executor.submit(self._observe, send, middle, end)] = (middle, end)
+              continue
+
+            # Objects are returned in the order of the batch
+            if new != None:
+              self._updateObjects(objects[start:end], new)
+            if applied != None:
+              applied.extend(objects[start:end])
+      finally:
+        for future in pending:
+          future.cancel()
+        executor.shutdown(wait=True)
+        self._invalidateMeta(objects, user)
+
+      self.status = YastStatus.SUCCESS
+      return result if includeData else True
+
+    except Exception as e:
+      if isinstance(e, YastStatusError):
+        self.status = e.status
+      if self.status == YastStatus.SUCCESS:
+        self.status = YastStatus.LIB_EXCEPTION
+      if self.propagateExceptions:
+        raise
+      return False
+
+
+  # Returns the objects of a change that were modified since they were last
+  # received from or sent to Yast
+  # @param objects single object or array of objects
+  def _dirtyObjects(self, objects):
+    return [o for o in (objects if isinstance(objects, list) else [objects]) if o.isDirty()]
+
+
+  # Fetch the records among objects and raise YastConflictError if any was
+  # updated in Yast since it was received, or no longer exists. Records whose
+  # timeUpdated is not known are not checked
+  # @param size number of records fetched per request
+  def _checkConflicts(self, objects, user, hash, size=1000):
+    records = self._conflictCandidates(objects)
+    current = {}
+    for start in range(0, len(records), size):
+      resp = self._request(self._xmlRequest('data.getRecords', user, hash,
+                                            self._xmlConflictQuery(records[start:start + size])))
+      self._verifyStatus(resp)
+      current.update(self._xmlDataToStruct(resp)['records'])
+    self._raiseConflicts(records, current)
+
+  # Returns the records among objects with a known timeUpdated
+  def _conflictCandidates(self, objects):
+    return [o for o in objects if isinstance(o, YastRecord) and o.timeUpdated != -1]
+
+  # Returns XML of the query fetching records
+  def _xmlConflictQuery(self, records):
+    return self._xmlQueryOptions({'id': ",".join([str(r.id) for r in records])}, ['id'])
+
+  # Raise YastConflictError for records whose timeUpdated differs from the
+  # current records by id
+  def _raiseConflicts(self, records, current):
+    conflicts = [r for r in records if not r.id in current or current[r.id].timeUpdated != r.timeUpdated]
+    if conflicts:
+      self.status = YastStatus.LIB_CONFLICT
+      raise YastConflictError(conflicts)
+
+
+  # Split serialized objects into consecutive batches within the budgets. An
+  # object larger than maxBytes gets a batch of its own
+  # @param xmls array of object XML
+  # @return array of (start, end) index ranges
+  def _packBatches(self, xmls, maxBytes, maxObjects):
+    batches = []
+    start = 0
+    size = 0
+    for i, xml in enumerate(xmls):
+      if i > start and (i - start >= maxObjects or size + len(xml) > maxBytes):
+        batches.append((start, i))
+        start = i
+        size = 0
+      size += len(xml)
+    if start < len(xmls):
+      batches.append((start, len(xmls)))
+    return batches
+
+
+  # Execute an API request using POST/GET. Idempotent requests are retried on
+  # SERVER_MAINTENANCE and connection errors
   # @param request full XML request in text format
   # @return Parsed XML object
   def _request(self, request):
-    if self.useHttps:
-      conn = HTTPSConnection(self.host, timeout=self.requestTimeout)
-    else:
-      conn = HTTPConnection(self.host, timeout=self.requestTimeout)
-
-    if self.requestMethodGet:
-      conn.request('GET', self.apiPath + "?" + urlencode({'request': request}))
-      response = conn.getresponse().read()
-      conn.close()
-    else:
-      headers = {'Content-type': "application/x-www-form-urlencoded", 'Accept': "text/xml"}
-      conn.request('POST', self.apiPath, urlencode({'request': request}), headers)
-      response = conn.getresponse().read()
-      conn.close()
+    _loadModules()
+    event = self._currentEvent()
+    if event != None:
+      event.request = self._requestName(request)
+      event.mark('serialize')
+
+    retry = self._isIdempotent(request)
+    deadline = time.time() + self.retryDeadline
+    attempt = 0
+    while True:
+      self._checkCircuit()
+      try:
+        if self.requestMethodGet:
+          response = self._httpRequest('GET', self.apiPath + "?" + urlencode({'request': request}),
+                                       timeout=self._attemptTimeout(retry, deadline), idempotent=retry)
+        else:
+          headers = {'Content-type': "application/x-www-form-urlencoded", 'Accept': "text/xml"}
+          response = self._httpRequest('POST', self.apiPath, urlencode({'request': request}), headers,
+                                       timeout=self._attemptTimeout(retry, deadline), idempotent=retry)
+      except _transportErrors:
+        if not self._retryAfterFailure(retry, attempt, deadline):
+          raise
+        attempt += 1
+        continue
 
       # Parse xml
       try:
         tree = ElementTree.fromstring(response)
       except:
+        self._getCircuitBreaker().success(self.host)
         self.status = YastStatus.LIB_XML_PARSE_ERROR
-        raise Exception("Error parsing response from Yast:\n" + response)
+        raise Exception("Error parsing response from Yast:\n" + response.decode('utf-8', 'replace'))
+      if event != None:
+        event.mark('parse')
+
+      if tree.attrib.get('status') == str(YastStatus.NOT_LOGGED_IN):
+        renewed = self._renewSession(request)
+        if renewed != None:
+          request = renewed
+          continue
+      if tree.attrib.get('status') == str(YastStatus.SERVER_MAINTENANCE):
+        if self._retryAfterFailure(retry, attempt, deadline):
+          attempt += 1
+          continue
+      else:
+        self._getCircuitBreaker().success(self.host)
+      return tree
 
-    return tree
+
+  # Execute an API request and decode the response incrementally while it is
+  # downloaded. Only the object being decoded is kept in memory. Idempotent
+  # requests are retried like in _request until the first object is decoded
+  # @param request full XML request in text format
+  # @return generator of objects, as decoded by _xmlToObject
+  def _iterRequest(self, request):
+    _loadModules()
+    # Requests streamed outside of an observed call are observed on their own
+    event = self._currentEvent()
+    ownEvent = event == None and len(self._getObservers()) > 0
+    if ownEvent:
+      event = YastRequestEvent(self.host)
+    if event != None:
+      event.request = self._requestName(request)
+      event.mark('serialize')
+
+    retry = self._isIdempotent(request)
+    deadline = time.time() + self.retryDeadline
+    attempt = 0
+    yielded = False
+    while True:
+      self._checkCircuit()
+      conn = response = None
+      complete = False
+      renew = False
+      try:
+        if self.requestMethodGet:
+          url = self.apiPath + "?" + urlencode({'request': request})
+          conn, response = self._openHttp('GET', url, timeout=self._attemptTimeout(retry, deadline),
+                                          idempotent=retry)
+          sent = len(url)
+        else:
+          headers = {'Content-type': "application/x-www-form-urlencoded", 'Accept': "text/xml"}
+          body = urlencode({'request': request})
+          conn, response = self._openHttp('POST', self.apiPath, body, headers,
+                                          timeout=self._attemptTimeout(retry, deadline), idempotent=retry)
+          sent = len(self.apiPath) + len(body)
+        reader = response
+        if event != None:
+          event.bytesSent += sent
+          reader = _CountingReader(response, event)
+
+        depth = 0
+        objects = None
+        try:
+          for action, elem in ElementTree.iterparse(reader, events=('start', 'end')):
+            if action == 'start':
+              depth += 1
+              if depth == 1:
+                # Response node. Status is known before any data is parsed
+                if event != None:
+                  event.status = int(elem.attrib['status'])
+                if elem.attrib.get('status') == str(YastStatus.NOT_LOGGED_IN) and \
+                   self._sessionFragment(request) != None:
+                  # Renewed below, once the connection and its rate limiter
+                  # slot are released for the login request
+                  renew = True
+                  break
+                if elem.attrib.get('status') == str(YastStatus.SERVER_MAINTENANCE):
+                  if self._retryAfterFailure(retry, attempt, deadline):
+                    break
+                else:
+                  self._getCircuitBreaker().success(self.host)
+                self._verifyStatus(elem)
+              elif depth == 2 and elem.tag == 'objects':
+                objects = elem
+            else:
+              depth -= 1
+              if depth == 2 and objects != None:
+                if event != None:
+                  event.mark('network')
+                obj = self._xmlToObject(elem)
+                # Free the parsed node. It is always the first child of objects
+                objects.remove(elem)
+                if obj != None:
+                  yielded = True
+                  if event != None:
+                    event.objects += 1
+                    event.mark('decode')
+                  yield obj
+                  if event != None:
+                    # Time spent by the caller is not part of the request
+                    event.resume()
+                elif event != None:
+                  event.mark('decode')
+          else:
+            reader.read()
+            complete = True
+            if event != None:
+              event.mark('network')
+            return
+        except ElementTree.ParseError:
+          self.status = YastStatus.LIB_XML_PARSE_ERROR
+          raise
+
+      except _transportErrors:
+        # Objects already handed out can not be taken back, so only retry before that
+        if yielded or not self._retryAfterFailure(retry, attempt, deadline):
+          raise
+      finally:
+        if conn != None:
+          self._closeHttp(conn, response, complete)
+        if ownEvent and (complete or sys.exc_info()[0] != None):
+          self._emit(event, self._getObservers())
+
+      if renew:
+        request = self._renewSession(request)
+      attempt += 1
+
+
+  # Returns True if request is a read that is safe to send again
+  def _isIdempotent(self, request):
+    return self._requestName(request) in self.idempotentRequests
+
+  # Returns the name of a request, e.g. data.getRecords
+  def _requestName(self, request):
+    # Requests start with <request req="
+    return request[14:request.find('"', 14)]
+
+  # Raise if the circuit of host is open
+  def _checkCircuit(self):
+    if not self._getCircuitBreaker().allow(self.host):
+      self.status = YastStatus.LIB_CIRCUIT_OPEN
+      raise Exception("Requests to " + self.host + " are failing. Not retrying before " +
+                      str(self._getCircuitBreaker().resetTimeout) + " seconds have passed")
+
+  # Socket timeout of a try. Retried requests are limited by the deadline
+  def _attemptTimeout(self, retry, deadline):
+    if not retry:
+      return self.requestTimeout
+    return max(min(self.requestTimeout, deadline - time.time()), 1)
+
+  # Record a failed try of a request, and wait before the next one
+  # @param attempt number of the failed try, from 0
+  # @return True if the request should be tried again
+  def _retryAfterFailure(self, retry, attempt, deadline):
+    backoff = self._retryBackoff(retry, attempt, deadline)
+    if backoff == None:
+      return False
+    time.sleep(backoff)
+    event = self._currentEvent()
+    if event != None:
+      event.retries += 1
+      event.mark('network')
+    return True
+
+  # Record a failed try of a request
+  # @return seconds to wait before the next try, or None to give up
+  def _retryBackoff(self, retry, attempt, deadline):
+    self._getCircuitBreaker().failure(self.host)
+    if not retry or attempt >= self.maxRetries:
+      return None
+    backoff = min(self.retryBackoff * (2 ** attempt), self.retryMaxBackoff)
+    backoff = random.uniform(backoff / 2, backoff)
+    if time.time() + backoff >= deadline:
+      return None
+    return backoff
+
+  # Returns the circuit breaker used by this instance
+  def _getCircuitBreaker(self):
+    return self.circuitBreaker if self.circuitBreaker != None else defaultCircuitBreaker
+
+
+  # Execute a HTTP request on a pooled keep-alive connection
+  # @param method HTTP method
+  # @param url path and query of request
+  # @param body request body or None
+  # @param headers map of request headers
+  # @param timeout socket timeout in seconds. Default is requestTimeout
+  # @param idempotent the request is safe to send twice. See _openHttp
+  # @return response body
+  def _httpRequest(self, method, url, body=None, headers={}, timeout=None, idempotent=True):
+    event = self._currentEvent()
+    try:
+      conn, response = self._openHttp(method, url, body, headers, timeout, idempotent)
+      try:
+        data = response.read()
+      except:
+        self._closeHttp(conn, response, False)
+        raise
+    finally:
+      if event != None:
+        event.mark('network')
+
+    self._closeHttp(conn, response, True)
+    if event != None:
+      event.bytesSent += len(url) + (len(body) if body != None else 0)
+      event.bytesReceived += len(data)
+    return data
+
+
+  # Copy a HTTP download into a file object in chunks. See getReportTo
+  # @param offset bytes of the download already in f, which are skipped with
+  #               a Range request
+  # @return size of the download in bytes
+  def _downloadTo(self, url, f, offset, chunkSize, progress):
+    event = self._currentEvent()
+    deadline = time.time() + self.retryDeadline
+    attempt = 0
+    while True:
+      self._checkCircuit()
+      headers = {'Range': 'bytes=' + str(offset) + '-'} if offset > 0 else {}
+      conn, response = self._openHttp('GET', url, None, headers)
+      if event != None:
+        event.bytesSent += len(url)
+      complete = False
+      written = offset
+      acceptsRanges = response.getheader('Accept-Ranges', 'none') == 'bytes' or response.status == 206
+      try:
+        total = response.getheader('Content-Length')
+        total = int(total) if total != None else None
+        if response.status == 206:
+          # Content-Range: bytes first-last/total
+          first, sep, size = response.getheader('Content-Range', '')[6:].partition('/')
+          start = int(first.split('-')[0])
+          total = int(size) if size.isdigit() else None
+        elif response.status == 416 and offset > 0:
+          # Nothing left, the download was complete
+          response.read()
+          complete = True
+          return offset
+        elif response.status == 200:
+          start = 0
+        else:
+          raise Exception("Download failed with HTTP status " + str(response.status))
+
+        if start != offset:
+          # The server sent the whole download again
+          if not hasattr(f, 'seekable') or not f.seekable():
+            raise Exception("Server does not support resuming downloads")
+          f.seek(start)
+          f.truncate()
+          written = start
+
+        while True:
+          chunk = response.read(chunkSize)
+          if not chunk:
+            break
+          f.write(chunk)
+          written += len(chunk)
+          if event != None:
+            event.bytesReceived += len(chunk)
+          if progress != None:
+            progress(written, total)
+        if total != None and written < total:
+          raise HTTPException("Download ended after " + str(written) + " of " + str(total) + " bytes")
+        complete = True
+
+      except _transportErrors:
+        if written > offset:
+          # The host is answering. Tries that got the download further do
+          # not count against maxRetries or the circuit breaker
+          self._getCircuitBreaker().success(self.host)
+          attempt = 0
+        if not self._retryAfterFailure(acceptsRanges, attempt, deadline):
+          raise
+        attempt += 1
+        offset = written
+        continue
+      finally:
+        self._closeHttp(conn, response, complete)
+        if event != None:
+          event.mark('network')
+
+      self._getCircuitBreaker().success(self.host)
+      return written
+
+
+  # Send a HTTP request on a pooled keep-alive connection. The response must be
+  # read and handed to _closeHttp
+  # @param idempotent the request is safe to send twice. A request that is not
+  #                   is only sent again on a new connection if sending it on a
+  #                   reused one failed, as Yast may have processed it otherwise
+  # @return (connection, response)
+  def _openHttp(self, method, url, body=None, headers={}, timeout=None, idempotent=True):
+    _loadModules()
+    if timeout == None:
+      timeout = self.requestTimeout
+    limiter = self._getRateLimiter()
+    limiter.acquire(self.host, self.user if self.user != None else id(self))
+    pool = self._getConnectionPool()
+    try:
+      conn, reused = pool.get(self.host, self.useHttps, timeout)
+    except:
+      limiter.release(self.host)
+      raise
+    sent = False
+    try:
+      try:
+        conn.request(method, url, body, headers)
+        sent = True
+        response = conn.getresponse()
+      except _staleConnectionErrors:
+        if not reused or (sent and not idempotent):
+          raise
+        # The server closed the idle connection under us. Retry once on a new one
+        conn.close()
+        conn = pool.connect(self.host, self.useHttps, timeout)
+        conn.request(method, url, body, headers)
+        response = conn.getresponse()
+    except:
+      conn.close()
+      limiter.release(self.host)
+      raise
+
+    return conn, response
+
+
+  # Finish a request started with _openHttp
+  # @param complete True if the response was read in full. The connection is
+  #                 then kept for reuse, otherwise it is closed
+  def _closeHttp(self, conn, response, complete):
+    try:
+      if complete:
+        self._getConnectionPool().release(conn, self.host, self.useHttps, response)
+      else:
+        conn.close()
+    finally:
+      self._getRateLimiter().release(self.host)
+
+
+  # Returns the connection pool used by this instance
+  def _getConnectionPool(self):
+    return self.connectionPool if self.connectionPool != None else defaultConnectionPool
+
+  # Returns the rate limiter used by this instance
+  def _getRateLimiter(self):
+    return self.rateLimiter if self.rateLimiter != None else defaultRateLimiter
+
+  # Returns the observers of this instance
+  def _getObservers(self):
+    return self.observers if self.observers != None else defaultObservers
+
+  # Returns the event of the request running in the current thread, or None
+  def _currentEvent(self):
+    return _currentEvent()
+
+  # Call func, observing the request it sends as one event
+  def _observe(self, func, *args, **kwargs):
+    observers = self._getObservers()
+    if not observers:
+      return func(*args, **kwargs)
+
+    event = YastRequestEvent(self.host)
+    previous = _currentEvent()
+    _observedRequest.event = event
+    try:
+      return func(*args, **kwargs)
+    finally:
+      _observedRequest.event = previous
+      self._emit(event, observers)
+
+  # Finish an event and hand it to observers. Calls without a request, e.g.
+  # served from metaCache, are not observed
+  def _emit(self, event, observers):
+    if event.request == None:
+      return
+    event.duration = time.time() - event.startTime
+    if event.status == None:
+      event.status = self.status
+    for observer in list(observers):
+      try:
+        observer(event)
+      except Exception:
+        # A failing observer must not fail the request
+        pass
+
+
+  # Returns objects from metaCache, or None if not cached
+  def _getCachedMeta(self, user, kind):
+    if self.metaCache == None:
+      return None
+    return self.metaCache.get(self.host, user, kind)
+
+  # Store objects in metaCache
+  def _putCachedMeta(self, user, kind, objects):
+    if self.metaCache != None:
+      self.metaCache.put(self.host, user, kind, objects)
+
+  # Invalidate metaCache if any of objects is a project or folder. Reports of
+  # the user in reportCache are dropped on any change
+  def _invalidateMeta(self, objects, user):
+    if self.reportCache != None:
+      self.reportCache.invalidate(self.host, user)
+    if self.metaCache == None:
+      return
+    for o in (objects if isinstance(objects, list) else [objects]):
+      if isinstance(o, YastProject) or isinstance(o, YastFolder):
+        self.metaCache.invalidate(self.host, user)
+        return
 
 
   # Returns a structure of all XML nodes
@@ -871,7 +2835,17 @@ class Yast(object):
         fields[node.tag] = node.text
 
     return fields
-  
+
+
+  # Returns map of settings from a user.getSettings response
+  def _getXmlSettings(self, xml):
+    map = {}
+    for key, value in zip(list(xml.find('keys')), list(xml.find('values'))):
+      if key.tag == 'v' and value.tag == 'v':
+        map[key.text] = value.text
+
+    return map
+
 
 
 
@@ -897,6 +2871,7 @@ class Yast(object):
         o.variables = n.variables
         o.creator = n.creator
         o.flags = n.flags
+      o.markClean()
 
  
   # Returns an array in a field, e.g. for a field named xyz,
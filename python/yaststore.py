@@ -0,0 +1,269 @@
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE, TITLE AND NON-INFRINGEMENT. IN NO EVENT
+# SHALL THE COPYRIGHT HOLDERS OR ANYONE DISTRIBUTING THE SOFTWARE BE LIABLE
+# FOR ANY DAMAGES OR OTHER LIABILITY, WHETHER IN CONTRACT, TORT OR OTHERWISE,
+# ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+# Yast Python local store
+#
+# Keeps a local SQLite mirror of the records, projects, folders and record
+# types of one or more users. After the first full sync, sync() only writes
+# records that changed since the last one, and queries are answered locally.
+#
+# Example:
+#   yast = Yast()
+#   yast.login(user, password)
+#   store = YastStore('yast.db', yast)
+#   store.sync()
+#   records = store.getRecords({'timeFrom': t0, 'timeTo': t1})
+#
+
+import sqlite3, json, time
+
+from yastlib import *
+
+
+# Local SQLite mirror of Yast data
+class YastStore(object):
+
+  # Records are fetched from this many seconds before the newest known update
+  # on incremental syncs. Changes to records older than that are only picked up
+  # by a full sync
+  syncLookback = 30 * 86400
+
+  # Columns of the records and projects/folders tables
+  _recordColumns = ['id', 'typeId', 'project', 'timeCreated', 'timeUpdated', 'creator', 'flags',
+                    'startTime', 'endTime', 'comment', 'isRunning', 'hourlyCost', 'hourlyIncome',
+                    'isBillable', 'phoneNumber', 'outgoing']
+  _nodeColumns = ['id', 'name', 'description', 'primaryColor', 'parentId', 'privileges', 'timeCreated', 'creator']
+
+  # Open or create a store
+  # @param path path of SQLite database file, or ':memory:'
+  # @param yast logged in Yast instance used for syncing. Data is stored for yast.user
+  def __init__(self, path, yast):
+    self.yast = yast
+    self.db = sqlite3.connect(path)
+    self._createTables()
+
+  # Close the database
+  def close(self):
+    self.db.close()
+
+
+  # Bring the local copy up to date. Projects, folders and record types are
+  # fetched in full. Records are fetched in full on the first sync or when full
+  # is set. Otherwise only records starting after the newest known update minus
+  # syncLookback are fetched, and only those with a newer timeUpdated are written.
+  # Local records in the fetched range that Yast no longer has are removed
+  # @param full fetch all records
+  # @return map with number of 'changed' and 'deleted' records
+  def sync(self, full=False):
+    user = self._user()
+    projects = self._checked(self.yast.getProjects())
+    folders = self._checked(self.yast.getFolders())
+    recordTypes = self._checked(self.yast.getRecordTypes())
+
+    with self.db:
+      self._replaceNodes('projects', user, projects)
+      self._replaceNodes('folders', user, folders)
+      self.db.execute("DELETE FROM recordTypes WHERE user = ?", (user,))
+      self.db.executemany("INSERT INTO recordTypes VALUES (?, ?, ?, ?)",
+                          [(user, t.id, t.name, json.dumps([[v.id, v.name, v.valType] for v in t.variableTypes]))
+                           for t in recordTypes.values()])
+
+    highWater = self._getMeta(user, 'timeUpdated')
+    options = None
+    if not full and highWater != None:
+      options = {'timeFrom': int(highWater) - self.syncLookback}
+
+    # Stream records into the database, writing only the changed ones
+    changed = 0
+    newHighWater = int(highWater) if highWater != None else -1
+    with self.db:
+      self.db.execute("CREATE TEMP TABLE IF NOT EXISTS seen (id INTEGER PRIMARY KEY)")
+      self.db.execute("DELETE FROM seen")
+      for record in self.yast.iterRecords(options):
+        self.db.execute("INSERT OR IGNORE INTO seen VALUES (?)", (record.id,))
+        newHighWater = max(newHighWater, record.timeUpdated)
+        row = self.db.execute("SELECT timeUpdated FROM records WHERE user = ? AND id = ?", (user, record.id)).fetchone()
+        if row == None or row[0] != record.timeUpdated:
+          self.db.execute("INSERT OR REPLACE INTO records VALUES (" + ", ".join(["?"] * 17) + ")",
+                          [user] + self._recordRow(record))
+          changed += 1
+      # iterRecords stops early on errors. Never remove records after a partial download
+      if self.yast.getStatus() != YastStatus.SUCCESS:
+        raise Exception("Sync of records failed with status " + str(self.yast.getStatus()))
+
+      deleted = self.db.execute("DELETE FROM records WHERE user = ?" +
+                                (" AND startTime >= ?" if options != None else "") +
+                                " AND id NOT IN (SELECT id FROM seen)",
+                                (user, options['timeFrom']) if options != None else (user,)).rowcount
+      self.db.execute("DELETE FROM seen")
+      self._setMeta(user, 'timeUpdated', newHighWater)
+      self._setMeta(user, 'lastSync', int(time.time()))
+
+    return {'changed': changed, 'deleted': deleted}
+
+
+  # Returns locally stored records, like Yast.getRecords
+  # @param options associative array of options. timeFrom/timeTo select records
+  #                overlapping the range, typeId/parentId/id are comma separated
+  #                lists. A folder in parentId selects all projects below it
+  # @return array of records, indexed by id
+  def getRecords(self, options=None):
+    records = {}
+    for record in self.iterRecords(options):
+      records[record.id] = record
+    return records
+
+  # Returns locally stored records one by one. See getRecords
+  def iterRecords(self, options=None):
+    user = self._user()
+    where = ["user = ?"]
+    args = [user]
+    if options != None:
+      if 'timeFrom' in options:
+        where.append("endTime >= ?")
+        args.append(int(options['timeFrom']))
+      if 'timeTo' in options:
+        where.append("startTime <= ?")
+        args.append(int(options['timeTo']))
+      if 'typeId' in options:
+        ids = self._idList(options['typeId'])
+        where.append("typeId IN (" + ", ".join(["?"] * len(ids)) + ")")
+        args += ids
+      if 'id' in options:
+        ids = self._idList(options['id'])
+        where.append("id IN (" + ", ".join(["?"] * len(ids)) + ")")
+        args += ids
+      if 'parentId' in options:
+        ids = self._projectsBelow(user, self._idList(options['parentId']))
+        where.append("project IN (" + ", ".join(["?"] * len(ids)) + ")")
+        args += ids
+
+    for row in self.db.execute("SELECT " + ", ".join(self._recordColumns) + " FROM records WHERE " +
+                               " AND ".join(where), args):
+      yield self._rowRecord(row)
+
+  # Returns locally stored projects, like Yast.getProjects
+  def getProjects(self):
+    return self._getNodes('projects', YastProject)
+
+  # Returns locally stored folders, like Yast.getFolders
+  def getFolders(self):
+    return self._getNodes('folders', YastFolder)
+
+  # Returns locally stored record types, like Yast.getRecordTypes
+  def getRecordTypes(self):
+    recordTypes = {}
+    for id, name, variableTypes in self.db.execute("SELECT id, name, variableTypes FROM recordTypes WHERE user = ?",
+                                                   (self._user(),)):
+      vts = []
+      for vtId, vtName, valType in json.loads(variableTypes):
+        vt = YastVariableType(vtName, valType)
+        vt.id = vtId
+        vts.append(vt)
+      recordType = YastRecordType(name, vts)
+      recordType.id = id
+      recordTypes[id] = recordType
+    return recordTypes
+
+  # Returns time of last sync in seconds, or None if never synced
+  def getLastSync(self):
+    lastSync = self._getMeta(self._user(), 'lastSync')
+    return int(lastSync) if lastSync != None else None
+
+
+  def _createTables(self):
+    with self.db:
+      self.db.execute("CREATE TABLE IF NOT EXISTS records (user TEXT, id INTEGER, typeId INTEGER, project INTEGER, " +
+                      "timeCreated INTEGER, timeUpdated INTEGER, creator INTEGER, flags INTEGER, " +
+                      "startTime INTEGER, endTime INTEGER, comment TEXT, isRunning INTEGER, " +
+                      "hourlyCost REAL, hourlyIncome REAL, isBillable INTEGER, phoneNumber TEXT, outgoing INTEGER, " +
+                      "PRIMARY KEY (user, id))")
+      self.db.execute("CREATE INDEX IF NOT EXISTS recordsTime ON records (user, startTime)")
+      for table in ('projects', 'folders'):
+        self.db.execute("CREATE TABLE IF NOT EXISTS " + table + " (user TEXT, id INTEGER, name TEXT, description TEXT, " +
+                        "primaryColor TEXT, parentId INTEGER, privileges INTEGER, timeCreated INTEGER, creator INTEGER, " +
+                        "PRIMARY KEY (user, id))")
+      self.db.execute("CREATE TABLE IF NOT EXISTS recordTypes (user TEXT, id INTEGER, name TEXT, variableTypes TEXT, " +
+                      "PRIMARY KEY (user, id))")
+      self.db.execute("CREATE TABLE IF NOT EXISTS meta (user TEXT, key TEXT, value TEXT, PRIMARY KEY (user, key))")
+
+  # User whose data is read and written
+  def _user(self):
+    if self.yast.user == None:
+      raise Exception("YastStore used without prior login")
+    return self.yast.user
+
+  # Raise on failed Yast calls when exceptions are not propagated
+  def _checked(self, result):
+    if result is False:
+      raise Exception("Sync failed with status " + str(self.yast.getStatus()))
+    return result
+
+  def _getMeta(self, user, key):
+    row = self.db.execute("SELECT value FROM meta WHERE user = ? AND key = ?", (user, key)).fetchone()
+    return row[0] if row != None else None
+
+  def _setMeta(self, user, key, value):
+    self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?, ?)", (user, key, str(value)))
+
+  def _replaceNodes(self, table, user, nodes):
+    self.db.execute("DELETE FROM " + table + " WHERE user = ?", (user,))
+    self.db.executemany("INSERT INTO " + table + " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [[user] + [getattr(n, c) for c in self._nodeColumns] for n in nodes.values()])
+
+  def _getNodes(self, table, nodeClass):
+    nodes = {}
+    for row in self.db.execute("SELECT " + ", ".join(self._nodeColumns) + " FROM " + table + " WHERE user = ?",
+                               (self._user(),)):
+      node = nodeClass(row[1], row[2], row[3], row[4])
+      node.id, node.privileges, node.timeCreated, node.creator = row[0], row[5], row[6], row[7]
+      node.markClean()
+      nodes[node.id] = node
+    return nodes
+
+  # Expand a list of project and folder ids to all projects at or below them
+  def _projectsBelow(self, user, ids):
+    folderChildren = {}
+    for id, parentId in self.db.execute("SELECT id, parentId FROM folders WHERE user = ?", (user,)):
+      folderChildren.setdefault(parentId, []).append(id)
+    projectChildren = {}
+    for id, parentId in self.db.execute("SELECT id, parentId FROM projects WHERE user = ?", (user,)):
+      projectChildren.setdefault(parentId, []).append(id)
+
+    projects = set(ids)
+    folders = list(ids)
+    while folders:
+      folder = folders.pop()
+      projects.update(projectChildren.get(folder, []))
+      folders += folderChildren.get(folder, [])
+    return list(projects)
+
+  def _idList(self, text):
+    return [int(id) for id in str(text).split(",") if id.strip() != ""]
+
+  def _recordRow(self, record):
+    v = record.variables
+    return [record.id, record.typeId, record.project, record.timeCreated, record.timeUpdated, record.creator,
+            record.flags, v['startTime'], v['endTime'], v['comment'], v['isRunning'], v.get('hourlyCost'),
+            v.get('hourlyIncome'), v.get('isBillable'), v.get('phoneNumber'), v.get('outgoing')]
+
+  def _rowRecord(self, row):
+    (id, typeId, project, timeCreated, timeUpdated, creator, flags, startTime, endTime, comment,
+     isRunning, hourlyCost, hourlyIncome, isBillable, phoneNumber, outgoing) = row
+    if typeId == 1:
+      record = YastRecordWork(project, startTime, endTime, comment, isRunning, hourlyCost, hourlyIncome, isBillable)
+    else:
+      record = YastRecordPhonecall(project, startTime, endTime, comment, isRunning, phoneNumber, outgoing)
+    record.id = id
+    record.timeCreated = timeCreated
+    record.timeUpdated = timeUpdated
+    record.creator = creator
+    record.flags = flags
+    record.markClean()
+    return record